@@ -4,6 +4,7 @@ from mehditor.screens.app_menu import AppMenu
 command_help = {
     "new_file": "Create new empty file, replacing current one",
     "open_file": "Open new or existing file by name",
+    "quick_open": "Open a file under the current directory by typing part of its path",
     "save_file": "Save current file",
     "save_file_as": "Save current file with new name",
     "quit": "Exit application",
@@ -13,13 +14,25 @@ command_help = {
     "paste": "Paste text from clipboard",
     "undo_change": "Undo last modification",
     "redo_change": "Redo last undo operation",
+    "find": "Search for text, or a /regular expression/, as you type",
+    "find_next": "Select the next match of the current search",
+    "find_previous": "Select the previous match of the current search",
+    "replace_all": "Replace every match of the current search (undone in one step)",
+    "sort_lines": "Sort the selected lines, or all of them, with numbers in order (file2 before file10)",
+    "sort_lines_numerically": "Sort the selected lines, or all of them, by the number each starts with",
+    "remove_duplicate_lines": "Remove repeats of a line from the selected lines, or all of them, keeping the first",
+    "keep_matching_lines": "Keep only the lines (of those selected, or all) matching some text or a /regular expression/",
+    "delete_matching_lines": "Delete the lines (of those selected, or all) matching some text or a /regular expression/",
+    "reverse_lines": "Reverse the order of the selected lines, or all of them",
     "change_theme": "Change editor theme (separate from application light/dark mode)",
     "toggle_dark_mode": "Toggle application light/dark mode (separate from editor theme)",
     "toggle_line_numbers": "Toggle line number visibility",
     "toggle_soft_wrap": "Toggle soft wrap",
+    "toggle_follow": "Watch the file and show new lines as they're written to it (like tail -f)",
     "change_file_type": "Change current file type (language and syntax highlighting)",
     "set_indent_type": "Switch between using tabs and spaces",
     "set_indent_width": "Choose width of tabs or number of spaces to align when pressing tab key",
+    "convert_indentation": "Convert the indentation of every line to the current indent type and width",
     "show_shortcuts": "Show keyboard shortcuts",
     "show_about": "About this application"
 }
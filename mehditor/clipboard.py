@@ -0,0 +1,58 @@
+class Clipboard:
+    # What's been cut or copied, kept as lines rather than one string. Lines copied from a document are the document's
+    # own strings (only the first and last are cut down), so copying most of a large file doesn't copy its text.
+    def __init__(self, lines=()):
+        self.lines = list(lines)
+        # In characters, with a line break between each line
+        self.length = sum(map(len, self.lines)) + max(0, len(self.lines) - 1)
+
+    @classmethod
+    def from_text(cls, text):
+        # Split into lines as Document does
+        lines = text.splitlines()
+        if text.endswith(("\r\n", "\r", "\n")):
+            lines.append("")
+        return cls(lines)
+
+    @classmethod
+    def from_document(cls, document, start, end):
+        (top_row, top_column), (bottom_row, bottom_column) = sorted((start, end))
+        if (top_row, top_column) == (bottom_row, bottom_column):
+            return cls()
+        lines = document[top_row:bottom_row + 1]
+        if top_row == bottom_row:
+            return cls([lines[0][top_column:bottom_column]])
+        lines[0] = lines[0][top_column:]
+        lines[-1] = lines[-1][:bottom_column]
+        return cls(lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return self.length
+
+    def text(self):
+        return "\n".join(self.lines)
+
+    def chunks(self, size):
+        # The text, in pieces of size characters (the last one may be shorter), without joining the whole of it
+        pieces = []
+        total = 0
+        for index, line in enumerate(self.lines):
+            if index:
+                pieces.append("\n")
+                total += 1
+            while len(line) > size - total:
+                split = size - total
+                pieces.append(line[:split])
+                yield "".join(pieces)
+                pieces, total = [], 0
+                line = line[split:]
+            pieces.append(line)
+            total += len(line)
+            if total == size:
+                yield "".join(pieces)
+                pieces, total = [], 0
+        if total:
+            yield "".join(pieces)
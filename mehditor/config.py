@@ -1,6 +1,7 @@
 import configparser
 import os
 import pathlib
+import threading
 
 DEFAULT_SETTINGS = {
     "shortcuts": {
@@ -8,8 +9,12 @@ DEFAULT_SETTINGS = {
         "quit": "ctrl+c",
         "new_file": "ctrl+n",
         "open_file": "ctrl+o",
+        "quick_open": "ctrl+p",
         "save_file": "ctrl+s",
         "goto_line": "ctrl+g",
+        "find": "f5",
+        "find_next": "f8",
+        "find_previous": "shift+f8",
         "show_shortcuts": "f1",
         "cut": "f2",
         "copy": "f3",
@@ -39,7 +44,27 @@ DEFAULT_SETTINGS = {
         "theme": "dracula",
         "dark_mode": True,
         "show_line_numbers": True,
-        "soft_wrap": False
+        "soft_wrap": False,
+        # Files at least this big (in megabytes) open in a read-only, memory-mapped viewer. 0 to disable.
+        "huge_file_mb": 256,
+        # Files at least this big (in megabytes, or lines) open without syntax highlighting, soft wrap or line numbers.
+        # 0 to disable.
+        "large_file_mb": 16,
+        "large_file_lines": 500000,
+        # Lines longer than this are drawn without syntax highlighting, wrapped a piece at a time, and cut off at this
+        # column when soft wrap is off
+        "long_line_column": 5000,
+        # How the document's lines are kept in memory: "list", or "rope", which makes edits near the top of very long
+        # files quicker at some cost to everything else. "auto" uses a rope for large files (see large_file_mb).
+        "document_backend": "auto",
+        # Undo history (in memory, and saved alongside each file) is kept under this many megabytes
+        "undo_history_mb": 16,
+        # Also copy to the system clipboard: "off", "command" (wl-copy, xclip or xsel), "osc52" (an escape sequence the
+        # terminal handles, which works over ssh), or "auto", which uses a command when running locally
+        "system_clipboard": "auto",
+        # Terminals ignore OSC 52 sequences past some size; copies bigger than this many kilobytes (once encoded) stay
+        # in meh's own clipboard
+        "osc52_max_kb": 1000
     }
 }
 
@@ -54,10 +79,21 @@ SHORTCUT_ITEM_NAME_OVERRIDES = {
 }
 settings = configparser.ConfigParser()
 settings.read_dict(DEFAULT_SETTINGS)
+# The config files are read on first use (see ensure_loaded) rather than when this is imported
+loaded = False
+# The mtime of each config file as of when it was last read or written (None if it didn't exist), to tell when
+# another instance has changed it
+file_mtimes = {}
+# Changes made with change() that save() hasn't written yet, by (section, option). save() runs in a worker, so these
+# are only touched with lock held.
+pending = {}
+lock = threading.Lock()
+save_lock = threading.Lock()
 
 
 def generate_binding(item, show=None):
     from textual.binding import Binding
+    ensure_loaded()
     name = SHORTCUT_ITEM_NAME_OVERRIDES.get(item, item.replace('_', ' ').title())
 
     if show is None:
@@ -68,11 +104,68 @@ def generate_binding(item, show=None):
 
 
 def shortcut_alts(item):
+    ensure_loaded()
     shortcut = settings["shortcuts"][item]
     return SHORTCUT_ALTS.get(shortcut, shortcut)
 
 
+def ensure_loaded():
+    if not loaded:
+        load()
+
+
 def load():
+    global loaded
+    loaded = True
+    use(*read_files())
+
+
+def reload():
+    # Reads the config files again (eg, after another instance has saved changes), over the defaults, keeping any
+    # changes that haven't been saved yet. If a file can't be read the settings are left as they were, and so is
+    # file_mtimes, so it's tried again when the file next changes.
+    parser, mtimes = read_files()
+    with lock:
+        changes = dict(pending)
+    for (section, option), value in changes.items():
+        parser[section][option] = value
+    use(parser, mtimes)
+
+
+def read_files():
+    # The defaults with the config files read over them, into a new parser, and the files' mtimes as they were read
+    parser = configparser.ConfigParser()
+    parser.read_dict(DEFAULT_SETTINGS)
+    mtimes = {}
+    for path in config_files():
+        mtimes[str(path)] = file_mtime(path)
+        parser.read(path)
+    return parser, mtimes
+
+
+def use(parser, mtimes):
+    # Replaces settings (in place, as it's imported elsewhere) with what read_files() read
+    for section in settings.sections():
+        settings.remove_section(section)
+    settings.read_dict({section: dict(parser.items(section, raw=True)) for section in parser.sections()})
+    file_mtimes.clear()
+    file_mtimes.update(mtimes)
+
+
+def changed_on_disk():
+    # Whether any config file has changed since it was last read (or written by save())
+    ensure_loaded()
+    return any(file_mtime(path) != file_mtimes.get(str(path)) for path in config_files())
+
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def config_files():
     config_paths = []
 
     f = get_default_config_file()
@@ -86,8 +179,7 @@ def load():
             raise FileNotFoundError(
                 f"MEHEDITOR_CONFIG environment variable set to {os.getenv('MEHEDITOR_CONFIG')} but file does not exist")
 
-    for path in config_paths:
-        settings.read(path)
+    return config_paths
 
 
 def get_default_config_file():
@@ -98,16 +190,75 @@ def get_default_config_file():
                                       pathlib.Path(os.path.expanduser("~")) / '.config')) / 'mehditor' / 'mehditor.cfg'
 
 
+def get_default_cache_dir():
+    if os.name == 'nt':
+        return pathlib.Path(os.getenv('LOCALAPPDATA', os.getenv('APPDATA'))) / 'mehditor' / 'cache'
+    else:
+        return pathlib.Path(os.getenv('XDG_CACHE_HOME',
+                                      pathlib.Path(os.path.expanduser("~")) / '.cache')) / 'mehditor'
+
+
+def get_default_state_dir():
+    # Unlike the cache, things here (eg, crash recovery journals) can't be rebuilt if they're deleted
+    if os.name == 'nt':
+        return pathlib.Path(os.getenv('LOCALAPPDATA', os.getenv('APPDATA'))) / 'mehditor' / 'state'
+    else:
+        return pathlib.Path(os.getenv('XDG_STATE_HOME',
+                                      pathlib.Path(os.path.expanduser("~")) / '.local' / 'state')) / 'mehditor'
+
+
+def change(section, option, value):
+    # Changes a setting, to be written by the next save()
+    ensure_loaded()
+    if same_value(settings.get(section, option, fallback=None), value):
+        return
+    settings[section][option] = value
+    with lock:
+        pending[(section, option)] = value
+
+
+def same_value(a, b):
+    # Booleans can be written several ways (the defaults are "True", the app saves "Yes")
+    states = settings.BOOLEAN_STATES
+    return a == b or (a is not None and a.lower() in states and b.lower() in states
+                      and states[a.lower()] == states[b.lower()])
+
+
 def save():
+    # Writes the changes made with change() to the default config file. The file is read again first and only those
+    # settings are changed in it, so changes another instance has saved in the meantime are kept, and it's replaced
+    # atomically. Can be called from a worker.
+    from mehditor.file_io import atomic_write
+
+    ensure_loaded()
     f = get_default_config_file()
     if not f:
         raise FileNotFoundError("Could not find default config file")
-    f.parent.mkdir(parents=True, exist_ok=True)
-    with open(f, 'w') as fp:
-        settings.write(fp)
+    with save_lock:
+        with lock:
+            changes = dict(pending)
+        if not changes:
+            return f
+        # Whether the file is as this instance last saw it, rather than changed by another instance
+        unchanged = file_mtime(f) == file_mtimes.get(str(f))
+        on_disk = configparser.ConfigParser()
+        on_disk.read(f)
+        for (section, option), value in changes.items():
+            if not on_disk.has_section(section):
+                on_disk.add_section(section)
+            on_disk[section][option] = value
+        f.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(f) as fp:
+            on_disk.write(fp)
+        with lock:
+            for key, value in changes.items():
+                if pending.get(key) == value:
+                    del pending[key]
+        # If another instance had changed it, its changes are in the file now too, but they're left for
+        # changed_on_disk() to spot and reload() to pick up
+        if unchanged:
+            file_mtimes[str(f)] = file_mtime(f)
     return f
 
 
-load()
-
-__ALL__ = ['settings', 'shortcut_alts', 'load', 'save']
+__ALL__ = ['settings', 'shortcut_alts', 'ensure_loaded', 'load', 'reload', 'changed_on_disk', 'change', 'save']
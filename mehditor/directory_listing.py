@@ -0,0 +1,139 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+# Entries are read from os.scandir this many at a time, so they can be shown while a big directory is still being read
+SCAN_BATCH_SIZE = 2000
+# Listings are cached for about this many entries in all, least recently used first out
+MAX_CACHED_ENTRIES = 1000000
+
+
+# folded is the lower case name, for filtering
+Entry = namedtuple('Entry', 'name is_dir folded')
+
+
+def scan_batches(path, is_cancelled=lambda: False, batch_size=SCAN_BATCH_SIZE):
+    # Yields lists of the directory's entries as it's read. Whether an entry is a directory comes from scandir, which
+    # usually knows without a stat per entry; symlinks count as what they point to.
+    batch = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            batch.append(Entry(entry.name, is_dir, entry.name.lower()))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                if is_cancelled():
+                    return
+    if batch:
+        yield batch
+
+
+def sort_entries(entries):
+    # Directories first, then by name ignoring case
+    return sorted(entries, key=lambda entry: (not entry.is_dir, entry.folded, entry.name))
+
+
+def filter_entries(entries, text):
+    text = text.lower()
+    if not text:
+        return entries
+    return [entry for entry in entries if text in entry.folded]
+
+
+def directory_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ListingCache:
+    # Sorted directory listings by path, kept while the directory's mtime is unchanged. Used from worker threads.
+    def __init__(self, max_entries=MAX_CACHED_ENTRIES):
+        self.max_entries = max_entries
+        self.listings = OrderedDict()
+        self.entry_count = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        # The listing, or None if it isn't cached or the directory has changed since
+        path = str(path)
+        mtime = directory_mtime(path)
+        with self.lock:
+            cached = self.listings.get(path)
+            if cached is None:
+                return None
+            if cached[0] != mtime:
+                self.entry_count -= len(self.listings.pop(path)[1])
+                return None
+            self.listings.move_to_end(path)
+            return cached[1]
+
+    def put(self, path, mtime, entries):
+        # mtime is the directory's from before it was read, so a change while reading it is noticed next time
+        path = str(path)
+        if mtime is None or len(entries) > self.max_entries:
+            return
+        with self.lock:
+            old = self.listings.pop(path, None)
+            if old:
+                self.entry_count -= len(old[1])
+            self.listings[path] = (mtime, entries)
+            self.entry_count += len(entries)
+            while self.entry_count > self.max_entries:
+                self.entry_count -= len(self.listings.popitem(last=False)[1][1])
+
+    def list(self, path):
+        # The sorted listing, read now if it isn't cached. Raises OSError if the directory can't be read.
+        entries = self.get(path)
+        if entries is None:
+            mtime = directory_mtime(path)
+            entries = sort_entries(entry for batch in scan_batches(path) for entry in batch)
+            self.put(path, mtime, entries)
+        return entries
+
+
+listing_cache = ListingCache()
+
+
+def find_entry(path, cache=listing_cache):
+    # The entry for path in its directory's listing, or None if there's nothing there (or it can't be listed)
+    directory, name = os.path.split(os.path.normpath(path))
+    if not name:
+        # The root, which isn't in any listing
+        return Entry(directory, True, directory) if os.path.isdir(directory) else None
+    try:
+        entries = cache.list(directory)
+    except OSError:
+        return None
+    return next((entry for entry in entries if entry.name == name), None)
+
+
+def complete_path(text, cache=listing_cache):
+    # Shell-style completion of the last part of a path. Returns (text completed as far as all the names it could be
+    # agree, [those names]); a single directory gets a / added. Hidden names are only offered for a name starting with
+    # a dot, and if nothing matches exactly, case is ignored.
+    directory, partial = os.path.split(text)
+    try:
+        entries = cache.list(os.path.expanduser(directory) or os.curdir)
+    except OSError:
+        return text, []
+    if not partial.startswith('.'):
+        entries = [entry for entry in entries if not entry.name.startswith('.')]
+    matches = [entry for entry in entries if entry.name.startswith(partial)]
+    if not matches:
+        folded = partial.lower()
+        matches = [entry for entry in entries if entry.folded.startswith(folded)]
+    if not matches:
+        return text, []
+    if len(matches) == 1:
+        completed = matches[0].name + ('/' if matches[0].is_dir else '')
+    else:
+        completed = os.path.commonprefix([entry.name for entry in matches])
+        if len(completed) < len(partial):
+            completed = partial
+    return os.path.join(directory, completed), [entry.name for entry in matches]
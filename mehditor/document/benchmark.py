@@ -0,0 +1,113 @@
+import argparse
+import random
+import time
+
+from textual.document._document import Document
+
+from mehditor.document.byte_offsets import LineByteOffsets, RopeByteOffsets, utf8_length
+from mehditor.document.line_hashes import HashedLines, HashedRope
+from mehditor.document.wrapped_document import ChunkedWrappedDocument
+
+# Compares the document backends (see BetterTextArea.document_backend) on a generated file, doing what the editor does
+# for each edit: the document's lines, their hashes, the byte offsets tree-sitter is told about and the wrapping are
+# all updated.
+#
+#   python -m mehditor.document.benchmark --lines 1000000
+
+BACKENDS = ("list", "rope")
+
+
+def make_text(line_count):
+    rng = random.Random(1)
+    return "\n".join(f"    value_{i} = compute(value_{i - 1}, {rng.randrange(1000)})  # naïve"
+                     for i in range(line_count))
+
+
+class Editor:
+    # The document as BetterTextArea._set_document sets it up
+    def __init__(self, text, backend, width):
+        self.document = Document(text)
+        lines = self.document.lines
+        if backend == "rope":
+            self.document._lines = HashedRope(lines, self.lines_replaced, weigh=utf8_length)
+            self.byte_offsets = RopeByteOffsets(self.document.lines, self.document.newline)
+        else:
+            self.document._lines = HashedLines(lines, self.lines_replaced)
+            self.byte_offsets = LineByteOffsets(self.document.lines, self.document.newline)
+        self.wrapped_document = ChunkedWrappedDocument(self.document, width)
+
+    def lines_replaced(self, start, stop, count):
+        self.byte_offsets.replaced(start, stop, count)
+
+    def replace(self, start, end, text):
+        # As SyntaxAwareDocument does, for tree-sitter
+        self.byte_offsets.location_to_byte_offset(start)
+        self.byte_offsets.location_to_byte_offset(end)
+        result = self.document.replace_range(start, end, text)
+        self.wrapped_document.wrap_range(start, end, result.end_location)
+        return result
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def run(line_count, width, repeat):
+    text = make_text(line_count)
+    rng = random.Random(2)
+    results = {}
+    for backend in BACKENDS:
+        started = time.perf_counter()
+        editor = Editor(text, backend, width)
+        results[backend, "load"] = time.perf_counter() - started
+
+        def edit_at(row, text):
+            def edit():
+                editor.replace((row, 4), (row, 4), text)
+                editor.replace((row, 4), (row, 4 + len(text.split("\n")[-1]) if "\n" in text else 4 + len(text)), "")
+            return edit
+
+        results[backend, "type at top"] = timed(edit_at(10, "x"), repeat)
+        results[backend, "enter at top"] = timed(edit_at(10, "\n"), repeat)
+        results[backend, "enter in middle"] = timed(edit_at(line_count // 2, "\n"), repeat)
+        results[backend, "paste 1000 lines at top"] = timed(edit_at(10, "pasted line\n" * 1000), max(1, repeat // 10))
+
+        def edit_top_then_bottom():
+            # An edit near the top moves the byte offset of everything below it
+            editor.replace((10, 4), (10, 4), "\n")
+            editor.replace((line_count - 10, 4), (line_count - 10, 4), "x")
+            editor.replace((line_count - 10, 4), (line_count - 10, 5), "")
+            editor.replace((10, 4), (11, 0), "")
+
+        results[backend, "edit top, then bottom"] = timed(edit_top_then_bottom, repeat)
+
+        rows = [rng.randrange(line_count) for _ in range(10000)]
+        document = editor.document
+        results[backend, "10000 random line reads"] = timed(lambda: [document[row] for row in rows], 1)
+        results[backend, "scroll to row"] = timed(
+            lambda: editor.wrapped_document.offset_to_location((0, rng.randrange(editor.wrapped_document.height))),
+            repeat)
+        results[backend, "full text"] = timed(lambda: document.text, 1)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the document backends")
+    parser.add_argument("--lines", type=int, default=200000, help="Lines in the generated file")
+    parser.add_argument("--width", type=int, default=0, help="Width to soft wrap at (0 for none)")
+    parser.add_argument("--repeat", type=int, default=50, help="Times to repeat each edit")
+    args = parser.parse_args(argv)
+
+    results = run(args.lines, args.width, args.repeat)
+    operations = list(dict.fromkeys(operation for backend, operation in results))
+    print(f"{args.lines} lines, width {args.width}, milliseconds per operation")
+    print(f"{'':28}" + "".join(f"{backend:>12}" for backend in BACKENDS))
+    for operation in operations:
+        print(f"{operation:28}" + "".join(f"{results[backend, operation] * 1000:12.3f}" for backend in BACKENDS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+class LineByteOffsets:
+    # The UTF-8 byte offset of the start of each line of a document, worked out as far down as it's been asked for and
+    # kept until an edit above that. Stands in for SyntaxAwareDocument._location_to_byte_offset, which adds up the
+    # length of every line above the location each time it's called (twice per edit).
+    #
+    # replaced() has to be called whenever lines start..stop are replaced (see HashedLines' listener).
+    def __init__(self, lines, newline):
+        self.lines = lines
+        self.newline_length = len(newline.encode('utf-8'))
+        self.starts = [0]
+
+    def replaced(self, start, stop, count):
+        del self.starts[start + 1:]
+
+    def location_to_byte_offset(self, location):
+        row, column = location
+        lines = self.lines
+        starts = self.starts
+        row = min(row, len(lines))
+        if row >= len(starts):
+            newline_length = self.newline_length
+            offset = starts[-1]
+            for line in lines[len(starts) - 1:row]:
+                offset += len(line.encode('utf-8')) + newline_length
+                starts.append(offset)
+        offset = starts[row]
+        if row < len(lines):
+            offset += len(lines[row][:column].encode('utf-8'))
+        return offset
+
+
+def utf8_length(line):
+    return len(line) if line.isascii() else len(line.encode('utf-8'))
+
+
+class RopeByteOffsets:
+    # LineByteOffsets for the rope document backend, where the lines are kept in a Rope weighted by utf8_length: the
+    # lines above a location are added up by the Rope in O(log n), so nothing needs to be cached.
+    def __init__(self, lines, newline):
+        self.lines = lines
+        self.newline_length = len(newline.encode('utf-8'))
+
+    def replaced(self, start, stop, count):
+        pass
+
+    def location_to_byte_offset(self, location):
+        row, column = location
+        lines = self.lines
+        row = min(row, len(lines))
+        offset = lines.weight_before(row) + row * self.newline_length
+        if row < len(lines):
+            offset += len(lines[row][:column].encode('utf-8'))
+        return offset
@@ -0,0 +1,130 @@
+from itertools import chain
+
+from textual.document._document import Document
+
+from mehditor.document.rope import Rope
+
+MASK = (1 << 64) - 1
+# Stand-ins for the lines before the first line and after the last one
+START = hash("mehditor: start of document")
+END = hash("mehditor: end of document")
+
+
+def pair_hash(first, second):
+    return hash((first, second)) & MASK
+
+
+def fingerprint_of(hashes):
+    return sum(map(pair_hash, chain((START,), hashes), chain(hashes, (END,)))) & MASK
+
+
+def fingerprint_change(hashes, start, stop, new_hashes):
+    # How much the fingerprint changes by when hashes start..stop are replaced with new_hashes
+    before = hashes[start - 1] if start else START
+    after = hashes[stop] if stop < len(hashes) else END
+    old_run = [before, *hashes[start:stop], after]
+    new_run = [before, *new_hashes, after]
+    return sum(map(pair_hash, new_run, new_run[1:])) - sum(map(pair_hash, old_run, old_run[1:]))
+
+
+class HashedLines(list):
+    # A document's lines, which keeps a hash of each line and a fingerprint of the whole document up to date as it's
+    # edited, hashing only the lines that changed. The fingerprint is the sum of the hashes of every pair of adjacent
+    # lines, which only changes around an edit. Documents made of the same pairs in a different order share it, so a
+    # matching fingerprint is confirmed by comparing the line hashes (see matches).
+    #
+    # Document only ever changes its lines by assigning to a slice of them. Whatever else needs to follow along (eg,
+    # the search index) can set listener, which is called with (start, stop, count) after lines start..stop are
+    # replaced with count new ones.
+    def __init__(self, lines, listener=None):
+        super().__init__(lines)
+        self.listener = listener
+        self.hashes = list(map(hash, self))
+        self.fingerprint = fingerprint_of(self.hashes)
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, slice):
+            index = len(self) + index if index < 0 else index
+            index, value = slice(index, index + 1), [value]
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError("HashedLines only supports contiguous slices")
+        stop = max(start, stop)
+        value = list(value)
+
+        new_hashes = list(map(hash, value))
+        self.fingerprint = (self.fingerprint + fingerprint_change(self.hashes, start, stop, new_hashes)) & MASK
+        self.hashes[start:stop] = new_hashes
+        super().__setitem__(slice(start, stop), value)
+        if self.listener:
+            self.listener(start, stop, len(value))
+
+    def state(self):
+        # Identifies the current contents, to compare with later; see matches
+        return self.fingerprint, self.hashes.copy()
+
+    def matches(self, state):
+        fingerprint, hashes = state
+        return fingerprint == self.fingerprint and hashes == self.hashes
+
+
+class HashedRope(Rope):
+    # HashedLines for the rope document backend: the lines and their hashes are kept in Ropes, so an edit anywhere
+    # costs O(log n). weigh is passed on to Rope (see BetterTextArea._set_document).
+    def __init__(self, lines, listener=None, weigh=None):
+        super().__init__(lines, weigh)
+        self.listener = listener
+        hashes = list(map(hash, self))
+        self.hashes = Rope(hashes)
+        self.fingerprint = fingerprint_of(hashes)
+
+    def replace(self, start, stop, items):
+        new_hashes = list(map(hash, items))
+        self.fingerprint = (self.fingerprint + fingerprint_change(self.hashes, start, stop, new_hashes)) & MASK
+        self.hashes.replace(start, stop, new_hashes)
+        super().replace(start, stop, items)
+        if self.listener:
+            self.listener(start, stop, len(items))
+
+    def state(self):
+        return self.fingerprint, list(self.hashes)
+
+    def matches(self, state):
+        fingerprint, hashes = state
+        return fingerprint == self.fingerprint and hashes == list(self.hashes)
+
+
+def text_state(text):
+    # The state() a document with this text would have
+    return HashedLines(Document(text).lines).state()
+
+
+class ChunkedTextState:
+    # text_state() of text that arrives a chunk at a time (eg, as a file is read), without keeping it: only the line
+    # that the next chunk may carry on is held back
+    def __init__(self):
+        self.hashes = []
+        self.partial = ''
+        self.last = ''
+
+    def add(self, text):
+        if not text:
+            return
+        text = self.partial + text
+        self.last = text[-1]
+        lines = text.splitlines()
+        if text.endswith('\r'):
+            # Could be the first half of a "\r\n"
+            self.partial = lines.pop() + '\r'
+        elif self.last.splitlines() != ['']:
+            self.partial = lines.pop()
+        else:
+            self.partial = ''
+        self.hashes += map(hash, lines)
+
+    def state(self):
+        hashes = self.hashes + list(map(hash, self.partial.splitlines()))
+        # As Document, which has an empty last line after a trailing newline (or if there's no text at all)
+        if self.last in ('', '\n', '\r'):
+            hashes.append(hash(''))
+        return fingerprint_of(hashes), hashes
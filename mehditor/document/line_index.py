@@ -0,0 +1,177 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+from mehditor import config
+
+# Byte offsets are only kept for every STRIDE-th line, so the index stays small (8 bytes per STRIDE lines) no matter
+# how many lines the file has. Finding any other line means skipping at most STRIDE - 1 newlines from a checkpoint.
+STRIDE = 128
+SCAN_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Completed indexes are cached on disk, keyed by the file's path, size and mtime
+CACHE_MAGIC = b'MEHIDX01'
+CACHE_HEADER = struct.Struct('<8sQQIQQQ')
+
+
+class LineIndex:
+    def __init__(self, data, stride=STRIDE):
+        self.data = data
+        self.size = len(data)
+        self.stride = stride
+        self.checkpoints = array('Q', [0])
+        self.newlines = 0
+        self.scanned_to = 0
+        self.line_start = 0
+        self.longest_line = 0
+        self.complete = self.size == 0
+        self.lock = threading.Lock()
+
+    @property
+    def line_count(self):
+        # Lines known so far. Like TextArea's Document, a trailing newline is followed by an empty last line.
+        return self.newlines + 1
+
+    def scan(self, chunk_size=SCAN_CHUNK_SIZE):
+        with self.lock:
+            if self.complete:
+                return
+            stride = self.stride
+            newlines = self.newlines
+            position = self.scanned_to
+            end = min(self.size, position + chunk_size)
+
+            # Splitting the chunk and accumulating the part lengths finds every newline in C; Python only loops
+            # over the checkpoints, one per STRIDE lines
+            parts = self.data[position:end].split(b'\n')
+            ends = list(accumulate(map(len, parts)))
+            found = len(parts) - 1
+            checkpoints = [position + ends[k] + k + 1 for k in range((-newlines - 1) % stride, found, stride)]
+            self.checkpoints.extend(checkpoints)
+
+            longest_line = self.longest_line
+            line_start = self.line_start
+            if found:
+                longest_line = max(longest_line, position + len(parts[0]) - line_start, max(map(len, parts)))
+                line_start = position + ends[-2] + found
+            newlines += found
+
+            if end == self.size and end - line_start > longest_line:
+                longest_line = end - line_start
+            self.newlines = newlines
+            self.line_start = line_start
+            self.longest_line = longest_line
+            self._release_pages(self.scanned_to, end)
+            self.scanned_to = end
+            self.complete = end == self.size
+
+    def scan_to_line(self, line_index):
+        while not self.complete and self.newlines < line_index + 1:
+            self.scan()
+
+    def scan_all(self):
+        while not self.complete:
+            self.scan()
+
+    def line_at_offset(self, offset):
+        # (line, byte column) of a byte offset into the data
+        offset = min(max(0, offset), self.size)
+        while not self.complete and self.scanned_to <= offset:
+            self.scan()
+        with self.lock:
+            checkpoint = bisect_right(self.checkpoints, offset) - 1
+            position = self.checkpoints[checkpoint]
+            line_index = checkpoint * self.stride + self.data[position:offset].count(b'\n')
+            line_start = self.data.rfind(b'\n', 0, offset) + 1
+            return line_index, offset - line_start
+
+    def line_span(self, line_index):
+        # (start, end) byte offsets of a line, excluding its line ending
+        self.scan_to_line(line_index)
+        with self.lock:
+            if line_index < 0 or line_index > self.newlines:
+                raise IndexError(f"Line {line_index} out of range")
+            checkpoint, skip = divmod(line_index, self.stride)
+            start = self._skip_lines(self.checkpoints[checkpoint], skip)
+            end = self.data.find(b'\n', start)
+            if end < 0:
+                end = self.size
+            if end > start and self.data[end - 1:end] == b'\r':
+                end -= 1
+            return start, end
+
+    def _skip_lines(self, position, count):
+        find = self.data.find
+        for _ in range(count):
+            position = find(b'\n', position) + 1
+        return position
+
+    def _release_pages(self, start, end):
+        # Scanned pages aren't needed again until they're viewed, so let the kernel drop them rather than letting
+        # resident memory grow with the file
+        if isinstance(self.data, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+            start -= start % mmap.PAGESIZE
+            if end > start:
+                self.data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def save(self, cache_file, stat):
+        checkpoints = self.checkpoints
+        if sys.byteorder != 'little':
+            checkpoints = array('Q', checkpoints)
+            checkpoints.byteswap()
+
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        with open(temp_file, 'wb') as fp:
+            fp.write(CACHE_HEADER.pack(CACHE_MAGIC, stat.st_size, stat.st_mtime_ns, self.stride, self.newlines,
+                                       self.longest_line, len(checkpoints)))
+            checkpoints.tofile(fp)
+        os.replace(temp_file, cache_file)
+
+    @classmethod
+    def load(cls, cache_file, data, stat):
+        # Returns None if there's no usable cached index for the file as it is now
+        try:
+            with open(cache_file, 'rb') as fp:
+                magic, size, mtime_ns, stride, newlines, longest_line, count = CACHE_HEADER.unpack(
+                    fp.read(CACHE_HEADER.size))
+                if magic != CACHE_MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns or size != len(data):
+                    return None
+                checkpoints = array('Q')
+                checkpoints.fromfile(fp, count)
+        except (OSError, EOFError, struct.error):
+            return None
+
+        if sys.byteorder != 'little':
+            checkpoints.byteswap()
+        index = cls(data, stride)
+        index.checkpoints = checkpoints
+        index.newlines = newlines
+        index.longest_line = longest_line
+        index.scanned_to = size
+        index.complete = True
+        return index
+
+
+def cache_file_for(path):
+    digest = hashlib.sha1(str(path).encode('utf-8', errors='surrogateescape')).hexdigest()
+    return config.get_default_cache_dir() / 'line-index' / f'{digest}.idx'
+
+
+def byte_offset_to_location(lines, newline, offset, encoding="utf-8"):
+    # For documents held in memory, which don't know where their lines are in the file. Reads through every line
+    # before the offset, so it's run in a worker.
+    newline_size = len(newline.encode(encoding))
+    position = 0
+    for line_index, line in enumerate(lines):
+        line_bytes = line.encode(encoding, errors="replace")
+        if offset <= position + len(line_bytes):
+            return line_index, len(line_bytes[:offset - position].decode(encoding, errors="ignore"))
+        position += len(line_bytes) + newline_size
+    return len(lines) - 1, len(lines[-1])
@@ -0,0 +1,201 @@
+import mmap
+import os
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from textual._cells import cell_len, cell_width_to_column_index
+from textual.document._document import DocumentBase
+from textual.expand_tabs import expand_tabs_inline, get_tab_widths
+from textual.geometry import Offset, Size
+
+from mehditor.document.line_index import LineIndex, cache_file_for
+
+LINE_CACHE_SIZE = 1024
+
+
+class MappedDocumentReadOnly(Exception):
+    pass
+
+
+class MappedDocument(DocumentBase):
+    # A read-only document over a memory-mapped file. Lines are decoded only when asked for (in practice, the lines in
+    # the viewport), so memory use doesn't depend on the size of the file.
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self._fp = open(path, 'rb')
+        self.stat = os.fstat(self._fp.fileno())
+        try:
+            self._data = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            self._data = b''
+        self.index = LineIndex.load(cache_file_for(path), self._data, self.stat) or LineIndex(self._data)
+        self._line_cache = OrderedDict()
+
+        start, end = self.index.line_span(0)
+        self._newline = "\r\n" if self._data[end:end + 2] == b'\r\n' else "\n"
+
+    def save_index(self):
+        self.index.save(cache_file_for(self.path), self.stat)
+
+    def location_from_byte_offset(self, offset):
+        line_index, byte_column = self.index.line_at_offset(offset)
+        start, end = self.index.line_span(line_index)
+        return line_index, len(self._data[start:start + byte_column].decode(self.encoding, errors="ignore"))
+
+    def close(self):
+        self._line_cache.clear()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._fp.close()
+
+    def replace_range(self, start, end, text):
+        raise MappedDocumentReadOnly(f"{self.path} is open read-only")
+
+    @property
+    def text(self):
+        return self._data[:].decode(self.encoding, errors="replace")
+
+    @property
+    def newline(self):
+        return self._newline
+
+    @property
+    def lines(self):
+        return MappedLines(self)
+
+    def get_line(self, index):
+        cache = self._line_cache
+        try:
+            cache.move_to_end(index)
+            return cache[index]
+        except KeyError:
+            pass
+
+        start, end = self.index.line_span(index)
+        line = self._data[start:end].decode(self.encoding, errors="replace")
+        cache[index] = line
+        if len(cache) > LINE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return line
+
+    def get_text_range(self, start, end):
+        top, bottom = sorted((start, end))
+        top_row, top_column = top
+        bottom_row, bottom_column = bottom
+        if top_row == bottom_row:
+            return self.get_line(top_row)[top_column:bottom_column]
+
+        lines = [self.get_line(top_row)[top_column:]]
+        lines.extend(self.get_line(row) for row in range(top_row + 1, bottom_row))
+        lines.append(self.get_line(bottom_row)[:bottom_column])
+        return self._newline.join(lines)
+
+    def get_size(self, indent_width):
+        # The longest line is measured in bytes while indexing, which is close enough for sizing the scroll region
+        return Size(self.index.longest_line, self.line_count)
+
+    @property
+    def line_count(self):
+        return self.index.line_count
+
+    @property
+    def start(self):
+        return 0, 0
+
+    @property
+    def end(self):
+        # The end of as much of the file as has been indexed, like line_count; indexing the rest could take a while
+        last_line = self.line_count - 1
+        return last_line, len(self.get_line(last_line))
+
+    def __getitem__(self, line_index):
+        if isinstance(line_index, slice):
+            return [self.get_line(i) for i in range(*line_index.indices(self.line_count))]
+        if line_index < 0:
+            line_index += self.line_count
+        return self.get_line(line_index)
+
+
+class MappedLines(Sequence):
+    def __init__(self, document):
+        self.document = document
+
+    def __len__(self):
+        return self.document.line_count
+
+    def __getitem__(self, index):
+        return self.document[index]
+
+
+class MappedRows(Sequence):
+    # Stands in for WrappedDocument's per-row lookup lists: without wrapping, row y is always section 0 of line y
+    def __init__(self, document, make_row):
+        self.document = document
+        self.make_row = make_row
+
+    def __len__(self):
+        return self.document.line_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.make_row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.make_row(index)
+
+
+class MappedWrappedDocument:
+    # The subset of WrappedDocument that TextArea and DocumentNavigator use, for a MappedDocument that is never
+    # wrapped. Nothing is precomputed per line, so it works before the document is fully indexed.
+    def __init__(self, document, tab_width=4):
+        self.document = document
+        self._width = 0
+        self._tab_width = tab_width
+        self._offset_to_line_info = MappedRows(document, lambda y: (y, 0))
+        self._line_index_to_offsets = MappedRows(document, lambda line_index: [line_index])
+        self._wrap_offsets = MappedRows(document, lambda line_index: [])
+
+    @property
+    def wrapped(self):
+        return False
+
+    @property
+    def lines(self):
+        return [[line] for line in self.document.lines]
+
+    @property
+    def height(self):
+        return self.document.line_count
+
+    def wrap(self, width, tab_width=None):
+        if tab_width:
+            self._tab_width = tab_width
+
+    def wrap_range(self, start, old_end, new_end):
+        pass
+
+    def offset_to_location(self, offset):
+        x, y = offset
+        line_index = min(max(0, y), self.document.line_count - 1)
+        return line_index, self.get_target_document_column(line_index, max(0, x), 0)
+
+    def location_to_offset(self, location):
+        line_index, column_index = location
+        line = self.document.get_line(line_index)
+        return Offset(cell_len(expand_tabs_inline(line[:column_index], self._tab_width)), line_index)
+
+    def get_target_document_column(self, line_index, x_offset, y_offset):
+        return cell_width_to_column_index(self.document.get_line(line_index), x_offset, self._tab_width)
+
+    def get_sections(self, line_index):
+        return [self.document.get_line(line_index)]
+
+    def get_offsets(self, line_index):
+        return []
+
+    def get_tab_widths(self, line_index):
+        return [width for _, width in get_tab_widths(self.document.get_line(line_index), self._tab_width)]
@@ -0,0 +1,251 @@
+from collections.abc import Sequence
+from itertools import islice
+
+# Items are kept in leaves of about this many, in a balanced (AVL) tree. A leaf is split once an edit would take it
+# past twice this.
+LEAF_SIZE = 256
+MAX_LEAF_SIZE = LEAF_SIZE * 2
+
+
+class Leaf:
+    __slots__ = ('items', 'weights', 'count', 'weight')
+    height = 0
+
+    def __init__(self, items, weights):
+        self.items = items
+        self.weights = weights
+        self.count = len(items)
+        self.weight = sum(weights) if weights is not None else 0
+
+
+class Branch:
+    __slots__ = ('left', 'right', 'count', 'weight', 'height')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.update()
+
+    def update(self):
+        left, right = self.left, self.right
+        self.count = left.count + right.count
+        self.weight = left.weight + right.weight
+        self.height = max(left.height, right.height) + 1
+
+
+def build(items, weights):
+    # A balanced tree of the items, or None if there aren't any
+    leaves = [Leaf(items[i:i + LEAF_SIZE], weights[i:i + LEAF_SIZE] if weights is not None else None)
+              for i in range(0, len(items), LEAF_SIZE)]
+
+    def build_range(start, stop):
+        if stop - start == 1:
+            return leaves[start]
+        middle = (start + stop) // 2
+        return Branch(build_range(start, middle), build_range(middle, stop))
+
+    return build_range(0, len(leaves)) if leaves else None
+
+
+def rebalance(node):
+    left, right = node.left, node.right
+    if left.height > right.height + 1:
+        if left.left.height < left.right.height:
+            left = Branch(Branch(left.left, left.right.left), left.right.right)
+        return Branch(left.left, Branch(left.right, right))
+    if right.height > left.height + 1:
+        if right.right.height < right.left.height:
+            right = Branch(right.left.left, Branch(right.left.right, right.right))
+        return Branch(Branch(left, right.left), right.right)
+    return node
+
+
+def join(left, right):
+    # The items of left followed by those of right, in O(difference in height)
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.height > right.height + 1:
+        return rebalance(Branch(left.left, join(left.right, right)))
+    if right.height > left.height + 1:
+        return rebalance(Branch(join(left, right.left), right.right))
+    if not left.height and not right.height and left.count + right.count <= MAX_LEAF_SIZE:
+        weights = left.weights + right.weights if left.weights is not None else None
+        return Leaf(left.items + right.items, weights)
+    return Branch(left, right)
+
+
+def split(node, index):
+    # (the first index items, the rest), in O(log n)
+    if node is None or index <= 0:
+        return None, node
+    if index >= node.count:
+        return node, None
+    if not node.height:
+        weights = node.weights
+        return (Leaf(node.items[:index], weights[:index] if weights is not None else None),
+                Leaf(node.items[index:], weights[index:] if weights is not None else None))
+    left_count = node.left.count
+    if index < left_count:
+        first, rest = split(node.left, index)
+        return first, join(rest, node.right)
+    first, rest = split(node.right, index - left_count)
+    return join(node.left, first), rest
+
+
+class Rope(Sequence):
+    # A list that can be edited anywhere in O(log n), for documents too long for list's O(n) inserts and deletes.
+    # Slices are assigned and read as with a list; only contiguous slices are supported.
+    #
+    # If weigh is given, each item has a weight (eg, its length in bytes) and the total weight of the items before an
+    # index, or the item a running total falls in, is found in O(log n); see weight_before and find.
+    def __init__(self, items=(), weigh=None):
+        self.weigh = weigh
+        items = list(items)
+        self.root = build(items, self.weights_of(items))
+
+    def weights_of(self, items):
+        return list(map(self.weigh, items)) if self.weigh else None
+
+    def __len__(self):
+        return self.root.count if self.root else 0
+
+    @property
+    def weight(self):
+        return self.root.weight if self.root else 0
+
+    def __iter__(self):
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            if node.height:
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                yield from node.items
+
+    def iter_from(self, index):
+        # Iterates over the items from index on, without walking the ones before it
+        stack = []
+        node = self.root
+        while node is not None and node.height:
+            if index < node.left.count:
+                stack.append(node.right)
+                node = node.left
+            else:
+                index -= node.left.count
+                node = node.right
+        if node is not None:
+            yield from islice(node.items, index, None)
+        while stack:
+            node = stack.pop()
+            if node.height:
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                yield from node.items
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            return list(islice(self.iter_from(start), max(0, stop - start)))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Rope index out of range")
+        node = self.root
+        while node.height:
+            left = node.left
+            if index < left.count:
+                node = left
+            else:
+                index -= left.count
+                node = node.right
+        return node.items[index]
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, slice):
+            index = len(self) + index if index < 0 else index
+            if not 0 <= index < len(self):
+                raise IndexError("Rope assignment index out of range")
+            index, value = slice(index, index + 1), [value]
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError("Rope only supports contiguous slices")
+        self.replace(start, max(start, stop), list(value))
+
+    def replace(self, start, stop, items):
+        # Replaces items start..stop with items
+        weights = self.weights_of(items)
+        if self.replace_in_leaf(start, stop, items, weights):
+            return
+        first, rest = split(self.root, start)
+        _, last = split(rest, stop - start)
+        self.root = join(join(first, build(items, weights)), last)
+
+    def replace_in_leaf(self, start, stop, items, weights):
+        # The usual edit is within a single leaf, which is changed in place, along with the counts above it
+        node = self.root
+        if node is None:
+            return False
+        path = []
+        while node.height:
+            path.append(node)
+            left = node.left
+            if start < left.count:
+                node = left
+            else:
+                start -= left.count
+                stop -= left.count
+                node = node.right
+        count = node.count - (stop - start) + len(items)
+        if stop > node.count or not 0 < count <= MAX_LEAF_SIZE:
+            return False
+        node.items[start:stop] = items
+        node.count = count
+        if weights is not None:
+            node.weights[start:stop] = weights
+            node.weight = sum(node.weights)
+        for branch in reversed(path):
+            branch.update()
+        return True
+
+    def weight_before(self, index):
+        # The total weight of the items before index
+        node = self.root
+        total = 0
+        while node is not None and node.height:
+            left = node.left
+            if index < left.count:
+                node = left
+            else:
+                index -= left.count
+                total += left.weight
+                node = node.right
+        if node is not None:
+            total += sum(node.weights[:index])
+        return total
+
+    def find(self, weight):
+        # (index of the item the running total of weights reaches weight in, total weight of the items before it)
+        if not 0 <= weight < self.weight:
+            raise IndexError("Rope weight out of range")
+        node = self.root
+        index = total = 0
+        while node.height:
+            left = node.left
+            if weight < total + left.weight:
+                node = left
+            else:
+                index += left.count
+                total += left.weight
+                node = node.right
+        for item_weight in node.weights:
+            if weight < total + item_weight:
+                break
+            index += 1
+            total += item_weight
+        return index, total
@@ -0,0 +1,246 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+
+from textual._cells import cell_len, cell_width_to_column_index
+from textual._wrap import compute_wrap_offsets
+from textual.document._wrapped_document import WrappedDocument
+from textual.expand_tabs import expand_tabs_inline, get_tab_widths
+from textual.geometry import Offset, clamp
+
+from mehditor.document.rope import Rope
+
+# Long lines are wrapped this many characters at a time, each chunk starting a new row, so an edit only rewraps the
+# chunk it's in
+CHUNK_SIZE = 4096
+# The wrapping of every line when soft wrap is off, shared rather than made for each of millions of lines
+UNWRAPPED = ((), ())
+
+
+def wrap_text(text, width, tab_width):
+    # Returns (wrap offsets, tab widths) as WrappedDocument works them out
+    tab_sections = get_tab_widths(text, tab_width)
+    offsets = compute_wrap_offsets(text, width, tab_width, precomputed_tab_sections=tab_sections) if width else []
+    return offsets, [tab_section_width for _, tab_section_width in tab_sections]
+
+
+class ChunkedWrap:
+    # The wrapping of one long line, in chunks of about CHUNK_SIZE characters. rewrap() compares the new line with the
+    # old one a chunk at a time from each end, and only wraps again what's between the chunks that are unchanged.
+    def __init__(self, width, tab_width, chunk_size=CHUNK_SIZE):
+        self.width = width
+        self.tab_width = tab_width
+        self.chunk_size = chunk_size
+        self.line = ''
+        # [(length, wrap offsets, tab widths)], with offsets relative to the chunk
+        self.chunks = []
+
+    def rewrap(self, line):
+        old, chunks = self.line, self.chunks
+        start = 0
+        head = 0
+        for length, offsets, tab_widths in chunks:
+            end = start + length
+            if end > len(line) or old[start:end] != line[start:end]:
+                break
+            start = end
+            head += 1
+        old_end, new_end = len(old), len(line)
+        tail = len(chunks)
+        while tail > head:
+            length = chunks[tail - 1][0]
+            if new_end - length < start or old[old_end - length:old_end] != line[new_end - length:new_end]:
+                break
+            old_end -= length
+            new_end -= length
+            tail -= 1
+        # What changed is wrapped along with a neighbouring chunk if it's small, rather than becoming a small chunk of
+        # its own (which would end a row early)
+        if new_end - start < self.chunk_size // 2:
+            if head:
+                head -= 1
+                start -= chunks[head][0]
+            elif tail < len(chunks):
+                new_end += chunks[tail][0]
+                tail += 1
+
+        middle = line[start:new_end]
+        count = max(1, len(middle) // self.chunk_size) if middle else 0
+        boundaries = [i * self.chunk_size for i in range(count)] + [len(middle)]
+        rewrapped = []
+        for chunk_start, chunk_end in zip(boundaries, boundaries[1:]):
+            text = middle[chunk_start:chunk_end]
+            rewrapped.append((len(text), *wrap_text(text, self.width, self.tab_width)))
+        self.chunks = chunks[:head] + rewrapped + chunks[tail:]
+        self.line = line
+        return self
+
+    def offsets(self):
+        result = []
+        position = 0
+        for length, offsets, tab_widths in self.chunks:
+            if position:
+                result.append(position)
+            result.extend(position + offset for offset in offsets)
+            position += length
+        return result
+
+    def tab_widths(self):
+        return [width for length, offsets, tab_widths in self.chunks for width in tab_widths]
+
+
+class WrappedSections(Sequence):
+    # Stands in for the list of a line's wrapped sections, without dividing up the whole line
+    def __init__(self, line, offsets):
+        self.line = line
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) + 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.line[self.offsets[index - 1] if index else 0:
+                         self.offsets[index] if index < len(self.offsets) else len(self.line)]
+
+
+def row_count(wrapping):
+    wrap_offsets, tab_widths = wrapping
+    return len(wrap_offsets) + 1
+
+
+class RowLines(Sequence):
+    # Stands in for WrappedDocument._offset_to_line_info: the (line index, section) of each row
+    def __init__(self, wrapping):
+        self.wrapping = wrapping
+
+    def __len__(self):
+        return self.wrapping.weight
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += len(self)
+        line_index, first_row = self.wrapping.find(y)
+        return line_index, y - first_row
+
+
+class LineRows(Sequence):
+    # Stands in for WrappedDocument._line_index_to_offsets: the rows of each line
+    def __init__(self, wrapping):
+        self.wrapping = wrapping
+
+    def __len__(self):
+        return len(self.wrapping)
+
+    def __getitem__(self, line_index):
+        if line_index < 0:
+            line_index += len(self)
+        first_row = self.wrapping.weight_before(line_index)
+        return range(first_row, first_row + row_count(self.wrapping[line_index]))
+
+
+class LineWrapping(Sequence):
+    # Stands in for WrappedDocument._wrap_offsets (field 0) and _tab_width_cache (field 1)
+    def __init__(self, wrapping, field):
+        self.wrapping = wrapping
+        self.field = field
+
+    def __len__(self):
+        return len(self.wrapping)
+
+    def __getitem__(self, line_index):
+        return self.wrapping[line_index][self.field]
+
+
+class ChunkedWrappedDocument(WrappedDocument):
+    # A WrappedDocument that copes with very long lines and long documents. Lines longer than long_line_length are
+    # wrapped in chunks (see ChunkedWrap), with the chunks kept per line so an edit only rewraps the one it's in, and
+    # looking up a position only looks at the section of the line it's in rather than dividing up the whole line.
+    #
+    # The stock version keeps a list of every row, and a list of rows for every line, both renumbered below an edit
+    # that adds or removes rows. Here each line's wrapping is kept in a Rope weighted by its number of rows, so going
+    # between rows and lines, and edits, take O(log n); the stock lists are stood in for by views of it.
+    def __init__(self, document, width=0, tab_width=4, long_line_length=CHUNK_SIZE):
+        self.long_line_length = long_line_length
+        # ChunkedWrap by line index
+        self.long_lines = {}
+        # (wrap offsets, tab widths) by line index
+        self.wrapping = Rope(weigh=row_count)
+        super().__init__(document, width, tab_width)
+
+    @property
+    def height(self):
+        return self.wrapping.weight
+
+    def wrap_line(self, line_index, line):
+        # Returns (wrap offsets, tab widths) for the line
+        width, tab_width = self._width, self._tab_width
+        if not width:
+            # Tab widths are only used to draw wrapped lines, so there's nothing to work out
+            self.long_lines.pop(line_index, None)
+            return UNWRAPPED
+        if len(line) <= self.long_line_length:
+            self.long_lines.pop(line_index, None)
+            return wrap_text(line, width, tab_width)
+        chunked = self.long_lines.get(line_index)
+        if chunked is None or chunked.width != width or chunked.tab_width != tab_width:
+            chunked = self.long_lines[line_index] = ChunkedWrap(width, tab_width)
+        chunked.rewrap(line)
+        return chunked.offsets(), chunked.tab_widths()
+
+    def wrap(self, width, tab_width=None):
+        self._width = width
+        if tab_width:
+            self._tab_width = tab_width
+        self.long_lines = {}
+        self.wrapping = Rope(map(self.wrap_line, range(self.document.line_count), self.document.lines),
+                             weigh=row_count)
+        self._wrap_offsets = LineWrapping(self.wrapping, 0)
+        self._tab_width_cache = LineWrapping(self.wrapping, 1)
+        self._offset_to_line_info = RowLines(self.wrapping)
+        self._line_index_to_offsets = LineRows(self.wrapping)
+
+    def wrap_range(self, start, old_end, new_end):
+        # As WrappedDocument.wrap_range, but lines are wrapped by wrap_line
+        old_max_index = len(self.wrapping) - 1
+        new_max_index = self.document.line_count - 1
+        start_line_index = clamp(start[0], 0, min(old_max_index, new_max_index))
+        top, old_bottom = sorted((start_line_index, clamp(old_end[0], 0, old_max_index)))
+        new_bottom = max(start_line_index, clamp(new_end[0], 0, new_max_index))
+        line_shift = new_bottom - old_bottom
+
+        if line_shift:
+            # Keep the long lines below the edit with their lines
+            self.long_lines = {line_index + line_shift if line_index > old_bottom else line_index: chunked
+                               for line_index, chunked in self.long_lines.items()
+                               if not top < line_index <= old_bottom}
+
+        self.wrapping[top:old_bottom + 1] = map(self.wrap_line, range(top, new_bottom + 1),
+                                                self.document.lines[top:new_bottom + 1])
+
+    def get_sections(self, line_index):
+        return WrappedSections(self.document[line_index], self._wrap_offsets[line_index])
+
+    def location_to_offset(self, location):
+        line_index, column_index = location
+        line_index = clamp(line_index, 0, len(self._line_index_to_offsets) - 1)
+        wrap_offsets = self._wrap_offsets[line_index]
+        section_index = bisect_right(wrap_offsets, column_index)
+        section_start = wrap_offsets[section_index - 1] if section_index else 0
+        line = self.document[line_index]
+        x_offset = cell_len(expand_tabs_inline(line[section_start:column_index], self._tab_width))
+        return Offset(x_offset, self._line_index_to_offsets[line_index][section_index])
+
+    def get_target_document_column(self, line_index, x_offset, y_offset):
+        sections = self.get_sections(line_index)
+        section_index = y_offset % len(sections)
+        wrap_offsets = self._wrap_offsets[line_index]
+        section_start = wrap_offsets[section_index - 1] if section_index else 0
+        section = sections[section_index]
+        column = section_start + cell_width_to_column_index(section, x_offset, self._tab_width)
+        # Only the last section of a line has room for the cursor after its last character
+        if section_index != len(sections) - 1:
+            column = min(column, section_start + len(section) - 1)
+        return column
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import operator
+import os
+import threading
+from bisect import bisect_right
+from heapq import nsmallest
+from itertools import accumulate, islice, repeat
+
+from mehditor import config
+from mehditor.project_search import IGNORE_FILES, IgnoreFile, scan_directory
+
+CACHE_VERSION = 1
+# A query that could match more paths than this only scores this many of its substring matches and this many of its
+# other candidates, shortest paths first, so matching takes about the same time however big the index is
+MAX_SCORED = 3000
+
+
+def cache_file_for(root):
+    digest = hashlib.sha1(str(root).encode('utf-8', errors='surrogateescape')).hexdigest()
+    return config.get_default_cache_dir() / 'file-index' / f'{digest}.json.gz'
+
+
+def directory_signature(directory):
+    # Changes when files are added to, removed from or renamed in directory, or its ignore files change. None if it's
+    # gone.
+    try:
+        signature = [os.stat(directory).st_mtime_ns]
+    except OSError:
+        return None
+    for name in IGNORE_FILES:
+        try:
+            signature.append(os.stat(os.path.join(directory, name)).st_mtime_ns)
+        except OSError:
+            signature.append(0)
+    return signature
+
+
+class FileIndex:
+    # Every file under root that isn't ignored, kept as a listing of each directory so refreshing it only has to
+    # rescan the directories that changed since
+    def __init__(self, root):
+        self.root = root
+        # Relative path of each directory ('' for root) -> [signature, file names, subdirectory names]
+        self.directories = {}
+        # Parsed ignore files, by the relative path of the directory they're in -> (signature, IgnoreFile or None)
+        self.ignore_files = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, root, cache_file):
+        # The index as it was last saved, which may be out of date (see refresh), or an empty one
+        import gzip
+        index = cls(root)
+        try:
+            with gzip.open(cache_file, 'rt', encoding='utf-8', errors='surrogateescape') as fp:
+                cached = json.load(fp)
+            if cached['version'] == CACHE_VERSION and cached['root'] == root:
+                index.directories = cached['directories']
+        except (OSError, EOFError, ValueError, KeyError, TypeError):
+            pass
+        return index
+
+    def save(self, cache_file):
+        import gzip
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        with self.lock:
+            with gzip.open(temp_file, 'wt', encoding='utf-8', errors='surrogateescape', compresslevel=1) as fp:
+                json.dump({'version': CACHE_VERSION, 'root': self.root, 'directories': self.directories}, fp)
+            os.replace(temp_file, cache_file)
+
+    def refresh(self, is_cancelled=lambda: False):
+        # Brings the index up to date. Every directory is stat'ed, but only the ones that changed (or that are under
+        # a changed ignore file) are listed again. Returns whether any files were added or removed, or None if it was
+        # cancelled, in which case the index is left as it was. One refresh (or save) at a time: the quick open
+        # dialog can be opened again, sharing the index, before the last one has finished.
+        with self.lock:
+            previous = self.directories
+            directories = {}
+            changed = False
+            stack = [('', [], False)]
+            while stack:
+                if is_cancelled():
+                    return None
+                relative, ignore_files, rescan = stack.pop()
+                directory = os.path.join(self.root, relative)
+                signature = directory_signature(directory)
+                if signature is None:
+                    changed = True
+                    continue
+                old = previous.get(relative)
+                if old and old[0][1:] != signature[1:]:
+                    # What's ignored below here may have changed too
+                    rescan = True
+                if any(signature[1:]):
+                    ignore_file = self.read_ignore_file(relative, directory, signature)
+                    if ignore_file:
+                        ignore_files = ignore_files + [(directory, ignore_file)]
+
+                if old and not rescan and old[0] == signature:
+                    files, subdirectories = old[1], old[2]
+                else:
+                    files, subdirectories = scan_directory(directory, ignore_files)
+                    changed = changed or not old or old[1] != files or old[2] != subdirectories
+                directories[relative] = [signature, files, subdirectories]
+                stack.extend((f"{relative}/{name}" if relative else name, ignore_files, rescan)
+                             for name in reversed(subdirectories))
+
+            self.directories = directories
+            return changed or directories.keys() != previous.keys()
+
+    def read_ignore_file(self, relative, directory, signature):
+        cached = self.ignore_files.get(relative)
+        if cached and cached[0] == signature[1:]:
+            return cached[1]
+        ignore_file = IgnoreFile.read(directory)
+        self.ignore_files[relative] = (signature[1:], ignore_file)
+        return ignore_file
+
+    def paths(self):
+        # Relative paths of all the files, with / between directories
+        return [f"{relative}/{name}" if relative else name
+                for relative, (signature, files, subdirectories) in self.directories.items()
+                for name in files]
+
+
+def normalize_query(query):
+    return query.lower().replace(' ', '')
+
+
+def score(path, query):
+    # Lower is better, or None if query isn't a subsequence of path. Both are lower case. A match within the file name
+    # beats one elsewhere in the path, which beats the query's characters being scattered; scattered matches are
+    # ranked by how many pieces they're in.
+    name_start = path.rfind('/') + 1
+    position = path.find(query, name_start)
+    if position >= 0:
+        return 0, position - name_start, len(path)
+    if query in path:
+        return 1, 0, len(path)
+    end = len(path)
+    pieces = 0
+    for c in reversed(query):
+        found = path.rfind(c, 0, end)
+        if found < 0:
+            return None
+        if found != end - 1:
+            pieces += 1
+        end = found
+    return 2, pieces, len(path)
+
+
+def match_positions(path, query):
+    # The positions in path of the characters score matched the query with, to highlight them
+    lowered = path.lower()
+    name_start = lowered.rfind('/') + 1
+    position = lowered.find(query, name_start)
+    if position < 0:
+        position = lowered.find(query)
+    if position >= 0:
+        return list(range(position, position + len(query)))
+    positions = []
+    end = len(lowered)
+    for c in reversed(query):
+        end = lowered.rfind(c, 0, end)
+        if end < 0:
+            return []
+        positions.append(end)
+    return positions[::-1]
+
+
+class FuzzyMatcher:
+    # Ranks a list of paths against a query. Only a few thousand paths are ever scored, so candidates are found with
+    # operations that run over all the paths at once:
+    # - substring matches by searching all the (lower case) paths joined into one string
+    # - subsequence matches from a bitmap for each character, with a byte per path that's 1 if the path has that
+    #   character in it. ANDing together the bitmaps for the query's characters leaves the paths that have all of them.
+    # Paths are kept shortest first, which is also the order candidates are taken in.
+    def __init__(self, paths):
+        self.paths = sorted(paths, key=len)
+        self.lowered = [path.lower() for path in self.paths]
+        self.text = ''.join(f"{path}\n" for path in self.lowered)
+        self.starts = [0, *accumulate(len(path) + 1 for path in self.lowered)]
+        characters = set().union(*map(set, self.lowered))
+        self.bitmaps = {c: int.from_bytes(bytes(map(operator.contains, self.lowered, repeat(c))), 'little')
+                        for c in characters}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def substring_candidates(self, query):
+        text = self.text
+        position = text.find(query)
+        while position >= 0:
+            index = bisect_right(self.starts, position) - 1
+            yield index
+            position = text.find(query, self.starts[index + 1])
+
+    def subsequence_candidates(self, query):
+        # A bitmap of the paths with all the query's characters in them
+        bitmap = -1
+        for c in set(query):
+            bitmap &= self.bitmaps.get(c, 0)
+        return bitmap.to_bytes(len(self.paths), 'little') if bitmap > 0 else b''
+
+    def match(self, query, limit):
+        # The best limit paths for query, best first
+        query = normalize_query(query)
+        if not query:
+            return self.paths[:limit]
+        present = self.subsequence_candidates(query)
+        scored = {}
+        if present.count(1) > MAX_SCORED:
+            # The substring matches that rank best could be anywhere among too many candidates to score them all
+            for index in islice(self.substring_candidates(query), MAX_SCORED):
+                scored[index] = score(self.lowered[index], query)
+        index = present.find(1)
+        for _ in range(MAX_SCORED):
+            if index < 0:
+                break
+            if index not in scored:
+                scored[index] = score(self.lowered[index], query)
+            index = present.find(1, index + 1)
+        ranked = nsmallest(limit, ((key, index) for index, key in scored.items() if key is not None))
+        return [self.paths[index] for key, index in ranked]
@@ -0,0 +1,211 @@
+import contextlib
+import hashlib
+import io
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+# Compressed files are recognised by their contents when opened, and by their name when they're new
+COMPRESSION_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+}
+COMPRESSION_SUFFIXES = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+
+
+class WriteCancelled(Exception):
+    pass
+
+
+def content_hash():
+    # What files' contents on disk are hashed with, to tell whether they've changed. Starts out as the hash of an empty
+    # file; it can be update()d as more is read, and copy()d to carry on from where it is.
+    return hashlib.blake2b(digest_size=16)
+
+
+class HashingFile(io.RawIOBase):
+    # Passes reads or writes through to a binary file, hashing the bytes on the way. Closing it leaves fp open.
+    def __init__(self, fp):
+        self.fp = fp
+        self.hash = content_hash()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def readinto(self, b):
+        count = self.fp.readinto(b)
+        if count:
+            self.hash.update(memoryview(b)[:count])
+        return count
+
+    def write(self, b):
+        self.hash.update(b)
+        self.fp.write(b)
+        return len(b)
+
+
+def current_umask():
+    # There's no way to read the umask without setting it, so call this from the main thread
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', umask=0o022, **kwargs):
+    # Writes go to a temporary file in the same directory, which is fsynced and renamed over the original, so the file
+    # on disk is always either the old version or the new one. Raise WriteCancelled (or anything else) inside the
+    # block to leave the original untouched.
+    path = Path(os.path.realpath(path))
+    try:
+        original = path.stat()
+    except FileNotFoundError:
+        original = None
+
+    try:
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    except PermissionError:
+        fd = None
+
+    if fd is None:
+        # We can write the file but not its directory (eg, some files in /etc), so it can only be overwritten in place.
+        # It's written to memory first, so a cancelled or failed write still leaves the original untouched; but unlike
+        # the rename, a crash while it's being written out can leave it half old and half new.
+        buffer = io.BytesIO()
+        fp = buffer if 'b' in mode else io.TextIOWrapper(buffer, **kwargs)
+        yield fp
+        fp.flush()
+        overwrite(path, buffer.getbuffer(), original is not None)
+        return
+
+    try:
+        with open(fd, mode, **kwargs) as fp:
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+        copy_ownership_and_permissions(original, temp_name, umask)
+        os.replace(temp_name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_name)
+        raise
+    fsync_directory(path.parent)
+
+
+def overwrite(path, data, exists):
+    # Writes over the file and then cuts it down to size, rather than emptying it first, and fsyncs it
+    with open(path, 'r+b' if exists else 'wb') as fp:
+        fp.write(data)
+        fp.truncate()
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def detect_compression(path):
+    with open(path, 'rb') as fp:
+        magic = fp.read(max(map(len, COMPRESSION_MAGIC.values())))
+    for compression, prefix in COMPRESSION_MAGIC.items():
+        if magic.startswith(prefix):
+            return compression
+    return None
+
+
+def compression_for_name(path):
+    return COMPRESSION_SUFFIXES.get(Path(path).suffix.lower())
+
+
+def strip_compression_suffix(name):
+    # eg, "access.log.gz" -> "access.log"
+    base, extension = os.path.splitext(name)
+    return base if extension.lower() in COMPRESSION_SUFFIXES else name
+
+
+def open_compressed(fp, compression, mode, name=''):
+    # Wraps an open binary file. Closing the result doesn't close fp. The compression modules are only imported for
+    # compressed files, as most never are.
+    if compression == 'gzip':
+        import gzip
+        # The name goes in the gzip header; otherwise it'd be the name of fp, which might be a temporary file
+        return gzip.GzipFile(filename=strip_compression_suffix(name), fileobj=fp, mode=mode)
+    elif compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(fp, mode=mode)
+    elif compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(fp, mode=mode)
+    return fp
+
+
+def decompression_errors():
+    # What can go wrong reading a corrupt or truncated compressed file, besides OSError. Only called from an except
+    # clause, so lzma isn't imported unless something has gone wrong.
+    import lzma
+    return EOFError, lzma.LZMAError
+
+
+def text_reader(fp, compression):
+    # Text (in the default encoding, with universal newlines, like open()) from an open binary file
+    return io.TextIOWrapper(open_compressed(fp, compression, 'rb'))
+
+
+def read_text(path):
+    # Returns the whole (decompressed) text of a file, its stat and the hash of its contents on disk
+    with open(path, 'rb') as raw:
+        stat = os.fstat(raw.fileno())
+        hashing = HashingFile(raw)
+        compression = detect_compression(path)
+        with text_reader(io.BufferedReader(hashing), compression) as fp:
+            text = fp.read()
+        return text, stat, hashing.hash
+
+
+def same_file_version(stat, other):
+    # Whether two stats are (almost certainly) of the same file with the same contents
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino) == (other.st_size, other.st_mtime_ns, other.st_ino)
+
+
+@contextlib.contextmanager
+def text_writer(fp, compression, name=''):
+    # The writing counterpart of text_reader; leaves fp open (eg, for atomic_write to fsync)
+    compressed = open_compressed(fp, compression, 'wb', name)
+    text = io.TextIOWrapper(compressed)
+    try:
+        yield text
+        text.flush()
+    finally:
+        text.detach()
+        if compressed is not fp:
+            compressed.close()
+
+
+def copy_ownership_and_permissions(original, temp_name, umask):
+    if original is None:
+        os.chmod(temp_name, 0o666 & ~umask)
+        return
+
+    if hasattr(os, 'chown'):
+        # Only root can give a file away; otherwise this keeps at most the group
+        with contextlib.suppress(OSError):
+            os.chown(temp_name, original.st_uid, original.st_gid)
+    os.chmod(temp_name, stat.S_IMODE(original.st_mode))
+
+
+def fsync_directory(directory):
+    # Makes the rename itself durable. Not possible (or needed) everywhere.
+    if os.name == 'nt':
+        return
+    with contextlib.suppress(OSError):
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
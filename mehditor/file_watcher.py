@@ -0,0 +1,66 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+WATCH_EVENTS = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+
+_libc = None
+
+
+def load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    return _libc
+
+
+class InotifyWatcher:
+    # Linux only; loaded through ctypes, so there's nothing extra to install
+    def __init__(self, path):
+        libc = load_libc()
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_EVENTS) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), str(path))
+
+    def wait(self, timeout):
+        # Returns once the file may have changed, or after timeout seconds
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    # Everywhere else: the caller checks the file itself each time this returns
+    def __init__(self, path, interval):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+
+    def close(self):
+        pass
+
+
+def file_watcher(path, poll_interval=0.5):
+    try:
+        return InotifyWatcher(path)
+    except (OSError, AttributeError, TypeError):
+        # No inotify (not Linux, or no watches left)
+        return PollingWatcher(path, poll_interval)
@@ -0,0 +1,110 @@
+import re
+from collections import Counter
+
+# Indentation is detected from windows of this many consecutive lines, this many of them spread through the file, so
+# it's quick however long the file is
+SAMPLE_WINDOWS = 16
+SAMPLE_WINDOW_SIZE = 64
+# Indent widths detection will report
+INDENT_WIDTHS = (2, 3, 4, 8)
+# Indent widths that can be set
+MIN_INDENT_WIDTH = 1
+MAX_INDENT_WIDTH = 16
+DEFAULT_INDENT_WIDTH = 4
+# When reindenting, changed lines this close together are replaced in one edit, rather than an edit each
+MAX_GAP = 8
+# Past this many edits, one edit covers every changed line instead
+MAX_EDITS = 1000
+
+LEADING_WHITESPACE = re.compile(r"[ \t]*")
+
+
+def sample_windows(lines):
+    count = len(lines)
+    if count <= SAMPLE_WINDOWS * SAMPLE_WINDOW_SIZE:
+        yield lines[:count]
+        return
+    step = count // SAMPLE_WINDOWS
+    for start in range(0, step * SAMPLE_WINDOWS, step):
+        yield lines[start:start + SAMPLE_WINDOW_SIZE]
+
+
+def detect_indentation(lines):
+    # (indent type, indent width) a sample of the lines are indented with, or None if they aren't. The width is None
+    # for tabs, which could be shown at any width. Spaces' width is the commonest change in indentation from one line
+    # to the next, as it's usually one level.
+    tabs = spaces = 0
+    changes = Counter()
+    for window in sample_windows(lines):
+        previous = None
+        for line in window:
+            whitespace = LEADING_WHITESPACE.match(line).group()
+            if len(whitespace) == len(line):
+                continue
+            if whitespace.startswith("\t"):
+                tabs += 1
+            # A single space is usually lining something up (eg, the * in a /* comment */), not indentation
+            elif len(whitespace) > 1:
+                spaces += 1
+            width = None if "\t" in whitespace else len(whitespace)
+            if width is not None and previous is not None and abs(width - previous) in INDENT_WIDTHS:
+                changes[abs(width - previous)] += 1
+            previous = width
+    if tabs > spaces:
+        return "tabs", None
+    if spaces and changes:
+        return "spaces", changes.most_common(1)[0][0]
+    return None
+
+
+def valid_indent_width(width, default=DEFAULT_INDENT_WIDTH):
+    # width if it's one that can be set, otherwise default (eg, for a bad width in the settings file)
+    return width if MIN_INDENT_WIDTH <= width <= MAX_INDENT_WIDTH else default
+
+
+def describe(indent_type, indent_width):
+    return "tabs" if indent_type == "tabs" else f"{indent_width} spaces"
+
+
+def reindent_line(line, from_width, to_type, to_width):
+    # The line with its leading whitespace taken as levels of from_width columns (a tab going on to the next level),
+    # and each level made a tab or to_width spaces. Columns past the last level (eg, lining up a continuation line) are
+    # kept as spaces.
+    whitespace = LEADING_WHITESPACE.match(line).group()
+    column = 0
+    for character in whitespace:
+        column += from_width - column % from_width if character == "\t" else 1
+    levels, extra = divmod(column, from_width)
+    indent = "\t" * levels if to_type == "tabs" else " " * (levels * to_width)
+    return indent + " " * extra + line[len(whitespace):]
+
+
+def join_runs(lines, run, other):
+    first, last, new_lines = run
+    other_first, other_last, other_lines = other
+    new_lines.extend(lines[last + 1:other_first])
+    new_lines.extend(other_lines)
+    return first, other_last, new_lines
+
+
+def reindent(lines, from_width, to_type, to_width):
+    # ([(first row, last row, their new lines)] covering the lines whose indentation changes, number of lines changed)
+    runs = []
+    changed = 0
+    for row, line in enumerate(lines):
+        if not line or line[0] not in " \t":
+            continue
+        new_line = reindent_line(line, from_width, to_type, to_width)
+        if new_line == line:
+            continue
+        changed += 1
+        if runs and row - runs[-1][1] <= MAX_GAP:
+            runs[-1] = join_runs(lines, runs[-1], (row, row, [new_line]))
+        else:
+            runs.append((row, row, [new_line]))
+    if len(runs) > MAX_EDITS:
+        run = runs[0]
+        for other in runs[1:]:
+            run = join_runs(lines, run, other)
+        runs = [run]
+    return runs, changed
@@ -0,0 +1,222 @@
+import contextlib
+import hashlib
+import os
+import struct
+import threading
+import zlib
+
+from mehditor import config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where journals aren't locked
+    fcntl = None
+
+# A journal is a header identifying the file it applies to (and the version of it on disk), followed by one record per
+# change to the buffer. Appending a record costs the size of the change, not the size of the file.
+#
+# Record: type byte, the four ints of the replaced range and the length of the new text as varints, the text as UTF-8,
+# then a CRC32 of all of that. A record that was only partly written when the process died fails its CRC, and replay
+# stops there.
+JOURNAL_MAGIC = b'MEHJNL01'
+JOURNAL_HEADER = struct.Struct('<8sBQQ')
+RECORD_REPLACE = 1
+CRC = struct.Struct('<I')
+
+
+class JournalInUse(OSError):
+    pass
+
+
+def journal_file_for(path):
+    digest = hashlib.sha1(str(path).encode('utf-8', errors='surrogateescape')).hexdigest()
+    return config.get_default_state_dir() / 'recovery' / f'{digest}.journal'
+
+
+def base_of(stat):
+    if stat is None:
+        return False, 0, 0
+    return True, stat.st_size, stat.st_mtime_ns
+
+
+def encode_varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def decode_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def encode_record(change):
+    (top_row, top_column), (bottom_row, bottom_column), text = change
+    text = text.encode('utf-8', errors='surrogatepass')
+    record = bytearray([RECORD_REPLACE])
+    for value in (top_row, top_column, bottom_row, bottom_column, len(text)):
+        record += encode_varint(value)
+    record += text
+    return bytes(record + CRC.pack(zlib.crc32(record)))
+
+
+def decode_records(data, position):
+    # Yields (change, end position) for each complete, intact record
+    while position < len(data):
+        start = position
+        try:
+            if data[position] != RECORD_REPLACE:
+                return
+            values = []
+            position += 1
+            for _ in range(5):
+                value, position = decode_varint(data, position)
+                values.append(value)
+            top_row, top_column, bottom_row, bottom_column, length = values
+            text = data[position:position + length]
+            position += length
+            crc, = CRC.unpack_from(data, position)
+        except (IndexError, struct.error):
+            return
+        if len(text) != length or crc != zlib.crc32(data[start:position]):
+            return
+        position += CRC.size
+        yield ((top_row, top_column), (bottom_row, bottom_column), text.decode('utf-8', errors='surrogatepass')), position
+
+
+class Journal:
+    def __init__(self, path, stat):
+        self.path = path
+        self.journal_file = journal_file_for(path)
+        self.base = base_of(stat)
+        self.fp = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def exists(self):
+        return self.journal_file.exists()
+
+    def in_use(self):
+        # Whether another instance of the editor has the journal open (see _open), in which case it's that instance's
+        # record of its unsaved changes, not one left behind by a crash
+        if fcntl is None:
+            return False
+        try:
+            with open(self.journal_file, 'rb') as fp:
+                fcntl.flock(fp, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def read(self):
+        # Returns (base, changes) for the journal on disk, or None if it isn't a journal
+        data = self.journal_file.read_bytes()
+        try:
+            magic, existed, size, mtime_ns = JOURNAL_HEADER.unpack_from(data)
+        except struct.error:
+            return None
+        if magic != JOURNAL_MAGIC:
+            return None
+        changes = [change for change, _ in decode_records(data, JOURNAL_HEADER.size)]
+        return (bool(existed), size, mtime_ns), changes
+
+    def resume(self):
+        # Carry on appending to the journal on disk, after its last intact record
+        data = self.journal_file.read_bytes()
+        end = JOURNAL_HEADER.size
+        for _, end in decode_records(data, JOURNAL_HEADER.size):
+            pass
+        self.fp = self._open('r+b')
+        self.fp.truncate(end)
+        self.fp.seek(end)
+
+    def append(self, changes):
+        if self.fp is None:
+            self.fp = self._open('wb')
+            self.fp.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, *self.base))
+        self.fp.write(b''.join(encode_record(change) for change in changes))
+        # Flushed to the OS straight away, which survives the process dying; fsync is batched (see sync)
+        self.fp.flush()
+        self.dirty = True
+
+    def sync(self):
+        with self.lock:
+            if self.fp is not None and self.dirty:
+                self.dirty = False
+                os.fsync(self.fp.fileno())
+
+    def mark(self):
+        # The position after the last record so far; see rebase
+        return self.fp.tell() if self.fp else JOURNAL_HEADER.size
+
+    def rebase(self, stat, mark):
+        # The buffer as of `mark` has been saved: keep only the records after it, relative to the new file on disk
+        self.base = base_of(stat)
+        if self.fp is None:
+            return
+        with open(self.journal_file, 'rb') as fp:
+            fp.seek(mark)
+            remaining = fp.read()
+        if not remaining:
+            self.discard()
+            return
+
+        # The new journal is locked before it replaces the old one, which is only unlocked after, so another instance
+        # never sees an unlocked journal that's in use
+        temp_file = self.journal_file.with_name(f"{self.journal_file.name}.tmp")
+        fp = self._open('wb', temp_file)
+        fp.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, *self.base))
+        fp.write(remaining)
+        fp.flush()
+        os.replace(temp_file, self.journal_file)
+        self.close()
+        self.fp = fp
+        self.dirty = True
+
+    def close(self):
+        with self.lock:
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+
+    def discard(self):
+        self.close()
+        with contextlib.suppress(FileNotFoundError):
+            self.journal_file.unlink()
+
+    def set_aside(self):
+        # Keeps a journal that no longer applies out of the way of the new one, rather than deleting it
+        self.close()
+        stale_file = self.journal_file.with_name(f"{self.journal_file.name}.stale")
+        os.replace(self.journal_file, stale_file)
+        return stale_file
+
+    def _open(self, mode, journal_file=None):
+        # Journals hold the contents of whatever is being edited, so they're only readable by their owner. They're
+        # locked for as long as they're open, and only truncated once they are, so one in use by another instance is
+        # never written over.
+        journal_file = journal_file or self.journal_file
+        journal_file.parent.mkdir(parents=True, exist_ok=True)
+        fp = open(os.open(journal_file, os.O_RDWR | os.O_CREAT, 0o600), mode)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fp.close()
+                raise JournalInUse(f"{journal_file} is in use by another instance of the editor") from None
+        if mode == 'wb':
+            fp.truncate()
+        return fp
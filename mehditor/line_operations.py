@@ -0,0 +1,87 @@
+import math
+import re
+
+# Operations on whole lines (sorting, removing duplicates, filtering), each taking a list of lines and returning the new
+# list. line_replacement turns the result into a single edit of the document, covering only the lines that changed.
+
+NUMBER = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+DIGITS = re.compile(r"[0-9]+")
+
+
+def pad_number(match):
+    digits = match.group().lstrip("0")
+    return f"{len(digits):05}{digits}"
+
+
+def natural_key(line):
+    # Runs of digits compare as numbers ("file2" before "file10"), by putting their length in front of them, and the
+    # rest ignoring case. Much quicker to sort by than a list of parts.
+    return DIGITS.sub(pad_number, line.casefold()), line
+
+
+def numeric_key(line):
+    # The number the line starts with, as sort -n does; lines that don't start with one go first
+    match = NUMBER.match(line)
+    return float(match.group(1)) if match else -math.inf
+
+
+def sort_natural(lines):
+    return sorted(lines, key=natural_key)
+
+
+def sort_numeric(lines):
+    # Stable, so lines with the same number keep their order
+    return sorted(lines, key=numeric_key)
+
+
+def unique(lines):
+    # The first of each line, wherever its duplicates are
+    return list(dict.fromkeys(lines))
+
+
+def keep_matching(pattern):
+    return lambda lines: [line for line in lines if pattern.search(line)]
+
+
+def drop_matching(pattern):
+    return lambda lines: [line for line in lines if not pattern.search(line)]
+
+
+def reverse(lines):
+    return lines[::-1]
+
+
+def line_range(line_count, last_line, start, end):
+    # The rows (start, stop) an operation applies to: those the selection is on, or every line if nothing's selected.
+    # A selection ending at the start of a line leaves that line out, as does the whole file's trailing line break.
+    (top_row, top_column), (bottom_row, bottom_column) = sorted((start, end))
+    if (top_row, top_column) == (bottom_row, bottom_column):
+        return 0, line_count - 1 if line_count > 1 and last_line == "" else line_count
+    if bottom_column == 0 and bottom_row > top_row:
+        return top_row, bottom_row
+    return top_row, bottom_row + 1
+
+
+def line_replacement(lines, start, stop, new_lines):
+    # (start location, end location, text) replacing rows start..stop of lines with new_lines, trimmed to the rows that
+    # actually change, or None if none do
+    old_stop = stop
+    new_stop = len(new_lines)
+    while start < old_stop and new_stop and lines[old_stop - 1] == new_lines[new_stop - 1]:
+        old_stop -= 1
+        new_stop -= 1
+    first = 0
+    while start + first < old_stop and first < new_stop and lines[start + first] == new_lines[first]:
+        first += 1
+    start += first
+    new_lines = new_lines[first:new_stop]
+    if start == old_stop and not new_lines:
+        return None
+    if old_stop < len(lines):
+        # Whole lines, up to the start of the next
+        return (start, 0), (old_stop, 0), "".join(line + "\n" for line in new_lines)
+    if start > 0:
+        # Up to the end of the document, so from the end of the line before
+        return (start - 1, len(lines[start - 1])), (old_stop - 1, len(lines[-1])), \
+            "".join("\n" + line for line in new_lines)
+    return (0, 0), (old_stop - 1, len(lines[-1])), "\n".join(new_lines)
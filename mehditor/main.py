@@ -1,18 +1,68 @@
-def main():
+import time
+
+
+def parse_args(argv=None):
     import argparse
 
     parser = argparse.ArgumentParser(description="Mehditor")
     parser.add_argument("filename", nargs="*", help="File to open")
-    args = parser.parse_args()
+    parser.add_argument("-f", "--follow", action="store_true", help="Show new lines as they're written to the file")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Start up, exit as soon as the editor has been drawn, and report how long each stage took")
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument("--server", action="store_true",
+                        help="Start a background server that later invocations hand the terminal to, to start faster")
+    server.add_argument("--stop-server", action="store_true", help="Stop the background server")
+    server.add_argument("--no-server", action="store_true", help="Start normally, even if the server is running")
+    return parser.parse_args(argv)
+
+
+def main():
+    started = time.perf_counter()
+    import sys
+    from mehditor import server
 
+    args = parse_args()
+    if args.server:
+        sys.exit(server.start())
+    elif args.stop_server:
+        sys.exit(server.stop())
+    elif not args.no_server:
+        status = server.run_client(sys.argv[1:])
+        if status is not None:
+            sys.exit(status)
+    sys.exit(run(args, started))
+
+
+def run(args, started, suspend=None):
+    # Starts the editor in this process; returns its exit status. suspend is what to do instead of suspending this
+    # process (see MeheditorApp).
+    timings = []
+
+    def mark(stage):
+        timings.append((stage, time.perf_counter()))
+
+    from mehditor import config
+    config.ensure_loaded()
+    mark("config loaded")
+    import textual.app
+    mark("textual imported")
     from mehditor.screens.mehditor_app import MeheditorApp
+    mark("editor imported")
+
+    app = MeheditorApp(file=args.filename[0] if args.filename else None, follow=args.follow,
+                       exit_on_first_paint=args.startup_profile, suspend=suspend)
+    mark("app created")
+    first_paint = app.run()
 
-    if args.filename:
-        app = MeheditorApp(file=args.filename[0])
-        app.run()
-    else:
-        app = MeheditorApp(file=None)
-        app.run()
+    if args.startup_profile and first_paint:
+        timings.append(("first paint", first_paint))
+        print("Startup profile (seconds since main() started):")
+        previous = started
+        for stage, at in timings:
+            print(f"  {at - started:7.3f}  (+{at - previous:.3f})  {stage}")
+            previous = at
+    return app.return_code or 0
 
 
 if __name__ == "__main__":
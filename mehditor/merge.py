@@ -0,0 +1,109 @@
+import tempfile
+import threading
+from difflib import SequenceMatcher
+
+from mehditor import config
+
+MINE_MARKER = "<<<<<<< unsaved changes\n"
+SEPARATOR_MARKER = "=======\n"
+THEIRS_MARKER = ">>>>>>> on disk\n"
+
+
+def sync_regions(base, mine, theirs):
+    # Runs of base lines left unchanged in both mine and theirs, as (base start, base end, mine start, mine end,
+    # theirs start, theirs end), ending with an empty region at the end of all three
+    mine_matches = SequenceMatcher(None, base, mine, autojunk=False).get_matching_blocks()
+    theirs_matches = SequenceMatcher(None, base, theirs, autojunk=False).get_matching_blocks()
+    regions = []
+    i = j = 0
+    while i < len(mine_matches) and j < len(theirs_matches):
+        mine_base, mine_start, mine_length = mine_matches[i]
+        theirs_base, theirs_start, theirs_length = theirs_matches[j]
+        start = max(mine_base, theirs_base)
+        end = min(mine_base + mine_length, theirs_base + theirs_length)
+        if start < end:
+            regions.append((start, end,
+                            mine_start + start - mine_base, mine_start + end - mine_base,
+                            theirs_start + start - theirs_base, theirs_start + end - theirs_base))
+        if mine_base + mine_length < theirs_base + theirs_length:
+            i += 1
+        else:
+            j += 1
+    regions.append((len(base), len(base), len(mine), len(mine), len(theirs), len(theirs)))
+    return regions
+
+
+def with_line_end(lines):
+    if lines and not lines[-1].endswith("\n"):
+        return lines[:-1] + [lines[-1] + "\n"]
+    return lines
+
+
+def merge3(base, mine, theirs):
+    # Line-based three-way merge of two versions of base. Returns the merged text and how many conflicts were marked
+    # in it; a conflict is a run of lines changed differently in both versions, and keeps both.
+    base_lines = base.splitlines(keepends=True)
+    mine_lines = mine.splitlines(keepends=True)
+    theirs_lines = theirs.splitlines(keepends=True)
+    merged = []
+    conflicts = 0
+    base_position = mine_position = theirs_position = 0
+    for base_start, base_end, mine_start, mine_end, theirs_start, theirs_end in sync_regions(
+            base_lines, mine_lines, theirs_lines):
+        base_chunk = base_lines[base_position:base_start]
+        mine_chunk = mine_lines[mine_position:mine_start]
+        theirs_chunk = theirs_lines[theirs_position:theirs_start]
+        if mine_chunk == base_chunk:
+            merged.extend(theirs_chunk)
+        elif theirs_chunk == base_chunk or mine_chunk == theirs_chunk:
+            merged.extend(mine_chunk)
+        else:
+            conflicts += 1
+            merged.append(MINE_MARKER)
+            merged.extend(with_line_end(mine_chunk))
+            merged.append(SEPARATOR_MARKER)
+            merged.extend(with_line_end(theirs_chunk))
+            merged.append(THEIRS_MARKER)
+        merged.extend(base_lines[base_start:base_end])
+        base_position, mine_position, theirs_position = base_end, mine_end, theirs_end
+    return "".join(merged), conflicts
+
+
+class MergeBase:
+    # The text that the buffer's unsaved changes were made to, for merge3: the file as it was loaded or last saved, plus
+    # whatever was appended while following. It's only read back to merge, so rather than being kept in memory it's
+    # written to an unnamed temporary file in the state directory, which goes once it's closed (or the process dies).
+    # Nothing is written for an empty base.
+    def __init__(self):
+        self.fp = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def append(self, text):
+        # A base that can't be written only means there's nothing to merge with, so this doesn't raise; read does
+        with self.lock:
+            if not text or self.error:
+                return
+            try:
+                if self.fp is None:
+                    directory = config.get_default_state_dir() / 'merge-base'
+                    directory.mkdir(parents=True, exist_ok=True)
+                    self.fp = tempfile.TemporaryFile(dir=directory)
+                self.fp.seek(0, 2)
+                self.fp.write(text.encode('utf-8', errors='surrogatepass'))
+            except OSError as e:
+                self.error = e
+
+    def read(self):
+        with self.lock:
+            if self.error:
+                raise self.error
+            if self.fp is None:
+                return ''
+            self.fp.seek(0)
+            return self.fp.read().decode('utf-8', errors='surrogatepass')
+
+    def close(self):
+        with self.lock:
+            if self.fp is not None:
+                self.fp.close()
@@ -0,0 +1,216 @@
+import os
+import re
+
+# Never searched, whatever the ignore files say
+ALWAYS_IGNORED = {'.git', '.hg', '.svn'}
+IGNORE_FILES = ('.gitignore', '.ignore')
+# Files with a NUL byte in this much of their start are taken to be binary
+BINARY_SNIFF_SIZE = 8192
+# Bigger files are skipped, rather than read into memory whole
+MAX_FILE_SIZE = 64 * 1024 * 1024
+# At most this many matching lines are reported per file, each cut down to this many characters
+MAX_FILE_MATCHES = 1000
+MAX_LINE_LENGTH = 200
+# Where str.splitlines (and so the editor's document) breaks lines, besides \n and \r\n
+OTHER_LINE_BREAKS = '\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+OTHER_LINE_BREAK = re.compile(f'[{OTHER_LINE_BREAKS}]')
+
+
+def glob_to_regex(glob):
+    # The subset of gitignore globs: *, ?, [...] and ** for any number of directories
+    parts = []
+    position = 0
+    while position < len(glob):
+        c = glob[position]
+        if glob.startswith('**/', position):
+            parts.append('(?:.*/)?')
+            position += 3
+            continue
+        elif glob.startswith('/**', position) and position + 3 == len(glob):
+            parts.append('/.*')
+            position += 3
+            continue
+        elif c == '*':
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            end = glob.find(']', position + 1)
+            if end < 0:
+                parts.append(re.escape(c))
+            else:
+                contents = glob[position + 1:end]
+                if contents.startswith('!'):
+                    contents = '^' + contents[1:]
+                parts.append(f'[{contents}]')
+                position = end
+        elif c == '\\' and position + 1 < len(glob):
+            position += 1
+            parts.append(re.escape(glob[position]))
+        else:
+            parts.append(re.escape(c))
+        position += 1
+    return ''.join(parts)
+
+
+class IgnoreFile:
+    # The patterns in one .gitignore, which apply to paths relative to the directory it's in
+    def __init__(self, lines):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            directory_only = line.endswith('/')
+            line = line.rstrip('/')
+            # A pattern with a slash in it is relative to this directory; otherwise it matches a name at any depth
+            anchored = '/' in line
+            if not line:
+                continue
+            try:
+                regex = re.compile(glob_to_regex(line.lstrip('/')))
+            except re.error:
+                continue
+            self.rules.append((regex, negated, directory_only, anchored))
+
+    @classmethod
+    def read(cls, directory):
+        rules = []
+        for name in IGNORE_FILES:
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8', errors='replace') as fp:
+                    rules.extend(fp)
+            except OSError:
+                pass
+        return cls(rules) if rules else None
+
+    def match(self, relative_path, name, is_dir):
+        # True if ignored, False if explicitly not ignored (!pattern), None if no pattern mentions it
+        for regex, negated, directory_only, anchored in reversed(self.rules):
+            if directory_only and not is_dir:
+                continue
+            if regex.fullmatch(relative_path if anchored else name):
+                return not negated
+        return None
+
+
+def is_ignored(ignore_files, path, name, is_dir):
+    # ignore_files is [(directory, IgnoreFile)] from the top down; the deepest one with an opinion wins
+    for directory, ignore_file in reversed(ignore_files):
+        relative_path = path[len(directory):].lstrip(os.sep).replace(os.sep, '/')
+        ignored = ignore_file.match(relative_path, name, is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def scan_directory(directory, ignore_files):
+    # The names of the regular files and of the subdirectories in directory that aren't ignored, each in name order.
+    # ignore_files are the ones that apply to directory, including its own.
+    try:
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+    except OSError:
+        return [], []
+    files = []
+    subdirectories = []
+    for entry in entries:
+        if entry.name in ALWAYS_IGNORED:
+            continue
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            is_file = not is_dir and entry.is_file()
+        except OSError:
+            continue
+        if not (is_dir or is_file) or (ignore_files and is_ignored(ignore_files, entry.path, entry.name, is_dir)):
+            continue
+        (subdirectories if is_dir else files).append(entry.name)
+    return sorted(files), sorted(subdirectories)
+
+
+def walk_files(root, is_cancelled=lambda: False):
+    # Yields the path of every regular file under root that isn't ignored, without following symlinked directories
+    stack = [(root, [])]
+    while stack and not is_cancelled():
+        directory, ignore_files = stack.pop()
+        ignore_file = IgnoreFile.read(directory)
+        if ignore_file:
+            ignore_files = ignore_files + [(directory, ignore_file)]
+        files, subdirectories = scan_directory(directory, ignore_files)
+        for name in files:
+            yield os.path.join(directory, name)
+        # Depth first, in name order
+        stack.extend((os.path.join(directory, name), ignore_files) for name in reversed(subdirectories))
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def silence_stderr():
+    # Runs in each worker process as it starts. Its stderr is still the terminal the editor is drawing on (Textual only
+    # replaces sys.stderr in its own process), so anything written there would garble the screen.
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+
+
+def one_line_break(text):
+    # text with every line break made a \n, so lines are numbered (and ^ and $ match) as they are in the editor.
+    # Looking for the rarer ones first is quicker than replacing them with a regex when there aren't any.
+    text = text.replace('\r\n', '\n')
+    if any(line_break in text for line_break in OTHER_LINE_BREAKS):
+        text = OTHER_LINE_BREAK.sub('\n', text)
+    return text
+
+
+def grep_files(paths, pattern):
+    # Runs in a worker process. Returns [(path, [(line number, column, line)])] for the files with matches in them.
+    # Only the first match on each line is reported.
+    regex = re.compile(pattern.pattern, pattern.flags | re.MULTILINE)
+    results = []
+    for path in paths:
+        try:
+            if os.path.getsize(path) > MAX_FILE_SIZE:
+                continue
+            with open(path, 'rb') as fp:
+                data = fp.read(BINARY_SNIFF_SIZE)
+                if b'\0' in data:
+                    continue
+                data += fp.read()
+        except OSError:
+            continue
+        text = one_line_break(data.decode('utf-8', errors='replace'))
+
+        matches = []
+        line_number = 1
+        counted_to = 0
+        next_line = 0
+        for match in regex.finditer(text):
+            start = match.start()
+            if start < next_line or match.end() == start:
+                continue
+            line_number += text.count('\n', counted_to, start)
+            counted_to = start
+            line_start = text.rfind('\n', 0, start) + 1
+            line_end = text.find('\n', start)
+            if line_end < 0:
+                line_end = len(text)
+            next_line = line_end + 1
+            line = text[line_start:min(line_end, line_start + MAX_LINE_LENGTH)]
+            matches.append((line_number, start - line_start, line))
+            if len(matches) >= MAX_FILE_MATCHES:
+                break
+        if matches:
+            results.append((path, matches))
+    return results
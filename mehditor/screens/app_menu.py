@@ -71,6 +71,7 @@ class AppMenu(ModalScreen):
         "f", "File", [
             ["new_file", "New", "n"],
             ["open_file", "Open...", "o"],
+            ["quick_open", "Quick Open...", "p"],
             ["save_file", "Save", "s"],
             ["save_file_as", "Save As...", "a"],
             "-",
@@ -85,6 +86,18 @@ class AppMenu(ModalScreen):
             ["paste", "Paste", "v"],
             ["undo_change", "Undo", "u"],
             ["redo_change", "Redo", "r"],
+            "-",
+            ["find", "Find...", "s"],
+            ["find_next", "Find Next", "n"],
+            ["find_previous", "Find Previous", "p"],
+            ["replace_all", "Replace All...", "a"],
+            "-",
+            ["sort_lines", "Sort Lines", "o"],
+            ["sort_lines_numerically", "Sort Lines Numerically", "m"],
+            ["remove_duplicate_lines", "Remove Duplicate Lines", "d"],
+            ["keep_matching_lines", "Keep Lines Matching...", "k"],
+            ["delete_matching_lines", "Delete Lines Matching...", "l"],
+            ["reverse_lines", "Reverse Lines", "b"],
         ]
     ]
     menus["view"] = [
@@ -95,10 +108,12 @@ class AppMenu(ModalScreen):
             "-",
             ["change_file_type", "File type...", "y"],
             ["toggle_soft_wrap", "Toggle soft wrap...", "s"],
+            ["toggle_follow", "Follow File (tail -f)", "o"],
 
             # This seems to be broken up stream
             ["set_indent_type", "Set Indent Type...", "n"],
             ["set_indent_width", "Set Indent Width...", "i"],
+            ["convert_indentation", "Convert Indentation", "c"],
         ]
     ]
     menus["help"] = [
@@ -0,0 +1,70 @@
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical, Container
+from textual.screen import ModalScreen
+from textual.widgets import Label, Button
+
+
+class ExternalChange(ModalScreen):
+    # Asked when the file on disk has changed since it was opened or last saved. When saving, "overwrite" saves over
+    # the other changes; otherwise it keeps the buffer as it is.
+    BINDINGS = [
+        Binding("r", "reload", "Reload", show=False),
+        Binding("o", "overwrite", "Overwrite", show=False),
+        Binding("m", "merge", "Merge", show=False),
+        Binding("c", "cancel", "Cancel", show=False),
+    ]
+
+    CSS = """
+    ExternalChange {
+        align: center middle;
+    }
+
+    #dialog {
+        width: 60;
+        height: 23;
+        border: thick $background 80%;
+        background: $surface;
+    }
+
+    #question {
+        align: center middle;
+        height: 5;
+        width: 100%;
+        padding: 0 1;
+    }
+
+    Button {
+        width: 100%;
+        margin: 1
+    }
+    """
+
+    def __init__(self, file_name, saving):
+        super().__init__()
+        self.file_name = file_name
+        self.saving = saving
+
+    def compose(self) -> ComposeResult:
+        with Vertical(id="dialog"):
+            yield Container(Label(f"{self.file_name} has been changed by another program since it was opened."),
+                            id="question")
+            yield Button("R: Reload from disk (lose unsaved changes)", variant="error", id="reload")
+            yield Button("O: Overwrite with this version" if self.saving else "O: Keep this version", id="overwrite")
+            yield Button("M: Merge the changes", variant="primary", id="merge")
+            yield Button("C: Cancel", id="cancel")
+
+    def action_reload(self) -> None:
+        self.dismiss("reload")
+
+    def action_overwrite(self) -> None:
+        self.dismiss("overwrite")
+
+    def action_merge(self) -> None:
+        self.dismiss("merge")
+
+    def action_cancel(self) -> None:
+        self.dismiss("cancel")
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        self.dismiss(event.button.id)
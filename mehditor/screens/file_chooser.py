@@ -1,13 +1,77 @@
+import contextlib
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 
-from textual import on
+from rich.text import Text
+from textual import on, work
+from textual.binding import Binding
 from textual.containers import Vertical, Horizontal
 from textual.reactive import reactive
 from textual.screen import ModalScreen
-from textual.widgets import Button, DirectoryTree, Label
+from textual.widgets import Button, DirectoryTree, Label, OptionList
 from textual.widgets import Input
+from textual.worker import get_current_worker
 
+from mehditor.directory_listing import complete_path, find_entry
+from mehditor.project_search import batched, grep_files, silence_stderr, walk_files
 from mehditor.screens.confirm_dialog import ConfirmDialog
+from mehditor.search import compile_query
+from mehditor.widgets.directory_list import DirectoryList
+
+# Files are handed to the worker processes this many at a time, with at most GREP_PENDING_BATCHES waiting at once so
+# the directory walk doesn't get too far ahead of the searching
+GREP_BATCH_SIZE = 64
+GREP_PENDING_BATCHES = 64
+# The search stops after finding this many matching lines
+GREP_MAX_RESULTS = 10000
+# Results are added to the list at most this often (in seconds), since every addition re-renders it
+GREP_REPORT_INTERVAL = 0.25
+# When a Tab completion is ambiguous, up to this many of the names it could be are shown
+COMPLETION_NAMES_SHOWN = 20
+# Directories with more entries than this are shown in a flat DirectoryList rather than the DirectoryTree, which stats
+# every entry and builds a node for each
+LARGE_DIRECTORY_ENTRIES = 2000
+
+
+def grep_process_context():
+    # Never plain fork: this process has threads (Textual's, and workers) whose locks a forked child could inherit held.
+    # A fork server is started fresh, before any of that, and forks the workers from itself.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+@contextlib.contextmanager
+def stderr_to_devnull():
+    # multiprocessing hands sys.stderr's file descriptor down to the resource tracker it starts, and Textual's
+    # replacement for it doesn't have one. Processes started in here (the tracker and the fork server) get /dev/null
+    # instead, rather than the terminal the editor is drawing on.
+    saved = os.dup(2)
+    old_stderr = sys.stderr
+    try:
+        with open(os.devnull, 'w') as devnull:
+            os.dup2(devnull.fileno(), 2)
+            sys.stderr = devnull
+            yield
+    finally:
+        sys.stderr = old_stderr
+        os.dup2(saved, 2)
+        os.close(saved)
+
+
+def start_grep_pool():
+    context = grep_process_context()
+    with stderr_to_devnull():
+        pool = ProcessPoolExecutor(mp_context=context, initializer=silence_stderr)
+        if context.get_start_method() == 'forkserver':
+            from multiprocessing import forkserver
+            forkserver.ensure_running()
+    return pool
 
 
 class FileChooser(ModalScreen):
@@ -38,6 +102,14 @@ class FileChooser(ModalScreen):
     #file-input {
         width: 1fr
     }
+
+    #grep-results {
+        height: 1fr;
+    }
+
+    #grep-status {
+        padding: 0 1;
+    }
     
     Button  {
         margin: 0 1 0 0;
@@ -47,7 +119,16 @@ class FileChooser(ModalScreen):
     }
     """
 
+    BINDINGS = [
+        Binding("tab", "complete_path", "Complete", show=False),
+    ]
+
+    # Whether "search in directory" (grep) is offered
+    SEARCHABLE = False
+
     cwd = reactive(str)
+    grep_mode = reactive(False)
+    large_directory = reactive(False)
 
     def __init__(self, current_file, confirm_overwrite=False):
         super().__init__()
@@ -57,29 +138,69 @@ class FileChooser(ModalScreen):
         else:
             self.current_file = None
         self.confirm_overwrite = confirm_overwrite
+        self.grep_hits = []
+        # The worker processes searching files, started with the first search and kept until the chooser closes
+        self.grep_pool = None
 
     def on_mount(self):
         if self.current_file:
             self.cwd = self.current_file.parent
             self.set_input_value(self.current_file.parent)
-            self.query_one("#dir-tree").path = self.current_file.parent
         else:
             self.cwd = Path.cwd().resolve()
             self.set_input_value(self.cwd)
-            self.query_one("#dir-tree").path = self.cwd
         self.query_one("#file-input").focus()
 
     def watch_cwd(self):
-        self.query_one("#dir-tree").path = self.cwd
+        if not self.cwd:
+            return
+        # The directory is listed first, to find out whether it's small enough for the tree
+        self.query_one("#dir-list").load(self.cwd)
         self.set_input_value(self.cwd)
+        if self.SEARCHABLE:
+            self.query_one("#grep-input").placeholder = f"Search files in {self.cwd} (/regex/ for a regular expression)"
+
+    def watch_grep_mode(self):
+        self.update_listing_visibility()
+        if not self.SEARCHABLE:
+            return
+        for widget in self.query(".grep"):
+            widget.set_class(not self.grep_mode, "hidden")
+        if self.grep_mode:
+            self.query_one("#grep-input").focus()
+        else:
+            self.workers.cancel_group(self, "grep")
+            self.query_one("#file-input").focus()
+
+    def watch_large_directory(self):
+        self.update_listing_visibility()
 
-    def set_input_value(self, value):
-        value = Path(value)
-        if value.is_dir():
-            value = f'{value}/'
+    def update_listing_visibility(self):
+        self.query_one("#dir-list").set_class(self.grep_mode or not self.large_directory, "hidden")
+        for tree in self.query("#dir-tree"):
+            tree.set_class(self.grep_mode or self.large_directory, "hidden")
+
+    @on(DirectoryList.Listed)
+    def on_directory_listed(self, event):
+        if event.path != Path(self.cwd):
+            return
+        # Shown in the list while it's being read, in case it turns out to be big
+        self.large_directory = event.count > LARGE_DIRECTORY_ENTRIES or not event.finished
+        if self.large_directory:
+            return
+        trees = self.query("#dir-tree")
+        if trees:
+            trees.first().path = event.path
         else:
-            value = str(value)
-        self.query_one("#file-input").value = value
+            # Only created now, so it never starts out reading a big directory
+            tree = DirectoryTree(event.path, id="dir-tree")
+            self.query_one("#dialog").mount(tree, before=self.query_one("#dir-list"))
+            tree.set_class(self.grep_mode, "hidden")
+
+    def set_input_value(self, directory):
+        # Only ever given a directory (the current one), so it isn't looked up on disk, which could hang on a slow
+        # mount. The / is added for completing names in it, and isn't doubled for the root.
+        self.query_one("#file-input").value = os.path.join(directory, '')
         self.query_one("#file-input").action_end()
         self.query_one("#file-input").focus()
 
@@ -91,7 +212,13 @@ class FileChooser(ModalScreen):
                 yield Button("/", id="root-dir")
                 yield Button("~", id="home-dir")
                 yield Input(id="file-input")
-            yield DirectoryTree(id="dir-tree", path=Path.cwd().resolve())
+                if self.SEARCHABLE:
+                    yield Button("Grep", id="grep-mode")
+            yield DirectoryList(id="dir-list")
+            if self.SEARCHABLE:
+                yield Input(id="grep-input", classes="grep hidden")
+                yield Label(id="grep-status", classes="grep hidden")
+                yield OptionList(id="grep-results", classes="grep hidden")
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "up-dir":
@@ -100,26 +227,166 @@ class FileChooser(ModalScreen):
             self.cwd = Path("/")
         elif event.button.id == "home-dir":
             self.cwd = Path.home()
+        elif event.button.id == "grep-mode":
+            self.grep_mode = not self.grep_mode
         else:
             self.dismiss(False)
 
     @on(Input.Submitted, "#file-input")
     def on_file_input_submitted(self, event):
-        loc = Path(event.value).resolve()
-        if loc.is_file():
+        self.submit_worker(event.value)
+
+    @work(thread=True, exclusive=True, group="file-input")
+    def submit_worker(self, value):
+        # What's at the path is looked up in its directory's cached listing, which is read (once) if need be
+        loc = Path(os.path.abspath(os.path.expanduser(value)))
+        entry = find_entry(loc)
+        parent = entry or find_entry(loc.parent)
+        self.app.call_from_thread(self.submitted, loc, entry, parent)
+
+    def submitted(self, loc, entry, parent):
+        if not self.is_attached:
+            return
+        if entry and not entry.is_dir:
             self.choose_file(loc)
-        elif loc.is_dir():
-            self.cwd = Path(event.value).resolve()
-        elif loc.parent.exists():
+        elif entry:
+            self.cwd = loc
+        elif parent and parent.is_dir:
             # Parent file exists; this is the return value
             self.dismiss(loc)
         else:
             self.notify(f"Invalid path: {loc}", severity="error")
 
+    def action_complete_path(self):
+        file_input = self.query_one("#file-input")
+        if self.focused is not file_input:
+            self.focus_next()
+            return
+        self.complete_worker(file_input.value)
+
+    @work(thread=True, exclusive=True, group="file-input")
+    def complete_worker(self, value):
+        completed, names = complete_path(value)
+        self.app.call_from_thread(self.completed, value, completed, names)
+
+    def completed(self, value, completed, names):
+        file_input = self.query_one("#file-input")
+        if not self.is_attached or file_input.value != value:
+            # Typed over while the directory was being read
+            return
+        if completed != value:
+            file_input.value = completed
+            file_input.action_end()
+        elif len(names) > 1:
+            shown = ", ".join(names[:COMPLETION_NAMES_SHOWN])
+            more = f" and {len(names) - COMPLETION_NAMES_SHOWN} more" if len(names) > COMPLETION_NAMES_SHOWN else ""
+            self.notify(f"{shown}{more}", title=f"{len(names)} matches")
+        else:
+            self.app.bell()
+
+    @on(Input.Submitted, "#grep-input")
+    def on_grep_input_submitted(self, event):
+        if not event.value:
+            return
+        try:
+            pattern = compile_query(event.value)
+        except re.error as e:
+            self.notify(f"Invalid regex: {e}", severity="error")
+            return
+        self.grep_hits = []
+        self.query_one("#grep-results").clear_options()
+        self.query_one("#grep-status").update("Searching...")
+        if self.grep_pool is None:
+            self.grep_pool = start_grep_pool()
+        self.grep_worker(self.grep_pool, str(self.cwd), pattern)
+
+    @work(thread=True, exclusive=True, group="grep")
+    def grep_worker(self, pool, root, pattern):
+        # The directory is walked here while the files are searched in other processes; results are shown as each
+        # batch of files is done, in whatever order they finish
+        worker = get_current_worker()
+        files = 0
+        pending = set()
+        found = []
+        reported = time.monotonic()
+
+        def report(done):
+            nonlocal found, reported
+            for future in done:
+                try:
+                    found.extend(future.result())
+                except (OSError, RuntimeError):
+                    # The worker process died (eg, the pool is being shut down)
+                    continue
+            if time.monotonic() - reported >= GREP_REPORT_INTERVAL:
+                self.app.call_from_thread(self.grep_found, worker, root, found, files, False)
+                found = []
+                reported = time.monotonic()
+
+        try:
+            for batch in batched(walk_files(root, lambda: worker.is_cancelled), GREP_BATCH_SIZE):
+                pending.add(pool.submit(grep_files, batch, pattern))
+                files += len(batch)
+                if len(pending) >= GREP_PENDING_BATCHES:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    report(done)
+            while pending and not worker.is_cancelled:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                report(done)
+        except (OSError, RuntimeError, ValueError) as e:
+            # The pool is shut down when the chooser closes, which cancels this
+            if not worker.is_cancelled:
+                self.app.call_from_thread(self.notify, title="Error Searching", message=str(e), severity="error")
+        finally:
+            # Batches that haven't started are dropped; the pool is kept for the next search
+            for future in pending:
+                future.cancel()
+        self.app.call_from_thread(self.grep_found, worker, root, found, files, True)
+
+    def on_unmount(self):
+        self.workers.cancel_group(self, "grep")
+        if self.grep_pool is not None:
+            self.grep_pool.shutdown(wait=False, cancel_futures=True)
+            self.grep_pool = None
+
+    def grep_found(self, worker, root, results, files, finished):
+        if worker.is_cancelled or not self.is_attached:
+            return
+        options = []
+        for path, matches in results:
+            relative_path = os.path.relpath(path, root)
+            for line_number, column, line in matches:
+                if len(self.grep_hits) >= GREP_MAX_RESULTS:
+                    break
+                self.grep_hits.append((path, line_number, column))
+                options.append(Text.assemble((f"{relative_path}:{line_number}", "bold"), ": ", line.strip()))
+        if options:
+            self.query_one("#grep-results").add_options(options)
+
+        status = f"{len(self.grep_hits)} matches in {files} files"
+        if len(self.grep_hits) >= GREP_MAX_RESULTS:
+            status = f"Stopped after {GREP_MAX_RESULTS} matches"
+            worker.cancel()
+        elif not finished:
+            status = f"Searching... {status}"
+        self.query_one("#grep-status").update(status)
+
+    @on(OptionList.OptionSelected, "#grep-results")
+    def on_grep_result_selected(self, event):
+        # The file and where in it to go to
+        path, line_number, column = self.grep_hits[event.option_index]
+        self.workers.cancel_group(self, "grep")
+        self.dismiss((Path(path), f"{line_number}:{column + 1}"))
+
     @on(DirectoryTree.FileSelected)
+    @on(DirectoryList.FileSelected)
     def on_file_selected(self, event):
         self.choose_file(event.path)
 
+    @on(DirectoryList.DirectorySelected)
+    def on_directory_selected(self, event):
+        self.cwd = event.path
+
     def choose_file(self, loc):
         if self.confirm_overwrite and loc.resolve() != self.current_file:
             def confirmed(confirm: bool) -> None:
@@ -2,6 +2,8 @@ from mehditor.screens.file_chooser import FileChooser
 
 
 class FileOpen(FileChooser):
+    SEARCHABLE = True
+
     CSS = """
     FileOpen { 
         align: center middle;
@@ -1,25 +1,46 @@
+import codecs
+import configparser
 import functools
+import io
+import locale
+import math
+import os
+import re
+import threading
+import time
 from pathlib import Path
 
-from textual import on
+from rich.markup import escape
+from textual import on, work
+from textual.document._document import Document
+from textual.document._edit import Edit
 from textual.app import App, ComposeResult
 from textual.notifications import Notification
 from textual.reactive import reactive
 from textual.screen import ModalScreen
 from textual.widgets import Header, Input, Footer
 from textual.widgets._text_area import ThemeDoesNotExist
+from textual.widgets.text_area import Selection
+from textual.worker import get_current_worker
 
 from mehditor import config
-from mehditor.app_commands import AppCommands
-from mehditor.screens.about import About
-from mehditor.screens.app_menu import AppMenu
-from mehditor.screens.chooser import Chooser
-from mehditor.screens.confirm_dialog import ConfirmDialog
-from mehditor.screens.file_open import FileOpen
-from mehditor.screens.file_save import FileSave
-from mehditor.screens.input_prompt import InputPrompt
-from mehditor.screens.quit_screen import QuitScreen
-from mehditor.screens.shortcuts import Shortcuts
+from mehditor.clipboard import Clipboard
+from mehditor.document.line_hashes import ChunkedTextState, text_state
+from mehditor.document.line_index import byte_offset_to_location
+from mehditor.file_io import HashingFile, WriteCancelled, atomic_write, compression_for_name, content_hash, \
+    current_umask, decompression_errors, detect_compression, read_text, same_file_version, strip_compression_suffix, \
+    text_reader, text_writer
+from mehditor.file_watcher import file_watcher
+from mehditor.indentation import MAX_INDENT_WIDTH, MIN_INDENT_WIDTH, describe, detect_indentation, reindent, \
+    valid_indent_width
+from mehditor.journal import JOURNAL_HEADER, Journal
+from mehditor.line_operations import drop_matching, keep_matching, line_range, line_replacement, reverse, \
+    sort_natural, sort_numeric, unique
+from mehditor.merge import MergeBase, merge3
+from mehditor.search import SearchIndex, compile_query, is_regex_query, replace_all
+from mehditor.system_clipboard import ClipboardError, copy_method, copy_with_command, encode_base64, in_screen, \
+    osc52_sequence
+from mehditor.undo_history import end_location, undo_file_for, write_undo_history
 from mehditor.validators import LineNumber
 from mehditor.widgets.better_text_area import BetterTextArea
 
@@ -33,6 +54,27 @@ known_light_themes = {
     "github_light"
 }
 
+# Files are streamed into the buffer: a small first chunk so the top of the file is editable right away, then larger
+# chunks for the rest. Sizes are in characters.
+LOAD_FIRST_CHUNK_SIZE = 64 * 1024
+LOAD_CHUNK_SIZE = 1024 * 1024
+SAVE_CHUNK_SIZE = 1024 * 1024
+# Follow mode appends what's been written to the file at most this often (in seconds), in chunks of up to this size
+FOLLOW_INTERVAL = 0.1
+FOLLOW_CHUNK_SIZE = 1024 * 1024
+# Changes are written to the recovery journal as they happen, but only fsynced this often (in seconds)
+JOURNAL_SYNC_INTERVAL = 2
+# Searches report back from the background this many lines at a time
+SEARCH_CHUNK_LINES = 50000
+# Pastes longer than this (in characters) are made this much at a time from a worker, showing progress
+PASTE_CHUNK_SIZE = 1024 * 1024
+# Text is encoded for the system clipboard a piece at a time, in this many characters
+ENCODE_CHUNK_SIZE = 64 * 1024
+# Settings are saved this long (in seconds) after the last change, so a run of changes is written once
+SETTINGS_SAVE_DELAY = 1
+# How often (in seconds) to check whether another instance has changed the config file
+SETTINGS_CHECK_INTERVAL = 5
+
 
 def handle_os_error_decorator(error_message, severity="error", timeout=Notification.timeout):
     def decorator(func):
@@ -48,6 +90,12 @@ def handle_os_error_decorator(error_message, severity="error", timeout=Notificat
     return decorator
 
 
+def app_commands():
+    # The command palette's commands, imported the first time it's opened
+    from mehditor.app_commands import AppCommands
+    return AppCommands
+
+
 class MeheditorApp(App):
     BINDINGS = [
         config.generate_binding("menu"),
@@ -55,10 +103,14 @@ class MeheditorApp(App):
         config.generate_binding("save_file"),
         config.generate_binding("new_file"),
         config.generate_binding("goto_line"),
+        config.generate_binding("quick_open"),
+        config.generate_binding("find"),
+        config.generate_binding("find_next"),
+        config.generate_binding("find_previous"),
         config.generate_binding("suspend_process"),
     ]
 
-    COMMANDS = {AppCommands}
+    COMMANDS = {app_commands}
 
     DEFAULT_CSS = """
     .hidden {
@@ -76,69 +128,1033 @@ class MeheditorApp(App):
     theme = reactive("default")
     file_type = reactive("text")
     show_line_finder = reactive(False)
+    show_find = reactive(False)
     file = reactive(Path)
     file_unsaved = reactive(False)
-    clipboard = reactive('')
+    file_loading = reactive(False)
+    huge_file = reactive(False)
+    large_file = reactive(False)
+    following = reactive(False)
 
-    def __init__(self, file):
+    def __init__(self, file, follow=False, exit_on_first_paint=False, suspend=None):
         super().__init__()
         self.initial_file = file
+        self.follow_on_open = follow
+        # For meh --startup-profile: exits once the screen has been drawn, returning when that was
+        self.exit_on_first_paint = exit_on_first_paint
+        # Called (with the app suspended) instead of stopping this process, when it's running in the server on
+        # behalf of a client; returns once the client has been continued
+        self.suspend_handler = suspend
+        # How much of the file on disk is in the buffer, in bytes; follow mode reads on from here
+        self.file_position = 0
+        self.pending_goto = None
+        self.edit_generation = 0
+        # The buffer's content_state() as of when it was last loaded or saved; it's unsaved if it no longer matches
+        self.saved_state = None
+        self.save_lock = threading.Lock()
+        self.file_stat = None
+        # Hash (see content_hash) of the file's contents on disk when it was loaded or last saved, kept up to date while
+        # following (None if it isn't known), and its text then (see MergeBase); used to tell whether another program
+        # has changed it, and to merge in those changes
+        self.file_hash = None
+        self.merge_base = None
+        self.file_compression = None
+        self.journal = None
+        self.recovery_pending = False
+        # Quick open's file indexes, by root directory
+        self.file_indexes = {}
+        # Not reactive, so copying a lot doesn't mean comparing it with what was copied before
+        self.clipboard = Clipboard()
+        # While a paste is being made a chunk at a time (see paste_worker): the first edit, and where the next chunk goes
+        self.pasting = False
+        self.paste_first_edit = None
+        self.paste_location = None
+        # Pending save of changed settings (see save_settings)
+        self.settings_timer = None
+        # The indentation the file's lines have, as (indent type, indent width), and whether it was detected from them
+        # (see detect_file_indentation) rather than taken from the settings, or set since the file was opened
+        self.file_indent = None
+        self.indent_detected = False
+        self.indent_chosen = False
 
     def on_mount(self):
-        self.indent_type = config.settings['editing']['indent_type']
-        self.indent_width = config.settings.getint('editing', 'indent_width')
-
-        try:
-            self.theme = config.settings['editing']['theme']
-        except ThemeDoesNotExist:
-            self.notify(f"Configured theme not available: {config.settings['editing']['theme']}", severity="error")
-        self.dark = config.settings.getboolean('editing', 'dark_mode')
-        self.show_line_numbers = config.settings.getboolean('editing', 'show_line_numbers')
-        self.soft_wrap = config.settings.getboolean('editing', 'soft_wrap')
+        self.load_settings()
+        self.set_interval(JOURNAL_SYNC_INTERVAL, self.sync_journal)
+        self.set_interval(SETTINGS_CHECK_INTERVAL, self.check_settings)
 
         if self.initial_file:
             self.open_file(self.initial_file)
         else:
             self.new_file()
         self.query_one("#text-buffer").focus()
+        if self.exit_on_first_paint:
+            self.call_after_refresh(lambda: self.exit(time.perf_counter()))
 
     #################################################################
     ## Internal actions to be used elsewhere                       ##
     #################################################################
     def new_file(self):
+        self.stop_loading()
+        self.stop_following()
+        self.stop_pasting()
+        self.discard_journal()
+        self.query_one("#text-buffer").read_only = False
+        self.query_one("#text-buffer").document_backend = self.document_backend_for(0)
         self.query_one("#text-buffer").load_text("")
+        self.detect_file_indentation()
+        self.huge_file = False
+        self.large_file = False
         self.query_one("#text-buffer").history.clear()
         self.file = None
         self.title = '(Untitled)'
+        self.saved_state = self.query_one("#text-buffer").content_state()
         self.file_unsaved = False
+        self.file_stat = None
+        self.file_hash = None
+        self.set_merge_base(None)
 
     @handle_os_error_decorator("Error Opening File")
     def open_file(self, file):
         file = Path(file)
         if file.exists():
-            try:
-                text = file.read_text()
-            except UnicodeDecodeError as e:
-                self.notify(f'Error decoding file (is it a text file?): {e}', severity="error", timeout=20)
-                return
+            size = file.stat().st_size
+            compression = detect_compression(file)
+            huge_file_size = config.settings.getint('editing', 'huge_file_mb') * 1024 * 1024
+            if huge_file_size and size >= huge_file_size and not compression:
+                self.open_huge_file(file)
+            else:
+                self.load_file_worker(file, size, compression)
         else:
-            text = ''
-
-        self.query_one("#text-buffer").load_text(text)
-        self.query_one("#text-buffer").history.clear()
+            self.stop_loading()
+            self.stop_following()
+            self.stop_pasting()
+            self.start_loaded_file(file, '', None, compression_for_name(file))
+            if self.recovery_pending:
+                self.check_recovery()
+
+    def open_file_at(self, file, location):
+        if self.file and Path(file).resolve() == self.file and not self.file_loading:
+            self.goto_location(location)
+            return
+        self.open_file(file)
+        if not self.huge_file or not self.goto_location(location):
+            self.pending_goto = location
+
+    def start_loaded_file(self, file, text, stat, compression):
+        tb = self.query_one("#text-buffer")
+        tb.read_only = False
+        tb.document_backend = self.document_backend_for(stat.st_size if stat else 0)
+        tb.load_text(text)
+        self.detect_file_indentation()
+        self.huge_file = False
+        self.large_file = self.is_large_file(stat.st_size if stat else 0, 0)
+        tb.history.clear()
         self.file = Path(file).resolve() if file else None
         self.title = self.file.name
+        self.saved_state = tb.content_state()
         self.file_unsaved = False
+        self.file_stat = stat
+        # Unless the file is new, these are known once all of it has been read (see loaded_all)
+        self.file_hash = content_hash() if stat is None else None
+        self.set_merge_base(MergeBase() if stat is None else None)
+        self.file_compression = compression
+        self.file_position = stat.st_size if stat else 0
+        self.open_journal(stat)
+
+    def open_huge_file(self, file):
+        self.stop_loading()
+        self.stop_following()
+        self.stop_pasting()
+        self.close_journal()
+        tb = self.query_one("#text-buffer")
+        tb.load_mapped_file(file)
+        tb.read_only = True
+        self.huge_file = True
+        self.large_file = False
+        self.file_compression = None
+        self.file_hash = None
+        self.set_merge_base(None)
+        self.file = file.resolve()
+        self.title = self.file.name
+        self.saved_state = None
+        self.file_unsaved = False
+        self.index_huge_file_worker(tb.document)
+
+    @work(thread=True, exclusive=True, group="file-load")
+    def index_huge_file_worker(self, document):
+        worker = get_current_worker()
+        index = document.index
+        try:
+            if not index.complete:
+                while not index.complete and not worker.is_cancelled:
+                    index.scan()
+                    self.call_from_thread(self.indexed_chunk, worker, index.scanned_to, index.size)
+                if index.complete:
+                    document.save_index()
+        except ValueError:
+            # The mapping was closed because another file was opened
+            return
+        except OSError:
+            # The cached index is only there to make the next open quicker
+            pass
+        self.call_from_thread(self.indexed_chunk, worker, index.size, index.size)
+
+    def indexed_chunk(self, worker, position, size):
+        if worker.is_cancelled:
+            return
+        tb = self.query_one("#text-buffer")
+        tb._refresh_size()
+        if position < size:
+            self.sub_title = f"Read-only, indexing... {self.format_progress(position, size)}"
+        else:
+            self.sub_title = "Read-only (huge file)"
+        if self.pending_goto and self.goto_location(self.pending_goto):
+            self.pending_goto = None
+
+    @work(thread=True, exclusive=True, group="file-load")
+    def load_file_worker(self, file, size, compression):
+        # Compressed files are decompressed as they're read; progress is measured through the compressed file, and the
+        # file is hashed as it is on disk. Its lines are hashed as they're read too, for the saved state, and its text
+        # copied to the merge base.
+        worker = get_current_worker()
+        lines = ChunkedTextState()
+        base = MergeBase()
+        try:
+            with file.open('rb') as raw:
+                hashing = HashingFile(raw)
+                with text_reader(io.BufferedReader(hashing), compression) as fp:
+                    stat = os.fstat(raw.fileno())
+                    text = fp.read(LOAD_FIRST_CHUNK_SIZE)
+                    lines.add(text)
+                    base.append(text)
+                    self.call_from_thread(self.loaded_first_chunk, worker, file, text, stat, compression)
+                    while not worker.is_cancelled:
+                        text = fp.read(LOAD_CHUNK_SIZE)
+                        if not text:
+                            break
+                        lines.add(text)
+                        base.append(text)
+                        self.call_from_thread(self.loaded_chunk, worker, text, raw.tell(), size)
+                    position = raw.tell()
+                digest = hashing.hash
+        except UnicodeDecodeError as e:
+            self.call_from_thread(self.loading_failed, worker, f'Error decoding file (is it a text file?): {e}')
+        except decompression_errors() as e:
+            self.call_from_thread(self.loading_failed, worker, f'Error decompressing file: {e}')
+        except OSError as e:
+            self.call_from_thread(self.loading_failed, worker, str(e))
+        else:
+            self.call_from_thread(self.loaded_all, worker, position, digest, lines.state(), base)
+            return
+        base.close()
+
+    def loaded_first_chunk(self, worker, file, text, stat, compression):
+        if worker.is_cancelled:
+            return
+        self.stop_following()
+        self.stop_pasting()
+        self.file_loading = True
+        self.start_loaded_file(file, text, stat, compression)
+        self.sub_title = f"Loading... {self.format_progress(len(text), stat.st_size)}"
+        if self.recovery_pending:
+            # Recovered changes are replayed against the whole file, so nothing can be edited until then
+            self.query_one("#text-buffer").read_only = True
+
+    def loaded_chunk(self, worker, text, position, size):
+        if worker.is_cancelled:
+            return
+        self.query_one("#text-buffer").append_text(text)
+        self.sub_title = f"Loading... {self.format_progress(position, size)}"
+        if self.pending_goto and self.goto_location(self.pending_goto):
+            self.pending_goto = None
+
+    def loaded_all(self, worker, position, digest, state, base):
+        if worker.is_cancelled:
+            base.close()
+            return
+        # Compressed files can turn out to be large once they're in
+        self.large_file = self.large_file or self.is_large_file(0, self.query_one("#text-buffer").document.line_count)
+        self.file_loading = False
+        # It was detected from the first chunk, so the file could be opened straight away; now it's sampled from all of
+        # it, unless it's been set in the meantime
+        if not self.indent_chosen:
+            self.detect_file_indentation()
+        self.file_position = position
+        self.file_hash = digest
+        self.set_merge_base(base)
+        # The file as it was read, whether or not it was edited while the rest of it was loading
+        self.saved_state = state
+        self.update_file_unsaved()
+        if self.pending_goto:
+            self.goto_location(self.pending_goto)
+            self.pending_goto = None
+        # Undo history from previous sessions is only read back from disk as it's needed
+        self.query_one("#text-buffer").history.restore(undo_file_for(self.file), self.file_stat)
+        if self.recovery_pending:
+            self.check_recovery()
+        if self.follow_on_open:
+            self.follow_on_open = False
+            self.action_toggle_follow()
+
+    def loading_failed(self, worker, message):
+        if worker.is_cancelled:
+            return
+        if self.file_loading:
+            # Part of the file is already in the buffer; don't let it be saved over the original
+            self.file_loading = False
+            self.query_one("#text-buffer").read_only = True
+            message += " (partially loaded file is read-only)"
+        self.notify(title="Error Opening File", message=message, severity="error", timeout=20)
+
+    def update_file_unsaved(self):
+        self.file_unsaved = not self.query_one("#text-buffer").matches_state(self.saved_state)
+
+    def stop_loading(self):
+        self.workers.cancel_group(self, "file-load")
+        self.file_loading = False
+        self.pending_goto = None
+
+    def cancel_loading(self):
+        self.stop_loading()
+        self.query_one("#text-buffer").read_only = True
+        self.notify("Loading cancelled; the partially loaded file is read-only", severity="warning")
+
+    def start_following(self):
+        tb = self.query_one("#text-buffer")
+        tb.read_only = True
+        self.following = True
+        self.follow_file_worker(self.file, self.file_position, self.file_hash.copy())
+        if tb.cursor_location == tb.document.end:
+            tb.scroll_cursor_visible()
+
+    def stop_following(self):
+        self.workers.cancel_group(self, "follow")
+        self.following = False
+
+    @handle_os_error_decorator("Error Following File")
+    def end_following(self, message=None, severity="information"):
+        self.stop_following()
+        tb = self.query_one("#text-buffer")
+        tb.read_only = False
+        if message:
+            self.notify(message, severity=severity)
+        if not self.file_unsaved:
+            # Nothing but what was appended to the file has changed
+            self.saved_state = tb.content_state()
+        # The buffer is now the file on disk, plus any unsaved edits from before following. Those were all made above
+        # what was appended, so their records still apply to it and are kept.
+        stat = self.file.stat()
+        self.file_stat = stat
+        if self.journal:
+            self.rebase_journal(stat, (self.journal, JOURNAL_HEADER.size if self.file_unsaved else self.journal.mark()))
+        else:
+            self.rebase_journal(stat, None)
+
+    @work(thread=True, exclusive=True, group="follow")
+    def follow_file_worker(self, file, position, digest):
+        # Reads whatever has been appended to the file since position, in the same encoding and with the same newline
+        # translation as the file was loaded with. digest is the hash of the file up to position, and carries on
+        # through what's read.
+        worker = get_current_worker()
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors='replace'), translate=True)
+        watcher = None
+        try:
+            with file.open('rb') as fp:
+                watcher = file_watcher(file)
+                opened = os.fstat(fp.fileno())
+                fp.seek(position)
+                while not worker.is_cancelled:
+                    data = fp.read(FOLLOW_CHUNK_SIZE)
+                    if data:
+                        digest.update(data)
+                        text = decoder.decode(data)
+                        if text:
+                            self.call_from_thread(self.followed_text, worker, text, fp.tell(), digest.copy())
+                        # Whatever else is written in the meantime is appended in one go
+                        time.sleep(FOLLOW_INTERVAL)
+                        continue
+
+                    try:
+                        stat = os.stat(file)
+                    except FileNotFoundError:
+                        stat = None
+                    if stat is None or (stat.st_dev, stat.st_ino) != (opened.st_dev, opened.st_ino):
+                        self.call_from_thread(self.follow_stopped, worker, f"{file.name} was moved or deleted")
+                        return
+                    elif stat.st_size < fp.tell():
+                        self.call_from_thread(self.follow_stopped, worker, f"{file.name} was truncated")
+                        return
+                    watcher.wait(1)
+        except OSError as e:
+            self.call_from_thread(self.follow_stopped, worker, str(e))
+        finally:
+            if watcher:
+                watcher.close()
+
+    def followed_text(self, worker, text, position, digest):
+        if worker.is_cancelled:
+            return
+        tb = self.query_one("#text-buffer")
+        at_end = tb.cursor_location == tb.document.end
+        tb.append_text(text)
+        self.file_position = position
+        self.file_hash = digest
+        if self.merge_base:
+            self.merge_base.append(text)
+        if at_end:
+            tb.move_cursor(tb.document.end)
+
+    def follow_stopped(self, worker, message):
+        if not worker.is_cancelled:
+            self.end_following(f"Stopped following: {message}", severity="warning")
+
+    @staticmethod
+    def format_progress(position, size):
+        if not size:
+            return "100%"
+        return f"{min(100, position * 100 // size)}%"
+
+    @staticmethod
+    def format_size(size):
+        for unit in ("bytes", "KB", "MB"):
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GB"
+
+    def open_journal(self, stat):
+        # Edits to the file are journaled from here on, unless a journal from a previous session is still around, in
+        # which case check_recovery() is called once the file is fully loaded
+        self.close_journal()
+        self.journal = Journal(self.file, stat)
+        self.recovery_pending = self.journal.exists()
+
+    def close_journal(self):
+        if self.journal:
+            self.journal.close()
+        self.journal = None
+        self.recovery_pending = False
+
+    def discard_journal(self):
+        if self.journal and not self.recovery_pending:
+            self.journal.discard()
+        self.close_journal()
+
+    @handle_os_error_decorator("Error Writing Recovery Journal")
+    def write_journal(self):
+        changes = self.query_one("#text-buffer").pop_changes()
+        if changes and self.journal and not self.recovery_pending:
+            try:
+                self.journal.append(changes)
+            except OSError:
+                self.close_journal()
+                raise
+
+    def sync_journal(self):
+        if self.journal and self.journal.dirty:
+            self.sync_journal_worker(self.journal)
+
+    @work(thread=True, group="journal-sync")
+    def sync_journal_worker(self, journal):
+        try:
+            journal.sync()
+        except (OSError, ValueError):
+            # Either the journal was closed in the meantime, or there's nothing to be done about it
+            pass
+
+    def check_recovery(self):
+        from mehditor.screens.confirm_dialog import ConfirmDialog
+        journal = self.journal
+        if journal.in_use():
+            # The file is open in another instance, and these are its unsaved changes; it keeps the journal
+            self.close_journal()
+            self.query_one("#text-buffer").read_only = False
+            self.notify(title="File Open Elsewhere",
+                        message=f"{self.file.name} is being edited in another instance of the editor; changes made "
+                                f"here can't be recovered after a crash", severity="warning", timeout=20)
+            return
+        try:
+            recovered = journal.read()
+        except OSError as e:
+            self.notify(title="Error Reading Recovery Journal", message=str(e), severity="error")
+            recovered = None
+        if recovered is None or recovered[0] != journal.base:
+            # The file has changed since the journal was written, so its changes can't be replayed onto it
+            self.end_recovery(journal, "set-aside")
+            return
+        elif not recovered[1]:
+            self.end_recovery(journal, "discard")
+            return
+
+        def confirmed(recover):
+            if journal is self.journal:
+                self.end_recovery(journal, "recover" if recover else "discard", recovered[1])
+
+        self.push_screen(
+            ConfirmDialog(f"{self.file.name} has unsaved changes from a previous session. Recover them?",
+                          "Recover", "Discard"),
+            confirmed)
+
+    @handle_os_error_decorator("Error Updating Recovery Journal")
+    def end_recovery(self, journal, action, changes=None):
+        self.recovery_pending = False
+        self.query_one("#text-buffer").read_only = False
+        if action == "recover":
+            if self.recover_changes(changes):
+                journal.resume()
+                return
+            action = "set-aside"
+
+        if action == "set-aside":
+            stale_file = journal.set_aside()
+            self.notify(title="Recovery Data Out Of Date",
+                        message=f"{self.file.name} has changed since its unsaved changes were journaled; "
+                                f"they were not recovered, and the journal was moved to {stale_file}",
+                        severity="warning", timeout=20)
+        else:
+            journal.discard()
+
+    def recover_changes(self, changes):
+        # Replayed as a single edit, so one undo takes the file back to how it is on disk
+        tb = self.query_one("#text-buffer")
+        document = Document(tb.text)
+        try:
+            for top, bottom, text in changes:
+                document.replace_range(top, bottom, text)
+        except IndexError:
+            return False
+        tb.replace(document.text, tb.document.start, tb.document.end)
+        # The journal already holds these changes
+        tb.pop_changes()
+        self.notify(f"Recovered unsaved changes ({len(changes)} edits)")
+        return True
+
+    @handle_os_error_decorator("Error Writing Recovery Journal")
+    def rebase_journal(self, stat, journal_mark):
+        if journal_mark is None:
+            # Saved under a new name, so there was nothing to journal against until now (or the file's journal is
+            # another instance's; see check_recovery)
+            if not self.journal:
+                journal = Journal(self.file, stat)
+                if not journal.in_use():
+                    self.journal = journal
+        elif journal_mark[0] is self.journal:
+            self.journal.rebase(stat, journal_mark[1])
+
+    @work(thread=True, exclusive=True, group="file-save")
+    def save_file_worker(self, file, text, compression, state, umask, exit_after, journal_mark, history):
+        # Saves are serialised, so a save that was superseded can't finish after (and overwrite) the newer one
+        worker = get_current_worker()
+        with self.save_lock:
+            started = time.monotonic()
+            try:
+                with atomic_write(file, mode='wb', umask=umask) as raw:
+                    hashing = HashingFile(raw)
+                    with text_writer(hashing, compression, file.name) as fp:
+                        for position in range(0, len(text), SAVE_CHUNK_SIZE):
+                            if worker.is_cancelled:
+                                raise WriteCancelled()
+                            fp.write(text[position:position + SAVE_CHUNK_SIZE])
+                stat = file.stat()
+            except WriteCancelled:
+                return
+            except OSError as e:
+                self.call_from_thread(self.notify, title="Error Saving File", message=str(e), severity="error")
+                return
+            elapsed = time.monotonic() - started
+
+            base = MergeBase()
+            for position in range(0, len(text), SAVE_CHUNK_SIZE):
+                base.append(text[position:position + SAVE_CHUNK_SIZE])
+            persisted, groups = history
+            max_bytes = int(config.settings.getfloat('editing', 'undo_history_mb') * 1024 * 1024)
+            try:
+                rebased = write_undo_history(undo_file_for(file), stat, persisted, groups, max_bytes)
+            except (OSError, EOFError, ValueError):
+                # The file itself is saved; it just won't have any undo history next time it's opened
+                rebased = None
+            self.call_from_thread(self.saved_file, file, hashing.hash, base, state, stat, elapsed, exit_after,
+                                  journal_mark, persisted, rebased)
+
+    def saved_file(self, file, digest, base, state, stat, elapsed, exit_after, journal_mark, persisted, rebased):
+        if file == self.file and not self.huge_file:
+            self.saved_state = state
+            self.update_file_unsaved()
+            self.file_stat = stat
+            self.file_hash = digest
+            self.set_merge_base(base)
+            self.file_position = stat.st_size
+            self.rebase_journal(stat, journal_mark)
+            if rebased:
+                self.query_one("#text-buffer").history.rebase_persisted(persisted, *rebased)
+        else:
+            base.close()
+        size = stat.st_size
+        rate = self.format_size(size / max(elapsed, 0.001))
+        self.notify(f"File saved: {self.format_size(size)} in {elapsed:.2f}s ({rate}/s)")
+        if exit_after:
+            self.exit()
+
+    def check_disk_version(self, then, saving):
+        # Calls then() if the file on disk is still the version that was loaded or last saved, and otherwise asks what
+        # to do about it. A different size, mtime or inode only means it might have changed: the contents are checked.
+        try:
+            stat = self.file.stat()
+        except FileNotFoundError:
+            # Deleted; saving puts it back
+            stat = None
+        if stat is None or (self.file_stat and same_file_version(stat, self.file_stat)):
+            then()
+        else:
+            self.check_disk_version_worker(self.file, then, saving)
+
+    @work(thread=True, exclusive=True, group="file-check")
+    def check_disk_version_worker(self, file, then, saving):
+        try:
+            text, stat, digest = read_text(file)
+        except (OSError, UnicodeDecodeError, *decompression_errors()) as e:
+            # It's changed into something that can't be merged; it can still be reloaded or overwritten
+            self.call_from_thread(self.notify, title="Error Reading Changed File", message=str(e), severity="error")
+            text = digest = None
+            try:
+                stat = os.stat(file)
+            except OSError:
+                stat = None
+        self.call_from_thread(self.checked_disk_version, file, then, saving, text, stat, digest)
+
+    def checked_disk_version(self, file, then, saving, text, stat, digest):
+        from mehditor.screens.external_change import ExternalChange
+        if file != self.file or self.file_loading or self.huge_file:
+            return
+        if text is not None and self.file_hash and digest.digest() == self.file_hash.digest():
+            # Touched, or changed and changed back
+            self.file_stat = stat
+            self.rebase_journal(stat, (self.journal, JOURNAL_HEADER.size) if self.journal else None)
+            then()
+            return
+
+        def chosen(action):
+            if file != self.file:
+                return
+            if action == "reload":
+                self.discard_journal()
+                self.open_file(file)
+            elif action == "overwrite":
+                if saving:
+                    then()
+                elif text is not None:
+                    self.adopt_disk_version(file, text, stat, digest, merge=False)
+                else:
+                    # Not readable; saving will overwrite it without asking again
+                    self.file_stat = stat
+            elif action == "merge":
+                if text is None:
+                    self.notify("The file on disk can't be read, so it can't be merged", severity="error")
+                else:
+                    self.adopt_disk_version(file, text, stat, digest, merge=True)
+
+        self.push_screen(ExternalChange(file.name, saving), chosen)
+
+    def adopt_disk_version(self, file, theirs, stat, digest, merge):
+        # The file on disk becomes the base that the buffer has unsaved changes relative to, with those changes either
+        # merged into it or kept as they are (to overwrite it when saved). The buffer's text is put together (and
+        # merged) in a worker.
+        tb = self.query_one("#text-buffer")
+        self.adopt_disk_version_worker(file, self.merge_base, merge, list(tb.document.lines), tb.document.newline,
+                                       theirs, stat, digest, self.edit_generation)
+
+    @work(thread=True, exclusive=True, group="file-check")
+    def adopt_disk_version_worker(self, file, base, merge, lines, newline, theirs, stat, digest, generation):
+        mine = newline.join(lines)
+        text, conflicts = mine, None
+        if merge:
+            try:
+                text, conflicts = merge3(base.read(), mine, theirs)
+            except (OSError, ValueError) as e:
+                self.call_from_thread(self.notify, title="Error Merging", message=str(e), severity="error")
+                return
+        new_base = MergeBase()
+        new_base.append(theirs)
+        # The journal's record of the buffer relative to the new base
+        record = ((0, 0), end_location((0, 0), theirs), text) if text != theirs else None
+        self.call_from_thread(self.adopted_disk_version, file, base, new_base, text if text != mine else None,
+                              conflicts, text_state(theirs), record, stat, digest, generation)
+
+    def adopted_disk_version(self, file, base, new_base, text, conflicts, state, record, stat, digest, generation):
+        if file != self.file or base is not self.merge_base:
+            # Opened another file, or saved this one, in the meantime
+            new_base.close()
+            return
+        elif generation != self.edit_generation:
+            new_base.close()
+            self.notify("The file was edited in the meantime; nothing was changed", severity="error")
+            return
+        tb = self.query_one("#text-buffer")
+        self.write_journal()
+        self.saved_state = state
+        if text is not None:
+            # A single edit, so one undo takes it back to how it was before
+            tb.replace(text, tb.document.start, tb.document.end)
+            # Journaled below, relative to the new base
+            tb.pop_changes()
+        self.file_stat = stat
+        self.file_hash = digest
+        self.file_position = stat.st_size
+        self.set_merge_base(new_base)
+        self.update_file_unsaved()
+        self.journal_from_disk_version(stat, record)
+        if conflicts:
+            self.notify(f"Merged with {conflicts} conflicts, marked with <<<<<<< and >>>>>>>", severity="warning",
+                        timeout=20)
+        elif conflicts is not None:
+            self.notify("Merged changes from disk")
+
+    @handle_os_error_decorator("Error Writing Recovery Journal")
+    def journal_from_disk_version(self, stat, record):
+        if self.journal and not self.recovery_pending:
+            self.journal.rebase(stat, self.journal.mark())
+            if record:
+                self.journal.append([record])
+
+    def set_merge_base(self, base):
+        if self.merge_base:
+            self.merge_base.close()
+        self.merge_base = base
+
+    def load_settings(self):
+        if not self.indent_detected:
+            self.indent_type = config.settings['editing']['indent_type']
+            self.indent_width = valid_indent_width(config.settings.getint('editing', 'indent_width'))
+            self.file_indent = (self.indent_type, self.indent_width)
+
+        try:
+            self.theme = config.settings['editing']['theme']
+        except ThemeDoesNotExist:
+            self.notify(f"Configured theme not available: {config.settings['editing']['theme']}", severity="error")
+        self.dark = config.settings.getboolean('editing', 'dark_mode')
+        self.show_line_numbers = config.settings.getboolean('editing', 'show_line_numbers')
+        self.soft_wrap = config.settings.getboolean('editing', 'soft_wrap')
 
-    @handle_os_error_decorator("Error Saving Settings")
     def save_settings(self):
-        config.settings['editing']['indent_type'] = self.indent_type
-        config.settings['editing']['indent_width'] = str(self.indent_width)
-        config.settings['editing']['theme'] = self.theme
-        config.settings['editing']['dark_mode'] = 'Yes' if self.dark else 'No'
-        config.settings['editing']['show_line_numbers'] = 'Yes' if self.show_line_numbers else 'No'
-        config.settings['editing']['soft_wrap'] = 'Yes' if self.soft_wrap else 'No'
-        config.save()
+        # Settings are written in the background a moment after the last change (and when quitting, see on_unmount).
+        # The indentation is only saved when it's set (see change_indentation), not when it's detected from a file.
+        config.change('editing', 'theme', self.theme)
+        config.change('editing', 'dark_mode', 'Yes' if self.dark else 'No')
+        config.change('editing', 'show_line_numbers', 'Yes' if self.show_line_numbers else 'No')
+        config.change('editing', 'soft_wrap', 'Yes' if self.soft_wrap else 'No')
+        if self.settings_timer:
+            self.settings_timer.stop()
+        self.settings_timer = self.set_timer(SETTINGS_SAVE_DELAY, self.write_settings)
+
+    @work(thread=True, exclusive=True, group="settings")
+    def write_settings(self):
+        self.settings_timer = None
+        try:
+            config.save()
+        except OSError as e:
+            self.call_from_thread(self.notify, f"{e}", title="Error Saving Settings", severity="error")
+
+    def flush_settings(self):
+        if self.settings_timer:
+            self.settings_timer.stop()
+            self.settings_timer = None
+        try:
+            config.save()
+        except OSError:
+            pass
+
+    def check_settings(self):
+        if not self.settings_timer:
+            self.check_settings_on_disk()
+
+    @work(thread=True, exclusive=True, group="settings")
+    def check_settings_on_disk(self):
+        # Another instance may have saved its settings; they're merged in over what's here (see config.save)
+        try:
+            if config.changed_on_disk():
+                self.call_from_thread(self.reload_settings)
+        except OSError:
+            pass
+
+    def reload_settings(self):
+        try:
+            config.reload()
+        except (OSError, configparser.Error) as e:
+            self.notify(f"{e}", title="Error Loading Settings", severity="error")
+            return
+        self.load_settings()
+
+    def detect_file_indentation(self):
+        # Files are edited with the indentation they already have, if a sample of their lines shows it, and otherwise
+        # with the settings
+        indent_type = config.settings['editing']['indent_type']
+        indent_width = valid_indent_width(config.settings.getint('editing', 'indent_width'))
+        detected = detect_indentation(self.query_one("#text-buffer").document.lines)
+        self.indent_detected = detected is not None
+        self.indent_chosen = False
+        if detected:
+            indent_type, indent_width = detected[0], detected[1] or indent_width
+        self.indent_type = indent_type
+        self.indent_width = indent_width
+        self.file_indent = (indent_type, indent_width)
+
+    def change_indentation(self, indent_type, indent_width):
+        # Used from now on, and saved as the setting. The file's existing indentation can be converted to it.
+        old_indent = self.file_indent
+        self.indent_chosen = True
+        self.indent_type = indent_type
+        self.indent_width = indent_width
+        config.change('editing', 'indent_type', indent_type)
+        config.change('editing', 'indent_width', str(indent_width))
+        self.save_settings()
+        if not self.indent_detected or describe(*old_indent) == describe(indent_type, indent_width):
+            # Nothing's indented yet, or it's tabs either way
+            self.file_indent = (indent_type, indent_width)
+        elif not self.query_one("#text-buffer").read_only:
+            from mehditor.screens.confirm_dialog import ConfirmDialog
+            def confirmed(confirm):
+                if confirm:
+                    self.convert_indentation()
+
+            self.push_screen(ConfirmDialog(f"Convert the file's indentation from {describe(*old_indent)} to "
+                                           f"{describe(indent_type, indent_width)}?"), confirmed)
+
+    def convert_indentation(self):
+        tb = self.query_one("#text-buffer")
+        if self.file_loading:
+            self.notify("File is still loading (Esc to cancel)", severity="error")
+            return
+        elif tb.read_only:
+            self.notify("File is read-only", severity="error")
+            return
+        self.sub_title = "Converting indentation..."
+        self.reindent_worker(list(tb.document.lines), self.file_indent[1], (self.indent_type, self.indent_width),
+                             self.edit_generation)
+
+    @work(thread=True, exclusive=True, group="reindent")
+    def reindent_worker(self, lines, from_width, to_indent, generation):
+        worker = get_current_worker()
+        runs, changed = reindent(lines, from_width, *to_indent)
+        self.call_from_thread(self.reindented, worker, lines, runs, changed, to_indent, generation)
+
+    def reindented(self, worker, lines, runs, changed, to_indent, generation):
+        if worker.is_cancelled:
+            return
+        self.watch_file_type()
+        tb = self.query_one("#text-buffer")
+        if generation != self.edit_generation or tb.read_only:
+            self.notify("The file changed in the meantime; nothing was converted", severity="error")
+            return
+        self.file_indent = to_indent
+        if not runs:
+            self.notify(f"Already indented with {describe(*to_indent)}")
+            return
+        # An edit for each run of changed lines, undone together
+        tb.history.checkpoint()
+        first_edit = None
+        for first, last, new_lines in runs:
+            edit = Edit("\n".join(new_lines), (first, 0), (last, len(lines[last])), True)
+            first_edit = first_edit or edit
+            tb.edit(edit)
+        if not tb.history.merge_checkpoints(first_edit):
+            self.notify("The conversion was too big to be undone", severity="warning")
+        self.notify(f"Converted the indentation of {changed} line{'' if changed == 1 else 's'} to "
+                    f"{describe(*to_indent)}")
+
+    def start_search(self, query):
+        tb = self.query_one("#text-buffer")
+        self.workers.cancel_group(self, "search")
+        if not query or self.huge_file:
+            tb.set_search(None)
+            self.update_find_status()
+            return
+        try:
+            pattern = compile_query(query)
+        except re.error as e:
+            tb.set_search(None)
+            self.query_one("#find").border_subtitle = f"Invalid regex: {e}"
+            return
+        tb.set_search(SearchIndex(pattern, tb.document.line_count))
+        self.search_in_background()
+
+    def search_in_background(self):
+        # The worker searches a snapshot of the lines; edits made in the meantime are searched as they're made, and the
+        # results for lines that weren't edited are moved to wherever those lines are now (see SearchIndex.fill)
+        tb = self.query_one("#text-buffer")
+        search = tb.search
+        ranges = search.unsearched_ranges()
+        mark = search.begin_background()
+        self.search_worker(search, list(tb.document.lines), ranges, mark)
+        self.update_find_status()
+
+    @work(thread=True, exclusive=True, group="search")
+    def search_worker(self, search, lines, ranges, mark):
+        worker = get_current_worker()
+        find = search.find
+        for start, stop in ranges:
+            for position in range(start, stop, SEARCH_CHUNK_LINES):
+                if worker.is_cancelled:
+                    return
+                results = [find(line) for line in lines[position:min(stop, position + SEARCH_CHUNK_LINES)]]
+                self.call_from_thread(self.searched_chunk, worker, search, position, results, mark)
+        self.call_from_thread(self.searched_all, worker, search)
+
+    def searched_chunk(self, worker, search, position, results, mark):
+        if worker.is_cancelled or search is not self.query_one("#text-buffer").search:
+            return
+        search.fill(position, results, mark)
+        self.update_find_status()
+
+    def searched_all(self, worker, search):
+        if worker.is_cancelled or search is not self.query_one("#text-buffer").search:
+            return
+        search.end_background()
+        if search.unsearched:
+            self.search_in_background()
+        self.update_find_status()
+
+    def update_find_status(self):
+        search = self.query_one("#text-buffer").search
+        if search is None:
+            status = ''
+        else:
+            status = f"{search.count} match{'' if search.count == 1 else 'es'}"
+            if search.background:
+                status += " so far..."
+        self.query_one("#find").border_subtitle = status
+
+    @work(thread=True, exclusive=True, group="paste")
+    def paste_worker(self, clipboard, document):
+        worker = get_current_worker()
+        position = 0
+        for chunk in clipboard.chunks(PASTE_CHUNK_SIZE):
+            if worker.is_cancelled:
+                return
+            position += len(chunk)
+            self.call_from_thread(self.pasted_chunk, worker, document, chunk, position, len(clipboard))
+        self.call_from_thread(self.pasted_all, worker, document)
+
+    def pasted_chunk(self, worker, document, chunk, position, size):
+        tb = self.query_one("#text-buffer")
+        if worker.is_cancelled or tb.document is not document:
+            return
+        if self.paste_first_edit is None:
+            edit = self.paste_first_edit = Edit(chunk, tb.selection.start, tb.selection.end, False)
+        else:
+            edit = Edit(chunk, self.paste_location, self.paste_location, False)
+        self.paste_location = tb.edit(edit).end_location
+        tb.scroll_cursor_visible()
+        self.sub_title = f"Pasting... {self.format_progress(position, size)}"
+
+    def pasted_all(self, worker, document):
+        tb = self.query_one("#text-buffer")
+        if worker.is_cancelled or tb.document is not document:
+            return
+        tb.read_only = False
+        if not tb.history.merge_checkpoints(self.paste_first_edit):
+            self.notify("The paste was too big to be undone", severity="warning")
+        self.stop_pasting()
+        self.watch_file_type()
+
+    def copy_to_system_clipboard(self):
+        try:
+            method = copy_method(config.settings['editing']['system_clipboard'])
+        except ClipboardError as e:
+            self.notify(f"{e}. Copied to meh's clipboard only.", title="System Clipboard", severity="warning")
+            return
+        if method:
+            max_length = config.settings.getint('editing', 'osc52_max_kb') * 1024
+            self.system_clipboard_worker(self.clipboard, method, max_length, in_screen())
+
+    @work(thread=True, exclusive=True, group="system-clipboard")
+    def system_clipboard_worker(self, clipboard, method, max_length, screen):
+        # Encoding a big copy, or running a clipboard command, is done here so it doesn't hold up typing
+        worker = get_current_worker()
+        kind, command = method
+        try:
+            if kind == "command":
+                copy_with_command(command, clipboard)
+                return
+            encoded = encode_base64(clipboard.chunks(ENCODE_CHUNK_SIZE), max_length, lambda: worker.is_cancelled)
+            if encoded is not None:
+                self.call_from_thread(self.write_osc52, worker, osc52_sequence(encoded, screen))
+        except (ClipboardError, OSError) as e:
+            self.call_from_thread(self.notify, f"{e}. Copied to meh's clipboard only.", title="System Clipboard",
+                                  severity="warning")
+
+    def write_osc52(self, worker, sequence):
+        # The whole sequence goes to the driver in one write, so the screen isn't redrawn in the middle of it
+        if not worker.is_cancelled and self._driver is not None:
+            self._driver.write(sequence)
+
+    def stop_pasting(self):
+        self.workers.cancel_group(self, "paste")
+        self.pasting = False
+        self.paste_first_edit = None
+        self.paste_location = None
+
+    @work(thread=True, exclusive=True, group="replace")
+    def replace_all_worker(self, search, lines, replacement, regex, generation):
+        try:
+            result = replace_all(search.pattern, lines, replacement, regex)
+        except re.error as e:
+            self.call_from_thread(self.notify, title="Invalid Replacement", message=str(e), severity="error")
+            return
+        self.call_from_thread(self.replaced_all, search, lines, result, generation)
+
+    def replaced_all(self, search, lines, result, generation):
+        tb = self.query_one("#text-buffer")
+        if search is not tb.search or generation != self.edit_generation or tb.read_only:
+            self.notify("The file changed while replacing; nothing was replaced", severity="error")
+            return
+        elif result is None:
+            self.notify("No matches to replace", severity="warning")
+            return
+        # One edit covering every changed line, so it's undone in one go
+        first, last, text, count = result
+        tb.replace(text, (first, 0), (last, len(lines[last])))
+        self.notify(f"Replaced {count} match{'' if count == 1 else 'es'}")
+
+    def run_line_operation(self, operation, doing, done):
+        # Applies operation to the selected lines (or all of them) in a worker, as a single edit
+        tb = self.query_one("#text-buffer")
+        if self.file_loading:
+            self.notify("File is still loading (Esc to cancel)", severity="error")
+            return
+        elif tb.read_only:
+            self.notify("File is read-only", severity="error")
+            return
+        lines = list(tb.document.lines)
+        start, stop = line_range(len(lines), lines[-1], tb.selection.start, tb.selection.end)
+        self.sub_title = f"{doing}..."
+        self.line_operation_worker(operation, lines, start, stop, done, self.edit_generation)
+
+    @work(thread=True, exclusive=True, group="line-operation")
+    def line_operation_worker(self, operation, lines, start, stop, done, generation):
+        worker = get_current_worker()
+        new_lines = operation(lines[start:stop])
+        replacement = line_replacement(lines, start, stop, new_lines)
+        self.call_from_thread(self.line_operation_done, worker, replacement, stop - start, len(new_lines), done,
+                              generation)
+
+    def line_operation_done(self, worker, replacement, count, new_count, done, generation):
+        if worker.is_cancelled:
+            return
+        self.watch_file_type()
+        tb = self.query_one("#text-buffer")
+        if generation != self.edit_generation or tb.read_only:
+            self.notify("The file changed in the meantime; nothing was changed", severity="error")
+        elif replacement is None:
+            self.notify("Nothing to change", severity="warning")
+        else:
+            start, end, text = replacement
+            tb.replace(text, start, end)
+            if new_count < count:
+                removed = count - new_count
+                self.notify(f"Removed {removed} line{'' if removed == 1 else 's'} of {count}")
+            else:
+                self.notify(f"{done} {count} line{'' if count == 1 else 's'}")
 
     #################################################################
     ## Watchers                                                    ##
@@ -160,22 +1176,73 @@ class MeheditorApp(App):
         self.query_one("#text-buffer").indent_width = self.indent_width
 
     def watch_show_line_numbers(self):
-        self.query_one("#text-buffer").show_line_numbers = self.show_line_numbers
+        self.query_one("#text-buffer").show_line_numbers = self.show_line_numbers and not self.large_file
 
     def watch_soft_wrap(self):
-        self.query_one("#text-buffer").soft_wrap = self.soft_wrap
+        # The huge file viewer never wraps, and large files aren't wrapped
+        self.query_one("#text-buffer").soft_wrap = self.soft_wrap and not self.huge_file and not self.large_file
+
+    def watch_huge_file(self):
+        self.watch_soft_wrap()
+        if not self.huge_file:
+            self.watch_file_type()
+
+    def watch_large_file(self):
+        self.watch_soft_wrap()
+        self.watch_show_line_numbers()
+        self.watch_file_type()
+
+    def is_large_file(self, size, line_count):
+        large_file_size = config.settings.getint('editing', 'large_file_mb') * 1024 * 1024
+        large_file_lines = config.settings.getint('editing', 'large_file_lines')
+        return bool(large_file_size and size >= large_file_size or large_file_lines and line_count >= large_file_lines)
+
+    def document_backend_for(self, size):
+        backend = config.settings['editing']['document_backend']
+        if backend == "auto":
+            return "rope" if self.is_large_file(size, 0) else "list"
+        return backend
 
     def watch_file_type(self):
-        if self.file_type == "text":
-            self.query_one("#text-buffer").language = None
+        if self.huge_file:
+            return
+        elif self.file_loading:
+            # Highlighting is applied once the whole file is in, rather than re-parsing after every chunk
+            self.set_buffer_language(None)
+        elif self.large_file:
+            # Parsing the whole file (which highlighting needs, however little of it is in view) takes too long
+            self.set_buffer_language(None)
+            self.sub_title = "Large file: no highlighting, wrapping or line numbers"
+        elif self.file_type == "text":
+            self.set_buffer_language(None)
             self.sub_title = ''
         else:
-            self.query_one("#text-buffer").language = self.file_type
+            self.set_buffer_language(self.file_type)
             self.sub_title = self.file_type
 
+    def watch_following(self):
+        if self.following:
+            self.sub_title = "Following (Esc to stop)"
+        else:
+            self.watch_file_type()
+
+    def watch_file_loading(self):
+        if self.file_loading:
+            self.set_buffer_language(None)
+        else:
+            self.watch_file_type()
+
+    def set_buffer_language(self, language):
+        # Setting TextArea.language always rebuilds the whole document, even if it's unchanged
+        tb = self.query_one("#text-buffer")
+        if tb.language != language:
+            tb.language = language
+
     def watch_file(self):
-        if self.file and '.' in self.file.name:
-            extension = self.file.name.split('.')[-1].lower().strip()
+        # Compressed files are highlighted according to what's inside them, eg data.json.gz as JSON
+        name = strip_compression_suffix(self.file.name) if self.file else ''
+        if '.' in name:
+            extension = name.split('.')[-1].lower().strip()
             if extension in config.settings['filetypes']:
                 self.file_type = config.settings['filetypes'][extension]
 
@@ -193,6 +1260,14 @@ class MeheditorApp(App):
         else:
             w.add_class("hidden")
 
+    def watch_show_find(self):
+        w = self.query_one("#find")
+        if self.show_find:
+            w.remove_class("hidden")
+            w.focus()
+        else:
+            w.add_class("hidden")
+
     #################################################################
     ## Main methods and actions                                    ##
     #################################################################
@@ -202,52 +1277,204 @@ class MeheditorApp(App):
         yield BetterTextArea("", language=None, id="text-buffer", tab_behavior="indent")
         yield Input(
             id="line_number",
-            placeholder="Go to line number (eg 10:3 for line 10, col 3)",
+            placeholder="Go to line number (eg 10:3 for line 10, col 3; 50% for halfway; @4096 for byte 4096)",
             validate_on=["changed"],
             validators=[LineNumber()])
+        yield Input(id="find", placeholder="Find (/regex/ for a regular expression; capitals make it case-sensitive)")
         yield Footer()
 
     def action_cut(self):
         tb: BetterTextArea = self.query_one("#text-buffer")
-        self.clipboard = tb.selected_text
+        if tb.read_only:
+            self.notify("File is read-only", severity="error")
+            return
+        self.clipboard = Clipboard.from_document(tb.document, tb.selection.start, tb.selection.end)
+        self.copy_to_system_clipboard()
         tb.replace("", tb.selection.start, tb.selection.end)
 
     def action_copy(self):
         tb: BetterTextArea = self.query_one("#text-buffer")
-        if tb.selected_text:
-            self.clipboard = tb.selected_text
+        if not tb.selection.is_empty:
+            self.clipboard = Clipboard.from_document(tb.document, tb.selection.start, tb.selection.end)
+            self.copy_to_system_clipboard()
 
     def action_paste(self):
-        if self.clipboard:
-            tb: BetterTextArea = self.query_one("#text-buffer")
-            tb.replace(self.clipboard, tb.selection.start, tb.selection.end)
-        else:
+        tb: BetterTextArea = self.query_one("#text-buffer")
+        if self.pasting:
+            self.notify("Still pasting", severity="error")
+        elif tb.read_only:
+            self.notify("File is read-only", severity="error")
+        elif not self.clipboard:
             self.notify("Nothing to paste", severity="error")
+        elif len(self.clipboard) <= PASTE_CHUNK_SIZE:
+            tb.replace(self.clipboard.text(), tb.selection.start, tb.selection.end)
+        else:
+            # Read-only until it's done, so nothing else is edited in between the chunks
+            tb.read_only = True
+            tb.history.checkpoint()
+            self.pasting = True
+            self.paste_first_edit = None
+            self.paste_location = None
+            self.paste_worker(self.clipboard, tb.document)
 
     @handle_os_error_decorator("Error Saving File")
-    def action_save_file(self) -> None:
+    def action_save_file(self, exit_after=False, check_disk=True) -> None:
+        if not self.check_savable():
+            return
 
-        if self.file:
-            self.file.write_text(self.query_one("#text-buffer").text)
-            self.file_unsaved = False
-            self.notify("File saved")
+        if self.file and check_disk:
+            self.check_disk_version(functools.partial(self.action_save_file, exit_after, check_disk=False), saving=True)
+        elif self.file:
+            # The text is snapshotted here and written out in a worker, so typing can carry on while it saves. Any
+            # journaled changes after this point will still be unsaved once it has.
+            self.write_journal()
+            journal_mark = (self.journal, self.journal.mark()) if self.journal else None
+            tb = self.query_one("#text-buffer")
+            self.save_file_worker(self.file, tb.text, self.file_compression, tb.content_state(), current_umask(),
+                                  exit_after, journal_mark, tb.history.snapshot())
         else:
-            self.action_save_file_as()
+            self.action_save_file_as(exit_after)
+
+    def check_savable(self):
+        if self.file_loading:
+            self.notify("File is still loading (Esc to cancel)", severity="error")
+            return False
+        elif self.pasting:
+            self.notify("Still pasting", severity="error")
+            return False
+        elif self.huge_file:
+            self.notify("Huge files are opened read-only", severity="error")
+            return False
+        elif self.query_one("#text-buffer").read_only:
+            self.notify("File was only partially loaded and cannot be saved", severity="error")
+            return False
+        return True
 
     def action_goto_line(self):
         self.show_line_finder = True
 
+    def action_find(self):
+        if self.huge_file:
+            self.notify("Huge files can't be searched", severity="error")
+            return
+        tb = self.query_one("#text-buffer")
+        w = self.query_one("#find")
+        if tb.selected_text and '\n' not in tb.selected_text:
+            w.value = tb.selected_text
+        elif tb.search is None and w.value:
+            # Opening another file clears the search, but not what was being searched for
+            self.start_search(w.value)
+        self.show_find = True
+
+    def action_find_next(self, backwards=False):
+        tb = self.query_one("#text-buffer")
+        if tb.search is None:
+            self.action_find()
+            return
+        # From the end of the current match (or the start, going backwards), so it isn't found again
+        location = min(tb.selection) if backwards else max(tb.selection)
+        found = tb.search.next_match(tb.document.lines, location, backwards)
+        self.update_find_status()
+        if found is None:
+            self.notify("No matches", severity="warning")
+            return
+        row, start, end, wrapped = found
+        tb.selection = Selection((row, start), (row, end))
+        if wrapped:
+            self.notify("Search wrapped around")
+
+    def action_find_previous(self):
+        self.action_find_next(backwards=True)
+
+    def action_replace_all(self):
+        from mehditor.screens.input_prompt import InputPrompt
+        tb = self.query_one("#text-buffer")
+        query = self.query_one("#find").value
+        if tb.read_only:
+            self.notify("File is read-only", severity="error")
+            return
+        elif tb.search is None or not query:
+            self.notify("Find something first", severity="error")
+            return
+
+        search = tb.search
+
+        def check_result(replacement):
+            if search is tb.search:
+                self.replace_all_worker(search, list(tb.document.lines), replacement, is_regex_query(query),
+                                        self.edit_generation)
+
+        self.push_screen(InputPrompt(f"Replace all matches of {escape(query)} with:", ""), check_result)
+
+    def action_sort_lines(self):
+        self.run_line_operation(sort_natural, "Sorting", "Sorted")
+
+    def action_sort_lines_numerically(self):
+        self.run_line_operation(sort_numeric, "Sorting", "Sorted")
+
+    def action_remove_duplicate_lines(self):
+        self.run_line_operation(unique, "Removing duplicates", "Checked")
+
+    def action_keep_matching_lines(self):
+        self.filter_lines(keep_matching, "Keep lines matching")
+
+    def action_delete_matching_lines(self):
+        self.filter_lines(drop_matching, "Delete lines matching")
+
+    def filter_lines(self, operation, question):
+        from mehditor.screens.input_prompt import InputPrompt
+        if self.query_one("#text-buffer").read_only:
+            self.notify("File is read-only", severity="error")
+            return
+
+        def check_result(query):
+            if not query:
+                return
+            try:
+                pattern = compile_query(query)
+            except re.error as e:
+                self.notify(title="Invalid Regular Expression", message=str(e), severity="error")
+                return
+            self.run_line_operation(operation(pattern), "Filtering", "Checked")
+
+        self.push_screen(InputPrompt(f"{question} (/regex/ for a regular expression):", ""), check_result)
+
+    def action_reverse_lines(self):
+        self.run_line_operation(reverse, "Reversing", "Reversed")
+
     def action_undo_change(self):
+        if self.pasting:
+            self.notify("Still pasting", severity="error")
+            return
         self.query_one("#text-buffer").undo()
 
     def action_redo_change(self):
+        if self.pasting:
+            self.notify("Still pasting", severity="error")
+            return
         self.query_one("#text-buffer").redo()
 
     def action_menu(self):
+        from mehditor.screens.app_menu import AppMenu
         if self.show_line_finder:
             self.show_line_finder = False
             return
 
+        if self.show_find:
+            # Closing the search clears the highlights; submitting it (with enter) keeps them, for find next
+            self.show_find = False
+            self.query_one("#find").value = ''
+            self.query_one("#text-buffer").focus()
+            return
+
+        if self.file_loading and len(self._screen_stack) == 1:
+            self.cancel_loading()
+            return
+
+        if self.following and len(self._screen_stack) == 1:
+            self.end_following("Stopped following")
+            return
+
         # TODO: Figure out how to do this without checking a private attribute
         if len(self._screen_stack) == 1:
             def menu_action(action):
@@ -261,6 +1488,7 @@ class MeheditorApp(App):
             self.pop_screen()
 
     def action_new_file(self):
+        from mehditor.screens.confirm_dialog import ConfirmDialog
         if self.file_unsaved:
             def confirmed(confirm: bool) -> None:
                 if confirm:
@@ -271,26 +1499,58 @@ class MeheditorApp(App):
             self.new_file()
 
     def action_open_file(self):
+        from mehditor.screens.file_open import FileOpen
         def check_result(file):
-            self.open_file(file)
+            if isinstance(file, tuple):
+                # A search result: the file, and where to go in it
+                self.open_file_at(*file)
+            else:
+                self.open_file(file)
 
         self.push_screen(FileOpen(self.file), check_result)
 
-    def action_save_file_as(self):
+    def action_quick_open(self):
+        from mehditor.screens.quick_open import QuickOpen
+        def check_result(file):
+            if file:
+                self.open_file(file)
+
+        self.push_screen(QuickOpen(Path.cwd(), self.file_indexes), check_result)
+
+    def action_save_file_as(self, exit_after=False):
+        from mehditor.screens.file_save import FileSave
         def check_result(file):
+            self.discard_journal()
             self.file = file
+            self.file_compression = compression_for_name(file)
             self.title = self.file.name
-            self.action_save_file()
+            # FileSave has already asked about overwriting whatever is there
+            self.action_save_file(exit_after, check_disk=False)
 
         self.push_screen(FileSave(self.file), check_result)
 
+    def action_toggle_follow(self):
+        if self.following:
+            self.end_following("Stopped following")
+        elif not self.file or not self.file.exists():
+            self.notify("Only files that have been saved can be followed", severity="error")
+        elif self.huge_file or self.file_compression:
+            self.notify("Huge and compressed files can't be followed", severity="error")
+        elif self.file_loading or self.query_one("#text-buffer").read_only:
+            self.notify("File is still loading or only partially loaded", severity="error")
+        else:
+            self.start_following()
+
     def action_show_about(self):
+        from mehditor.screens.about import About
         self.push_screen(About())
 
     def action_show_shortcuts(self):
+        from mehditor.screens.shortcuts import Shortcuts
         self.push_screen(Shortcuts())
 
     def action_change_file_type(self):
+        from mehditor.screens.chooser import Chooser
         def check_result(result):
             self.file_type = result
 
@@ -303,9 +1563,9 @@ class MeheditorApp(App):
             check_result)
 
     def action_set_indent_type(self):
+        from mehditor.screens.chooser import Chooser
         def check_result(result):
-            self.indent_type = result
-            self.save_settings()
+            self.change_indentation(result, self.indent_width)
 
         self.push_screen(
             Chooser(
@@ -328,12 +1588,17 @@ class MeheditorApp(App):
         self.save_settings()
 
     def action_set_indent_width(self):
+        from mehditor.screens.input_prompt import InputPrompt
         def check_result(result):
             try:
-                self.indent_width = int(result)
+                indent_width = int(result)
             except ValueError:
                 self.notify(f"Invalid number: {result}", severity="error")
-            self.save_settings()
+                return
+            if valid_indent_width(indent_width, None) is None:
+                self.notify(f"Indentation must be {MIN_INDENT_WIDTH} to {MAX_INDENT_WIDTH} wide", severity="error")
+                return
+            self.change_indentation(self.indent_type, indent_width)
 
         self.push_screen(
             InputPrompt(
@@ -342,7 +1607,11 @@ class MeheditorApp(App):
             ),
             check_result)
 
+    def action_convert_indentation(self):
+        self.convert_indentation()
+
     def action_change_theme(self):
+        from mehditor.screens.chooser import Chooser
         def check_result(result):
             self.theme = result
             self.save_settings()
@@ -355,8 +1624,17 @@ class MeheditorApp(App):
             ),
             check_result)
 
+    def action_suspend_process(self) -> None:
+        if self.suspend_handler:
+            with self.suspend():
+                self.suspend_handler()
+        else:
+            super().action_suspend_process()
+
     def action_quit(self) -> None:
+        from mehditor.screens.quit_screen import QuitScreen
         if not self.file_unsaved:
+            self.discard_journal()
             return self.exit()
 
         if len(self._screen_stack) > 1 and isinstance(self._screen_stack[-1], QuitScreen):
@@ -364,18 +1642,9 @@ class MeheditorApp(App):
 
         def check_quit(result):
             if result == "save-and-quit":
-                if self.file:
-                    self.file.write_text(self.query_one("#text-buffer").text)
-                    self.exit()
-                else:
-                    def check_result(file):
-                        self.file = file
-                        self.title = self.file.name
-                        self.action_save_file()
-                        self.exit()
-
-                    self.push_screen(FileSave(self.file), check_result)
+                self.action_save_file(exit_after=True)
             elif result == "quit-without-save":
+                self.discard_journal()
                 self.exit()
             elif result == "cancel":
                 pass
@@ -391,21 +1660,96 @@ class MeheditorApp(App):
     #################################################################
     @on(Input.Submitted, "#line_number")
     def on_line_number_submitted(self, event):
-        linenumber = event.value
-        if LineNumber().validate(linenumber).is_valid:
-            if ':' in linenumber:
-                line, col = linenumber.split(':', 1)
-                line = int(line) - 1
-                col = int(col) - 1
-            else:
-                line = int(linenumber) - 1
-                col = 0
-            self.query_one("#text-buffer").move_cursor((line, col))
+        if LineNumber().validate(event.value).is_valid:
+            if not self.goto_location(event.value):
+                self.pending_goto = event.value
+                self.notify("Not loaded yet; will go there once it is")
             self.show_line_finder = False
             self.query_one("#text-buffer").focus()
         else:
             self.notify(f'Not a valid line number', severity="error")
 
+    @on(Input.Changed, "#find")
+    def on_find_changed(self, event):
+        self.start_search(event.value)
+
+    @on(Input.Submitted, "#find")
+    def on_find_submitted(self, event):
+        self.show_find = False
+        self.query_one("#text-buffer").focus()
+        if event.value:
+            self.action_find_next()
+
+    def goto_location(self, value):
+        # Takes anything LineNumber accepts. Returns False if the location isn't loaded (or, in a huge file, indexed)
+        # yet; it's gone to from loaded_chunk or indexed_chunk once it is.
+        tb: BetterTextArea = self.query_one("#text-buffer")
+        document = tb.document
+        indexing = self.huge_file and not document.index.complete
+        if value.endswith('%') or value.startswith('@'):
+            if self.file_loading:
+                return False
+            if value.startswith('@'):
+                offset = int(value[1:])
+                if not self.huge_file:
+                    # Adding up the lines' lengths in bytes takes a while in a big file
+                    self.byte_offset_worker(list(document.lines), document.newline, offset, self.edit_generation)
+                    return True
+                if indexing and offset >= document.index.scanned_to:
+                    return False
+                location = document.location_from_byte_offset(offset)
+            else:
+                percent = float(value[:-1])
+                if not math.isfinite(percent):
+                    self.notify("Not a valid percentage", severity="error")
+                    return True
+                if indexing:
+                    return False
+                location = (round(min(max(percent, 0), 100) / 100 * (document.line_count - 1)), 0)
+        else:
+            if ':' in value:
+                line, col = value.split(':', 1)
+                location = (int(line) - 1, int(col) - 1)
+            else:
+                location = (int(value) - 1, 0)
+            if (indexing or self.file_loading) and location[0] >= document.line_count:
+                return False
+
+        tb.move_cursor(location)
+        return True
+
+    @work(thread=True, exclusive=True, group="goto")
+    def byte_offset_worker(self, lines, newline, offset, generation):
+        worker = get_current_worker()
+        location = byte_offset_to_location(lines, newline, offset)
+        self.call_from_thread(self.found_byte_offset, worker, location, generation)
+
+    def found_byte_offset(self, worker, location, generation):
+        if worker.is_cancelled:
+            return
+        if generation != self.edit_generation:
+            self.notify("The file changed in the meantime; try again", severity="error")
+            return
+        self.query_one("#text-buffer").move_cursor(location)
+
+    def on_unmount(self):
+        self.flush_settings()
+
+    def on_app_focus(self, event):
+        self.check_settings()
+        # Back from another program, which may have changed the file
+        if (self.file and not self.huge_file and not self.file_loading and not self.following
+                and not self.recovery_pending and not self.query_one("#text-buffer").read_only
+                and len(self._screen_stack) == 1):
+            self.check_disk_version(lambda: None, saving=False)
+
     @on(BetterTextArea.Changed, "#text-buffer")
     def on_text_buffer_changed(self, event):
-        self.file_unsaved = True
+        self.edit_generation += 1
+        self.update_file_unsaved()
+        search = event.text_area.search
+        if search is not None:
+            if search.unsearched and not search.background:
+                self.search_in_background()
+            self.update_find_status()
+        self.write_journal()
@@ -0,0 +1,146 @@
+from pathlib import Path
+
+from rich.text import Text
+from textual import on, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.widgets import Input, Label, OptionList
+from textual.widgets.option_list import Option
+from textual.worker import get_current_worker
+
+from mehditor.file_index import FileIndex, FuzzyMatcher, cache_file_for, match_positions, normalize_query
+
+# How many of the best matches are listed
+RESULT_LIMIT = 100
+
+
+class QuickOpen(ModalScreen):
+    # Finds a file under root by typing a few characters of its path. indexes is kept by the app between uses,
+    # root -> (FileIndex, FuzzyMatcher), so the index only has to be refreshed, not loaded, the next time.
+    CSS = """
+    QuickOpen {
+        align: center middle;
+    }
+
+    #dialog {
+        width: 85%;
+        height: 80%;
+        border: thick $background 80%;
+        background: $surface;
+    }
+
+    #quick-open-status {
+        padding: 0 1;
+    }
+
+    #quick-open-results {
+        height: 1fr;
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "dismiss", "Cancel"),
+        # The input keeps the focus, so these move through the results
+        Binding("down", "results('cursor_down')", show=False),
+        Binding("up", "results('cursor_up')", show=False),
+        Binding("pagedown", "results('page_down')", show=False),
+        Binding("pageup", "results('page_up')", show=False),
+    ]
+
+    def __init__(self, root, indexes):
+        super().__init__()
+        self.root = str(root)
+        self.indexes = indexes
+        self.matcher = None
+
+    def compose(self) -> ComposeResult:
+        with Vertical(id="dialog"):
+            yield Input(placeholder=f"Type part of a file name or path in {self.root}", id="quick-open-input")
+            yield Label("Indexing...", id="quick-open-status")
+            yield OptionList(id="quick-open-results")
+
+    def on_mount(self):
+        cached = self.indexes.get(self.root)
+        if cached and cached[1]:
+            self.show_index(cached[1], refreshing=True)
+        self.index_worker(cached)
+
+    @work(thread=True, exclusive=True, group="index")
+    def index_worker(self, cached):
+        worker = get_current_worker()
+        cache_file = cache_file_for(self.root)
+        if cached:
+            index, matcher = cached
+        else:
+            index = FileIndex.load(self.root, cache_file)
+            matcher = None
+            if index.directories:
+                # Last time's index, to use while it's brought up to date
+                matcher = FuzzyMatcher(index.paths())
+                self.app.call_from_thread(self.show_index, matcher, True)
+            # Kept straight away, so if the dialog's opened again before this finishes, it waits for this refresh (see
+            # FileIndex.refresh) rather than starting another of its own
+            self.indexes[self.root] = (index, matcher)
+
+        changed = index.refresh(lambda: worker.is_cancelled)
+        if changed is None:
+            return
+        if changed or not matcher:
+            matcher = FuzzyMatcher(index.paths())
+            try:
+                index.save(cache_file)
+            except OSError:
+                pass
+        self.indexes[self.root] = (index, matcher)
+        if not worker.is_cancelled:
+            self.app.call_from_thread(self.show_index, matcher, False)
+
+    def show_index(self, matcher, refreshing):
+        if not self.is_attached:
+            return
+        refreshed = self.matcher is not matcher
+        self.matcher = matcher
+        status = f"{len(matcher):,} files"
+        self.query_one("#quick-open-status").update(f"{status} (refreshing...)" if refreshing else status)
+        if refreshed:
+            self.update_results()
+
+    def update_results(self):
+        if not self.matcher:
+            return
+        query = self.query_one("#quick-open-input").value
+        normalized = normalize_query(query)
+        options = []
+        for path in self.matcher.match(query, RESULT_LIMIT):
+            label = Text(path)
+            for position in match_positions(path, normalized) if normalized else ():
+                label.stylize("bold underline", position, position + 1)
+            options.append(Option(label, id=path))
+        results = self.query_one("#quick-open-results")
+        results.clear_options()
+        results.add_options(options)
+        if options:
+            results.highlighted = 0
+
+    @on(Input.Changed, "#quick-open-input")
+    def on_query_changed(self, event):
+        self.update_results()
+
+    @on(Input.Submitted, "#quick-open-input")
+    def on_query_submitted(self, event):
+        results = self.query_one("#quick-open-results")
+        if results.highlighted is not None:
+            self.choose(results.get_option_at_index(results.highlighted).id)
+
+    @on(OptionList.OptionSelected, "#quick-open-results")
+    def on_result_selected(self, event):
+        self.choose(event.option.id)
+
+    def choose(self, path):
+        self.workers.cancel_group(self, "index")
+        self.dismiss(Path(self.root) / path)
+
+    def action_results(self, action):
+        getattr(self.query_one("#quick-open-results"), f"action_{action}")()
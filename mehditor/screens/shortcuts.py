@@ -18,9 +18,13 @@ SHORTCUTS = """
 | |
 | New File | {new_file} |
 | Open File | {open_file} |
+| Quick Open | {quick_open} |
 | Save File | {save_file} |
 | |
 | Go to Line | {goto_line} |
+| Find | {find} |
+| Find Next | {find_next} |
+| Find Previous | {find_previous} |
 | Cut | {cut} |
 | Copy | {copy} |
 | Paste | {paste} |
@@ -0,0 +1,177 @@
+import re
+
+# An edit that leaves at most this many lines to search again is searched straight away; anything bigger (and the
+# first search of a document) is searched in the background
+SYNC_SEARCH_LINES = 1000
+
+
+def compile_query(query):
+    # /regex/ or literal text, matched within lines. Case-sensitive only if the query has capital letters in it.
+    flags = 0 if any(c.isupper() for c in query) else re.IGNORECASE
+    if is_regex_query(query):
+        return re.compile(query[1:-1], flags)
+    return re.compile(re.escape(query), flags)
+
+
+def is_regex_query(query):
+    return len(query) > 2 and query.startswith('/') and query.endswith('/')
+
+
+def find_spans(pattern, line):
+    # Empty matches can't be highlighted or moved between, so they're left out
+    return tuple((m.start(), m.end()) for m in pattern.finditer(line) if m.end() > m.start())
+
+
+def count_matches(spans):
+    return sum(len(line_spans) for line_spans in spans if line_spans)
+
+
+def map_rows(start, stop, edits):
+    # Where rows start..stop ended up after a series of (start, stop, count) line replacements, as
+    # [(from row, to row, new first row)]. Rows that were replaced are dropped.
+    segments = [(start, stop, start)]
+    for edit_start, edit_stop, count in edits:
+        shift = count - (edit_stop - edit_start)
+        moved = []
+        for source, source_stop, destination in segments:
+            destination_stop = destination + source_stop - source
+            if destination < edit_start:
+                end = min(destination_stop, edit_start)
+                moved.append((source, source + end - destination, destination))
+            if destination_stop > edit_stop:
+                begin = max(destination, edit_stop)
+                moved.append((source + begin - destination, source_stop, begin + shift))
+        segments = moved
+    return segments
+
+
+class SearchIndex:
+    def __init__(self, pattern, line_count):
+        self.pattern = pattern
+        # For each line of the document, the (start, end) columns of each match, or None if it hasn't been searched
+        self.spans = [None] * line_count
+        self.count = 0
+        # Set while lines are being searched in the background; see fill
+        self.background = False
+        self.edits = []
+        # Set when an edit left too many lines to search straight away
+        self.unsearched = False
+
+    def find(self, line):
+        return find_spans(self.pattern, line)
+
+    def replaced(self, start, stop, count, lines):
+        # Lines start..stop of the document were replaced by count lines
+        self.count -= count_matches(self.spans[start:stop])
+        self.spans[start:stop] = [None] * count
+        if self.background:
+            self.edits.append((start, stop, count))
+        if count <= SYNC_SEARCH_LINES:
+            self.search(lines, start, start + count)
+        else:
+            self.unsearched = True
+
+    def search(self, lines, start, stop):
+        new = [self.find(line) for line in lines[start:stop]]
+        self.count += count_matches(new) - count_matches(self.spans[start:stop])
+        self.spans[start:stop] = new
+
+    def spans_for(self, lines, row):
+        spans = self.spans[row]
+        if spans is None:
+            self.search(lines, row, row + 1)
+            spans = self.spans[row]
+        return spans
+
+    def begin_background(self):
+        # Returns the mark to pass to fill with results for the document as it is now
+        self.background = True
+        self.unsearched = False
+        return len(self.edits)
+
+    def end_background(self):
+        self.background = False
+        self.edits = []
+
+    def fill(self, start, results, mark):
+        # Results of searching lines start.. of the document as it was at mark. Lines that have been edited since then
+        # are already searched (or waiting to be), so only the ones that weren't are filled in.
+        for source, source_stop, destination in map_rows(start, start + len(results), self.edits[mark:]):
+            new = results[source - start:source_stop - start]
+            destination_stop = destination + len(new)
+            self.count += count_matches(new) - count_matches(self.spans[destination:destination_stop])
+            self.spans[destination:destination_stop] = new
+
+    def unsearched_ranges(self):
+        # (start, stop) runs of lines that haven't been searched
+        ranges = []
+        spans = self.spans
+        position = 0
+        while True:
+            try:
+                start = spans.index(None, position)
+            except ValueError:
+                return ranges
+            stop = start + 1
+            while stop < len(spans) and spans[stop] is None:
+                # A block at a time while the whole block is unsearched, then line by line
+                block = spans[stop:stop + 4096]
+                stop += len(block) if block.count(None) == len(block) else 1
+            ranges.append((start, stop))
+            position = stop
+
+    def next_match(self, lines, location, backwards=False):
+        # The first match starting at or after location (or the last one starting before it), wrapping around the
+        # end of the document. Returns (row, start, end, wrapped), or None if there are no matches. Lines that haven't
+        # been searched yet are searched on the way.
+        row, column = location
+        line_count = len(self.spans)
+        if not self.count and None not in self.spans:
+            return None
+        step = -1 if backwards else 1
+        for offset in range(line_count + 1):
+            current = (row + step * offset) % line_count
+            wrapped = current > row if backwards else current < row
+            wrapped = wrapped or offset == line_count
+            spans = self.spans_for(lines, current)
+            if backwards:
+                spans = reversed(spans)
+            for start, end in spans:
+                if offset == 0 and (start >= column if backwards else start < column):
+                    continue
+                elif offset == line_count and (start < column if backwards else start >= column):
+                    continue
+                return current, start, end, wrapped
+        return None
+
+
+def replace_all(pattern, lines, replacement, regex):
+    # Returns (first changed row, last changed row, the new text of those rows, number of replacements), or None if
+    # nothing matched. Regex replacements can refer to groups (\1, \g<name>); literal ones are used as they are. Empty
+    # matches are left alone, as find_spans leaves them out.
+    replaced = 0
+
+    def substitute(match):
+        nonlocal replaced
+        if match.end() == match.start():
+            return ""
+        replaced += 1
+        return match.expand(replacement) if regex else replacement
+
+    first = last = None
+    new_lines = []
+    for row, line in enumerate(lines):
+        if not pattern.search(line):
+            continue
+        before = replaced
+        new_line = pattern.sub(substitute, line)
+        if replaced == before:
+            continue
+        if first is None:
+            first = row
+        new_lines.extend(lines[last + 1:row] if last is not None else ())
+        new_lines.append(new_line)
+        last = row
+    if first is None:
+        return None
+    return first, last, "\n".join(new_lines), replaced
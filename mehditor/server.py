@@ -0,0 +1,244 @@
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+
+# The server keeps the editor imported (and warmed up by starting it once, headless), and forks a copy of itself for
+# each invocation of meh, which hands it the terminal. Only the client's side of this is imported by meh's startup.
+#
+# The client sends one line of JSON (the arguments, working directory, environment and build_id) along with its
+# stdin, stdout and stderr. It gets back lines of text:
+#   pid <n>       the process running the editor, to forward SIGWINCH to
+#   suspend       the editor wants to be suspended: the client stops itself, and sends "resume" when continued
+#   exit <n>      the editor exited with this status
+#   stale         the server is running different code from the client, so has shut down; start normally
+REQUEST_TIMEOUT = 5
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+def socket_path():
+    runtime_dir = os.getenv('XDG_RUNTIME_DIR')
+    if os.name != 'posix' or not runtime_dir or not hasattr(socket, 'send_fds'):
+        return None
+    return os.path.join(runtime_dir, 'mehditor', 'server.sock')
+
+
+def build_id():
+    # Changes when the Python or the editor's code does, so an out-of-date server isn't used
+    package = os.path.dirname(os.path.abspath(__file__))
+    newest = max(os.stat(os.path.join(directory, name)).st_mtime_ns
+                 for directory, subdirectories, names in os.walk(package)
+                 for name in names if name.endswith('.py'))
+    return f"{sys.version}:{package}:{newest}"
+
+
+def connect():
+    path = socket_path()
+    if not path:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def run_client(argv):
+    # Runs the editor in the server, if there is one; returns its exit status, or None to start normally
+    if not (os.isatty(0) and os.isatty(1)):
+        return None
+    sock = connect()
+    if not sock:
+        return None
+    request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ), 'build': build_id()}
+    child = None
+
+    def forward_signal(signum, frame):
+        if child:
+            try:
+                os.kill(child, signum)
+            except ProcessLookupError:
+                pass
+
+    with sock:
+        try:
+            socket.send_fds(sock, [json.dumps(request).encode('ascii') + b'\n'], [0, 1, 2])
+        except OSError:
+            return None
+        signal.signal(signal.SIGWINCH, forward_signal)
+        for line in sock.makefile('rb'):
+            command, _, value = line.decode('ascii').strip().partition(' ')
+            if command == 'pid':
+                child = int(value)
+            elif command == 'suspend':
+                os.kill(os.getpid(), signal.SIGTSTP)
+                sock.sendall(b'resume\n')
+            elif command == 'exit':
+                return int(value)
+            elif command == 'stale':
+                return None
+    # The server died before the editor could say how it exited
+    return 1
+
+
+def stop():
+    sock = connect()
+    if not sock:
+        print("The server isn't running", file=sys.stderr)
+        return 1
+    with sock:
+        sock.sendall(json.dumps({'stop': True}).encode('ascii') + b'\n')
+        sock.recv(1)
+    return 0
+
+
+def start():
+    # Starts the server in the background, returning once it's listening
+    path = socket_path()
+    if not path:
+        print("The server needs XDG_RUNTIME_DIR to be set (and a system that can pass file descriptors)",
+              file=sys.stderr)
+        return 1
+    sock = connect()
+    if sock:
+        sock.close()
+        print(f"The server is already running ({path})", file=sys.stderr)
+        return 1
+
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    try:
+        # Left behind by a server that didn't shut down cleanly
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    os.chmod(path, 0o600)
+    listener.listen()
+
+    if os.fork():
+        print(f"Server started ({path})")
+        return 0
+    # Detached from the terminal, so the terminals handed to it aren't its controlling terminal and job control
+    # signals don't apply to them
+    os.setsid()
+    null = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(null, fd)
+    os.close(null)
+    try:
+        serve(listener)
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        os._exit(0)
+
+
+def warm_up():
+    # Imports everything and starts the editor once, headless, so the copies forked from here start warm
+    import mehditor.app_commands
+    import mehditor.screens.mehditor_app
+    for name in ('about', 'chooser', 'confirm_dialog', 'external_change', 'file_open', 'file_save', 'input_prompt',
+                 'quick_open', 'quit_screen', 'shortcuts'):
+        __import__(f'mehditor.screens.{name}')
+    app = mehditor.screens.mehditor_app.MeheditorApp(file=None, exit_on_first_paint=True)
+    app.run(headless=True)
+
+
+def serve(listener):
+    build = build_id()
+    warm_up()
+    # Editors are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    while True:
+        conn, address = listener.accept()
+        try:
+            request, fds = read_request(conn)
+        except (OSError, ValueError):
+            conn.close()
+            continue
+
+        if request.get('stop') or request.get('build') != build:
+            if request.get('build') and request.get('build') != build:
+                conn.sendall(b'stale\n')
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            return
+
+        if os.fork() == 0:
+            listener.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            status = 1
+            try:
+                status = run_request(conn, request, fds)
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+            finally:
+                try:
+                    conn.sendall(f'exit {status}\n'.encode('ascii'))
+                except OSError:
+                    pass
+                os._exit(status)
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+
+
+def read_request(conn):
+    # Returns (request, [stdin, stdout, stderr]). Raises ValueError for anything else.
+    conn.settimeout(REQUEST_TIMEOUT)
+    if hasattr(socket, 'SO_PEERCRED'):
+        # The socket's directory is private to this user already, but make sure
+        uid = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, 12)[4:8]
+        if int.from_bytes(uid, sys.byteorder) != os.getuid():
+            raise ValueError("Connection from another user")
+    data, fds, flags, address = socket.recv_fds(conn, MAX_REQUEST_SIZE, 3)
+    while not data.endswith(b'\n'):
+        more = conn.recv(MAX_REQUEST_SIZE)
+        if not more or len(data) > MAX_REQUEST_SIZE:
+            break
+        data += more
+    try:
+        request = json.loads(data)
+        if not isinstance(request, dict) or len(fds) not in (0, 3):
+            raise ValueError("Bad request")
+    except ValueError:
+        for fd in fds:
+            os.close(fd)
+        raise
+    conn.settimeout(None)
+    return request, fds
+
+
+def run_request(conn, request, fds):
+    # In the forked copy: take over the client's terminal, working directory and environment, and run the editor
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    conn.sendall(f'pid {os.getpid()}\n'.encode('ascii'))
+
+    from mehditor import config
+    from mehditor.main import parse_args, run
+    import time
+
+    started = time.perf_counter()
+    # Any changes to the config since the server started
+    config.reload()
+
+    def suspend():
+        conn.sendall(b'suspend\n')
+        conn.recv(len(b'resume\n'))
+
+    return run(parse_args(request['argv']), started, suspend)
@@ -0,0 +1,99 @@
+import base64
+import os
+import shutil
+import subprocess
+import sys
+
+# Copies text to the system clipboard, as well as meh's own. Locally that's done with a clipboard command; over ssh
+# (or when there's no command) it's an OSC 52 escape sequence, which the terminal puts on the clipboard of the machine
+# it's running on. Inside tmux, that needs "set -g set-clipboard on".
+
+METHODS = ("off", "auto", "osc52", "command")
+
+# Tried in order, if the environment variable is set
+COPY_COMMANDS = [
+    ("WAYLAND_DISPLAY", ["wl-copy"]),
+    ("DISPLAY", ["xclip", "-selection", "clipboard"]),
+    ("DISPLAY", ["xsel", "--clipboard", "--input"]),
+]
+COMMAND_TIMEOUT = 5
+
+# GNU screen drops a DCS string longer than its buffer, so the sequence is passed through in pieces this long
+SCREEN_CHUNK_SIZE = 76
+
+
+class ClipboardError(Exception):
+    pass
+
+
+def is_remote():
+    return bool(os.environ.get("SSH_CONNECTION") or os.environ.get("SSH_TTY"))
+
+
+def find_copy_command():
+    if sys.platform == "darwin" and shutil.which("pbcopy"):
+        return ["pbcopy"]
+    for variable, command in COPY_COMMANDS:
+        if os.environ.get(variable) and shutil.which(command[0]):
+            return command
+    return None
+
+
+def copy_method(setting):
+    # ("osc52", None), ("command", [...]) or None for the system clipboard setting
+    if setting not in METHODS:
+        raise ClipboardError(f"Unknown system clipboard setting: {setting}")
+    if setting == "off":
+        return None
+    if setting == "osc52":
+        return "osc52", None
+    command = find_copy_command() if setting == "command" or not is_remote() else None
+    if command:
+        return "command", command
+    if setting == "command":
+        raise ClipboardError("No clipboard command found (wl-copy, xclip or xsel)")
+    return "osc52", None
+
+
+def copy_with_command(command, clipboard):
+    try:
+        subprocess.run(command, input=clipboard.text().encode("utf-8"), stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=COMMAND_TIMEOUT, check=True)
+    except subprocess.TimeoutExpired:
+        raise ClipboardError(f"{command[0]} took too long")
+    except subprocess.CalledProcessError as e:
+        raise ClipboardError(f"{command[0]} failed with exit status {e.returncode}")
+
+
+def encode_base64(chunks, max_length=0, cancelled=lambda: False):
+    # The base64 of the UTF-8 of chunks of text, raising ClipboardError once it's longer than max_length (if not 0)
+    pieces = []
+    length = 0
+    pending = b""
+    for chunk in chunks:
+        if cancelled():
+            return None
+        data = pending + chunk.encode("utf-8")
+        # Each 3 bytes encode to 4 characters, so pieces are joined without padding in between
+        whole = len(data) - len(data) % 3
+        pending = data[whole:]
+        pieces.append(base64.b64encode(data[:whole]).decode("ascii"))
+        length += len(pieces[-1])
+        if max_length and length > max_length:
+            raise ClipboardError("Too big for the terminal's clipboard")
+    pieces.append(base64.b64encode(pending).decode("ascii"))
+    if max_length and length + len(pieces[-1]) > max_length:
+        raise ClipboardError("Too big for the terminal's clipboard")
+    return "".join(pieces)
+
+
+def osc52_sequence(encoded, screen=False):
+    sequence = f"\x1b]52;c;{encoded}\a"
+    if not screen:
+        return sequence
+    return "".join(f"\x1bP{sequence[i:i + SCREEN_CHUNK_SIZE]}\x1b\\"
+                   for i in range(0, len(sequence), SCREEN_CHUNK_SIZE))
+
+
+def in_screen():
+    return bool(os.environ.get("STY"))
@@ -0,0 +1,342 @@
+import contextlib
+import os
+import re
+import struct
+import sys
+from array import array
+
+from textual.document._document import EditResult
+from textual.document._edit import Edit
+from textual.document._history import EditHistory
+from textual.widgets.text_area import Selection
+
+from mehditor.journal import decode_varint, encode_varint, journal_file_for
+
+# Roughly what an Edit costs in memory besides its text, so that lots of tiny edits still count towards the limit
+EDIT_OVERHEAD = 256
+
+# An undo file is a header identifying the saved file it applies to, the checkpoints (oldest first), then a footer with
+# the offset of each checkpoint, so they can be read back one at a time as they're undone.
+UNDO_MAGIC = b'MEHUND01'
+UNDO_HEADER = struct.Struct('<8sQQ')
+UNDO_FOOTER = struct.Struct('<Q8s')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Document splits lines on all of these, so edits containing them aren't merged (see merge_edits)
+LINE_BREAKS = re.compile('[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+def undo_file_for(path):
+    return journal_file_for(path).with_suffix('.undo')
+
+
+def edit_size(edit):
+    return len(edit.text) + len(edit._edit_result.replaced_text) + EDIT_OVERHEAD
+
+
+def group_size(group):
+    return sum(map(edit_size, group))
+
+
+def end_location(start, text):
+    row, column = start
+    newlines = text.count('\n')
+    if not newlines:
+        return row, column + len(text)
+    return row + newlines, len(text) - text.rfind('\n') - 1
+
+
+def text_offset(text, start, location):
+    # The index into text (which starts at start in the document) of location
+    row, column = location
+    start_row, start_column = start
+    if row == start_row:
+        return column - start_column
+    offset = -1
+    for _ in range(row - start_row):
+        offset = text.index('\n', offset + 1)
+    return offset + 1 + column
+
+
+def merge_edits(first, second):
+    # Combines two consecutive edits into one, if the second touches the text the first one left behind
+    top, end = first.top, first._edit_result.end_location
+    second_top, second_bottom = second.top, second.bottom
+    replaced, second_replaced = first._edit_result.replaced_text, second._edit_result.replaced_text
+    if second_top > end or second_bottom < top:
+        return None
+    if LINE_BREAKS.search(first.text) or LINE_BREAKS.search(replaced) or LINE_BREAKS.search(second.text) \
+            or LINE_BREAKS.search(second_replaced):
+        return None
+
+    # Whatever the second edit replaced outside of the first edit's text was in the original document
+    prefix = second_replaced[:text_offset(second_replaced, second_top, top)] if second_top < top else ''
+    suffix = second_replaced[text_offset(second_replaced, second_top, end):] if second_bottom > end else ''
+    kept_left = first.text[:text_offset(first.text, top, max(top, second_top))]
+    kept_right = first.text[text_offset(first.text, top, min(end, second_bottom)):]
+
+    merged_top = min(top, second_top)
+    merged_replaced = prefix + replaced + suffix
+    merged_text = kept_left + second.text + kept_right
+    merged = Edit(merged_text, merged_top, end_location(merged_top, merged_replaced), first.maintain_selection_offset)
+    merged._original_selection = first._original_selection
+    merged._updated_selection = second._updated_selection
+    merged._edit_result = EditResult(end_location(merged_top, merged_text), merged_replaced)
+    return merged
+
+
+def compact_edits(edits):
+    merged = []
+    for edit in edits:
+        combined = merge_edits(merged[-1], edit) if merged else None
+        if combined:
+            merged[-1] = combined
+        else:
+            merged.append(edit)
+    # eg, typing something then deleting it
+    return [edit for edit in merged if edit.text or edit._edit_result.replaced_text]
+
+
+def encode_group(group):
+    out = bytearray(encode_varint(len(group)))
+    for edit in group:
+        selection = edit._original_selection or Selection()
+        values = (*edit.from_location, *edit.to_location, *edit._edit_result.end_location, *selection.start,
+                  *selection.end, edit.maintain_selection_offset)
+        for value in values:
+            out += encode_varint(value)
+        for text in (edit.text, edit._edit_result.replaced_text):
+            text = text.encode('utf-8', errors='surrogatepass')
+            out += encode_varint(len(text))
+            out += text
+    return bytes(out)
+
+
+def decode_group(data):
+    count, position = decode_varint(data, 0)
+    group = []
+    for _ in range(count):
+        values = []
+        for _ in range(11):
+            value, position = decode_varint(data, position)
+            values.append(value)
+        texts = []
+        for _ in range(2):
+            length, position = decode_varint(data, position)
+            texts.append(data[position:position + length].decode('utf-8', errors='surrogatepass'))
+            position += length
+        from_row, from_column, to_row, to_column, end_row, end_column, *selection, maintain_selection_offset = values
+        edit = Edit(texts[0], (from_row, from_column), (to_row, to_column), bool(maintain_selection_offset))
+        edit._original_selection = Selection(tuple(selection[:2]), tuple(selection[2:]))
+        edit._edit_result = EditResult((end_row, end_column), texts[1])
+        group.append(edit)
+    return group
+
+
+class PersistedHistory:
+    # The older end of the undo stack, still on disk. identity is the undo file's (device, inode), so checkpoints are
+    # never read from a newer undo file that has replaced it.
+    def __init__(self, undo_file, offsets, end, identity):
+        self.undo_file = undo_file
+        self.offsets = offsets
+        self.end = end
+        self.identity = identity
+
+    @classmethod
+    def load(cls, undo_file, stat):
+        # Only the footer is read; returns None unless the file is an undo file for this version of the saved file
+        try:
+            with open(undo_file, 'rb') as fp:
+                file_stat = os.fstat(fp.fileno())
+                magic, size, mtime_ns = UNDO_HEADER.unpack(fp.read(UNDO_HEADER.size))
+                fp.seek(-UNDO_FOOTER.size, os.SEEK_END)
+                count, footer_magic = UNDO_FOOTER.unpack(fp.read(UNDO_FOOTER.size))
+                if (magic, footer_magic, size, mtime_ns) != (UNDO_MAGIC, UNDO_MAGIC, stat.st_size, stat.st_mtime_ns):
+                    return None
+                fp.seek(-UNDO_FOOTER.size - count * 8, os.SEEK_END)
+                end = fp.tell()
+                offsets = array('Q')
+                offsets.fromfile(fp, count)
+        except (OSError, EOFError, struct.error):
+            return None
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        return cls(undo_file, offsets, end, (file_stat.st_dev, file_stat.st_ino))
+
+    def copy(self):
+        return PersistedHistory(self.undo_file, array('Q', self.offsets), self.end, self.identity)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def pop(self):
+        # Reads back the newest checkpoint
+        start = self.offsets[-1]
+        with open(self.undo_file, 'rb') as fp:
+            file_stat = os.fstat(fp.fileno())
+            if (file_stat.st_dev, file_stat.st_ino) != self.identity:
+                raise ValueError(f"{self.undo_file} has been replaced")
+            fp.seek(start)
+            group = decode_group(fp.read(self.end - start))
+        self.offsets.pop()
+        self.end = start
+        return group
+
+
+def write_undo_history(undo_file, stat, persisted, groups, max_bytes):
+    # Writes out the persisted checkpoints (copied from the old undo file) followed by the ones in memory, oldest first,
+    # dropping the oldest to keep it under max_bytes. Returns a PersistedHistory for the checkpoints that were
+    # persisted to begin with, and how many of the oldest of those were dropped.
+    encoded = [encode_group(group) for group in groups]
+    new_size = sum(map(len, encoded))
+    source = None
+    first_kept = len(persisted) if persisted else 0
+    if persisted:
+        try:
+            source = open(persisted.undo_file, 'rb')
+        except FileNotFoundError:
+            pass
+        else:
+            source_stat = os.fstat(source.fileno())
+            if (source_stat.st_dev, source_stat.st_ino) == persisted.identity:
+                first_kept = 0
+                while first_kept < len(persisted) and \
+                        persisted.end - persisted.offsets[first_kept] + new_size > max_bytes:
+                    first_kept += 1
+
+    undo_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = undo_file.with_name(f"{undo_file.name}.tmp")
+    try:
+        with open(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as fp:
+            fp.write(UNDO_HEADER.pack(UNDO_MAGIC, stat.st_size, stat.st_mtime_ns))
+            offsets = array('Q')
+            if first_kept < len(persisted or ()):
+                shift = UNDO_HEADER.size - persisted.offsets[first_kept]
+                offsets.extend(offset + shift for offset in persisted.offsets[first_kept:])
+                source.seek(persisted.offsets[first_kept])
+                remaining = persisted.end - persisted.offsets[first_kept]
+                while remaining:
+                    chunk = source.read(min(remaining, COPY_CHUNK_SIZE))
+                    if not chunk:
+                        raise EOFError(f"{persisted.undo_file} is truncated")
+                    fp.write(chunk)
+                    remaining -= len(chunk)
+            file_stat = os.fstat(fp.fileno())
+            rebased = PersistedHistory(undo_file, array('Q', offsets), fp.tell(), (file_stat.st_dev, file_stat.st_ino))
+            for data in encoded:
+                offsets.append(fp.tell())
+                fp.write(data)
+            count = len(offsets)
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+            offsets.tofile(fp)
+            fp.write(UNDO_FOOTER.pack(count, UNDO_MAGIC))
+        os.replace(temp_file, undo_file)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_file)
+        raise
+    finally:
+        if source:
+            source.close()
+    return rebased, first_kept
+
+
+class CappedEditHistory(EditHistory):
+    # Undo history bounded by the size of its edits rather than the number of checkpoints. Over the limit, the older
+    # half of the checkpoints are merged pairwise (combining adjacent edits), then the oldest are dropped.
+    def __init__(self, max_bytes, checkpoint_timer=2.0, checkpoint_max_characters=100):
+        super().__init__(max_checkpoints=None, checkpoint_timer=checkpoint_timer,
+                         checkpoint_max_characters=checkpoint_max_characters)
+        self.max_bytes = max_bytes
+        self.persisted = None
+        self._undo_bytes = 0
+        self._redo_bytes = 0
+
+    def record(self, edit):
+        super().record(edit)
+        if edit.text or edit._edit_result.replaced_text:
+            self._undo_bytes += edit_size(edit)
+            self._redo_bytes = 0
+            if self._undo_bytes > self.max_bytes:
+                self.shrink()
+
+    def _pop_undo(self):
+        if not self._undo_stack and self.persisted:
+            try:
+                self._undo_stack.append(self.persisted.pop())
+            except (OSError, ValueError, IndexError, UnicodeDecodeError):
+                self.persisted = None
+                return None
+            self._undo_bytes += group_size(self._undo_stack[-1])
+        batch = super()._pop_undo()
+        if batch:
+            size = group_size(batch)
+            self._undo_bytes -= size
+            self._redo_bytes += size
+        return batch
+
+    def _pop_redo(self):
+        batch = super()._pop_redo()
+        if batch:
+            size = group_size(batch)
+            self._undo_bytes += size
+            self._redo_bytes -= size
+        return batch
+
+    def clear(self):
+        super().clear()
+        self.persisted = None
+        self._undo_bytes = 0
+        self._redo_bytes = 0
+
+    def shrink(self):
+        # Goes down to 3/4 of the limit, so this isn't done again on the next keystroke
+        stack = self._undo_stack
+        older = [stack.popleft() for _ in range(len(stack) // 2)]
+        merged = [compact_edits(older[i] + older[i + 1] if i + 1 < len(older) else older[i])
+                  for i in range(0, len(older), 2)]
+        stack.extendleft(reversed([group for group in merged if group]))
+        self._undo_bytes = sum(map(group_size, stack))
+
+        target = self.max_bytes * 3 // 4
+        while self._undo_bytes > target and len(stack) > 1:
+            self._undo_bytes -= group_size(stack.popleft())
+            # Anything older can't be undone without what was just dropped
+            self.persisted = None
+
+    def merge_checkpoints(self, first):
+        # Merges the checkpoints from the one starting with the edit first up to the newest into one, so they're undone
+        # together (eg, a paste made a chunk at a time). If shrink() has already merged or dropped first, they can't
+        # all be undone, so the whole history is dropped and False returned.
+        stack = self._undo_stack
+        groups = []
+        while stack:
+            group = stack.pop()
+            groups.append(group)
+            if group[0] is first:
+                stack.append([edit for group in reversed(groups) for edit in group])
+                self.checkpoint()
+                return True
+        self.clear()
+        return False
+
+    def snapshot(self):
+        # What to save with the file, taken at the same time as the text. The newest checkpoint is closed off so it
+        # doesn't carry on growing after the snapshot.
+        self.checkpoint()
+        return self.persisted.copy() if self.persisted else None, [list(group) for group in self._undo_stack]
+
+    def restore(self, undo_file, stat):
+        self.persisted = PersistedHistory.load(undo_file, stat)
+
+    def rebase_persisted(self, snapshot_persisted, rebased, first_kept):
+        # After write_undo_history: point the checkpoints that are still only on disk at the new undo file
+        if not self.persisted or not snapshot_persisted or self.persisted.identity != snapshot_persisted.identity:
+            return
+        count = len(self.persisted) - first_kept
+        if count <= 0:
+            self.persisted = None
+            return
+        end = rebased.offsets[count] if count < len(rebased) else rebased.end
+        self.persisted = PersistedHistory(rebased.undo_file, rebased.offsets[:count], end, rebased.identity)
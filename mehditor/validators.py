@@ -1,4 +1,6 @@
-from textual.validation import Integer, Validator, Failure, ValidationResult
+import math
+
+from textual.validation import Integer, Number, Validator, Failure, ValidationResult
 
 
 class LineNumber(Validator):
@@ -6,7 +8,15 @@ class LineNumber(Validator):
         pass
 
     def validate(self, value: str):
-        if value.count(":") == 1:
+        if value.endswith("%"):
+            result = Number(minimum=0, maximum=100).validate(value[:-1])
+            # NaN isn't out of any range, as it doesn't compare with anything
+            if result.is_valid and not math.isfinite(float(value[:-1])):
+                return ValidationResult.failure([LineNumber.NotALineNumber(self, value)])
+            return result
+        elif value.startswith("@"):
+            return Integer(minimum=0).validate(value[1:])
+        elif value.count(":") == 1:
             line, col = value.split(':', 1)
             return Integer(minimum=1).validate(line) and Integer(minimum=1).validate(col)
         elif value.count(":") == 0:
@@ -15,4 +25,4 @@ class LineNumber(Validator):
             return ValidationResult.failure([LineNumber.NotALineNumber(self, value)])
 
     def describe_failure(self, failure: Failure):
-        return "Must be a line number (with optional column); eg 10:3 for line 10, col 3"
+        return "Must be a line number (with optional column), percentage or byte offset; eg 10:3, 50% or @4096"
@@ -1,7 +1,26 @@
+from rich.cells import cell_len
+from rich.style import Style
+from rich.text import Text
 from textual.binding import Binding
+from textual.document._document_navigator import DocumentNavigator
+from textual.document._syntax_aware_document import SyntaxAwareDocument
+from textual.document._wrapped_document import WrappedDocument
+from textual.geometry import Size
+from textual.strip import Strip
 from textual.widgets import TextArea
 
-from mehditor.config import generate_binding
+from mehditor.config import generate_binding, settings
+from mehditor.document.byte_offsets import LineByteOffsets, RopeByteOffsets, utf8_length
+from mehditor.document.line_hashes import HashedLines, HashedRope
+from mehditor.document.mapped_document import MappedDocument, MappedWrappedDocument
+from mehditor.document.wrapped_document import ChunkedWrappedDocument
+from mehditor.undo_history import CappedEditHistory
+
+SEARCH_MATCH_STYLE = Style(color="black", bgcolor="yellow")
+# Syntax highlighting is only worked out for the lines in view and this many either side of them
+HIGHLIGHT_MARGIN = 200
+# Shown where a long line is cut off
+LONG_LINE_MARKER = "…"
 
 
 class BetterTextArea(TextArea):
@@ -77,3 +96,284 @@ class BetterTextArea(TextArea):
     # BINDINGS =  [
     #     Binding("escape", "menu", "Menu", priority=True, show=True, key_display="ESC")
     # ] + TextArea.BINDINGS[1:]
+
+    def __init__(self, *args, **kwargs):
+        # Every change to the document since the last pop_changes(), as (top, bottom, text) replacements; this is what
+        # goes in the crash recovery journal
+        self.pending_changes = []
+        # The current search, kept up to date as the document is edited; see set_search
+        self.search = None
+        # The lines that _highlights covers; see highlight_lines
+        self.highlighted_lines = range(0)
+        # The width of the widest line, for the virtual size without soft wrap; None until it's measured. Edits only
+        # measure the lines they change, so it can be wider than needed until the next full measure.
+        self.content_width = None
+        self.byte_offsets = None
+        # Lines longer than this are drawn plainly (see render_long_line), wrapped in chunks, and cut off here when
+        # they aren't wrapped
+        self.long_line_column = settings.getint('editing', 'long_line_column')
+        # How the lines are kept: "list" (as TextArea does) or "rope" (see HashedRope), for the next document loaded
+        self.document_backend = settings['editing']['document_backend']
+        super().__init__(*args, **kwargs)
+        self.history = CappedEditHistory(max_bytes=int(settings.getfloat('editing', 'undo_history_mb') * 1024 * 1024))
+
+    def pop_changes(self):
+        changes, self.pending_changes = self.pending_changes, []
+        return changes
+
+    def load_text(self, text):
+        # Loading a file isn't a change to it
+        with self.prevent(TextArea.Changed):
+            super().load_text(text)
+        self.pending_changes = []
+        self.set_search(None)
+
+    def set_search(self, search):
+        self.search = search
+        self.refresh()
+
+    def lines_replaced(self, start, stop, count):
+        if self.search is not None:
+            self.search.replaced(start, stop, count, self.document.lines)
+        if self.byte_offsets is not None:
+            self.byte_offsets.replaced(start, stop, count)
+        if self.content_width is not None and count:
+            # Only as much of a line as is shown (see render_long_line) is measured
+            indent_width = self.indent_width
+            column = self.long_line_column + 1
+            self.content_width = max(self.content_width, max(cell_len(line[:column].expandtabs(indent_width))
+                                                             for line in self.document.lines[start:start + count]))
+
+    def _refresh_size(self):
+        # Without soft wrap, the stock version measures every line of the document, after every edit
+        if self.soft_wrap or isinstance(self.document, MappedDocument):
+            super()._refresh_size()
+            return
+        if self.content_width is None:
+            self.content_width = self.document.get_size(self.indent_width).width
+        # +1 width to make space for the cursor resting at the end of the line (or the long line marker)
+        width = min(self.content_width, self.long_line_column)
+        self.virtual_size = Size(width + self.gutter_width + 1, self.document.line_count)
+
+    def _rewrap_and_refresh_virtual_size(self):
+        # Called when the document is replaced or the tab width changes
+        self.content_width = None
+        if type(self.wrapped_document) is WrappedDocument:
+            # The stock one TextArea._set_document makes, which _set_document replaces with one of ours
+            return
+        super()._rewrap_and_refresh_virtual_size()
+
+    def render_line(self, y):
+        try:
+            line_index, section = self.wrapped_document._offset_to_line_info[y + self.scroll_offset.y]
+        except IndexError:
+            return super().render_line(y)
+        if len(self.document[line_index]) > self.long_line_column and not isinstance(self.document, MappedDocument):
+            return self.render_long_line(line_index, section)
+        return super().render_line(y)
+
+    def render_long_line(self, line_index, section):
+        # TextArea.render_line styles and renders the whole line to draw any part of it, which for a line of
+        # megabytes takes seconds. This draws only the section in view (or up to long_line_column without soft wrap)
+        # with the cursor, selection and search matches, but no syntax highlighting or bracket matching.
+        theme = self._theme
+        if theme:
+            theme.apply_css(self)
+        line_string = self.document[line_index]
+        if self.soft_wrap:
+            wrap_offsets = self.wrapped_document.get_offsets(line_index)
+            start = wrap_offsets[section - 1] if section else 0
+            end = wrap_offsets[section] if section < len(wrap_offsets) else len(line_string)
+        else:
+            start, end = 0, self.long_line_column
+        line = Text(line_string[start:end], end="")
+        if end >= len(line_string):
+            # Space at the end for the cursor
+            line.set_length(len(line) + 1)
+        elif not self.soft_wrap:
+            line.append(LONG_LINE_MARKER, style=theme.gutter_style if theme else None)
+
+        def stylize(style, span_start, span_end):
+            if style and span_end > start and span_start < end + 1:
+                line.stylize(style, max(span_start - start, 0), min(span_end, end + 1) - start)
+
+        cursor_row, cursor_column = self.selection.end
+        cursor_line_style = theme.cursor_line_style if theme else None
+        if cursor_row == line_index and cursor_line_style:
+            line.stylize(cursor_line_style)
+        (top_row, top_column), (bottom_row, bottom_column) = sorted(self.selection)
+        if self.selection.start != self.selection.end and top_row <= line_index <= bottom_row:
+            stylize(theme.selection_style if theme else None, top_column if line_index == top_row else 0,
+                    bottom_column if line_index == bottom_row else len(line_string))
+        if self.search is not None:
+            for span_start, span_end in self.search.spans_for(self.document.lines, line_index):
+                stylize(SEARCH_MATCH_STYLE, span_start, span_end)
+        draw_cursor = self.has_focus and not self.cursor_blink or (self.cursor_blink and self._cursor_visible)
+        if cursor_row == line_index and draw_cursor:
+            stylize(theme.cursor_style if theme else None, cursor_column, cursor_column + 1)
+        line.expand_tabs(self.indent_width)
+
+        gutter_width = self.gutter_width
+        if self.show_line_numbers:
+            gutter_style = theme.cursor_line_gutter_style if cursor_row == line_index else theme.gutter_style
+            gutter_content = str(line_index + 1) if section == 0 else ""
+            gutter = Text(f"{gutter_content:>{gutter_width - 2}}  ", style=gutter_style or "", end="")
+        else:
+            gutter = Text("", end="")
+
+        virtual_width = self.virtual_size.width
+        base_width = self.scrollable_content_region.size.width if self.soft_wrap else max(virtual_width,
+                                                                                          self.region.size.width)
+        target_width = base_width - gutter_width
+        console = self.app.console
+        gutter_strip = Strip(console.render(gutter), cell_length=gutter_width)
+        text_strip = Strip(console.render(line, console.options.update_width(target_width)))
+        if not self.soft_wrap:
+            scroll_x = self.scroll_offset.x
+            text_strip = text_strip.crop(scroll_x, scroll_x + virtual_width - gutter_width)
+        line_style = cursor_line_style if cursor_row == line_index else theme.base_style if theme else None
+        text_strip = text_strip.extend_cell_length(target_width, line_style)
+        strip = Strip.join([gutter_strip, text_strip]).simplify()
+        return strip.apply_style(theme.base_style if theme and theme.base_style is not None else self.rich_style)
+
+    def get_line(self, line_index):
+        # Only called for lines that are being rendered, so only visible matches are ever highlighted, and syntax
+        # highlighting only needs to cover the lines around the ones in view
+        if self._highlight_query and line_index not in self.highlighted_lines:
+            self.highlight_lines(range(max(0, line_index - HIGHLIGHT_MARGIN),
+                                       line_index + self.size.height + HIGHLIGHT_MARGIN))
+        line = super().get_line(line_index)
+        if self.search is not None:
+            for start, end in self.search.spans_for(self.document.lines, line_index):
+                line.stylize(SEARCH_MATCH_STYLE, start, end)
+        return line
+
+    def _build_highlight_map(self):
+        # Called after every edit; the stock version queries the syntax tree for the whole document each time, which
+        # makes typing in a big file slow. (The tree itself is re-parsed incrementally.)
+        self.highlight_lines(self.highlighted_lines)
+
+    def highlight_lines(self, lines):
+        # Sets _highlights to the syntax highlighting of just these lines
+        highlights = self._highlights
+        highlights.clear()
+        self.highlighted_lines = lines
+        if not self._highlight_query or not lines:
+            return
+        # Long lines aren't highlighted (see render_long_line), and querying them costs as much as they're long, so
+        # they're left out of the query
+        document_lines = self.document.lines
+        ranges = []
+        start = lines.start
+        for row in range(lines.start, min(lines.stop, len(document_lines))):
+            if len(document_lines[row]) > self.long_line_column:
+                ranges.append((start, row))
+                start = row + 1
+        ranges.append((start, lines.stop))
+        captures = [capture for start, stop in ranges if start < stop
+                    for capture in self.document.query_syntax_tree(self._highlight_query, start_point=(start, 0),
+                                                                   end_point=(stop, 0))]
+        for node, highlight_name in captures:
+            start_row, start_column = node.start_point
+            end_row, end_column = node.end_point
+            if start_row == end_row:
+                highlights[start_row].append((start_column, end_column, highlight_name))
+            else:
+                highlights[start_row].append((start_column, None, highlight_name))
+                # Nodes can span far more lines than are in view, eg a string the rest of the file is inside
+                for row in range(max(start_row + 1, lines.start), min(end_row, lines.stop)):
+                    highlights[row].append((0, None, highlight_name))
+                highlights[end_row].append((0, end_column, highlight_name))
+
+    def content_state(self):
+        # Something to compare the text with later, to tell whether it's the same again (see matches_state); None for
+        # huge files
+        lines = self.document.lines
+        return lines.state() if isinstance(lines, (HashedLines, HashedRope)) else None
+
+    def matches_state(self, state):
+        lines = self.document.lines
+        return state is not None and isinstance(lines, (HashedLines, HashedRope)) and lines.matches(state)
+
+    def undo(self):
+        # The stock version undoes even when read-only (eg, while following a file or pasting a chunk at a time)
+        if not self.read_only:
+            super().undo()
+
+    def redo(self):
+        if not self.read_only:
+            super().redo()
+
+    def edit(self, edit):
+        result = super().edit(edit)
+        if edit.text or result.replaced_text:
+            self.pending_changes.append((edit.top, edit.bottom, edit.text))
+        return result
+
+    def _undo_batch(self, edits):
+        super()._undo_batch(edits)
+        for edit in reversed(edits):
+            self.pending_changes.append((edit.top, edit._edit_result.end_location, edit._edit_result.replaced_text))
+
+    def _redo_batch(self, edits):
+        super()._redo_batch(edits)
+        self.pending_changes.extend((edit.top, edit.bottom, edit.text) for edit in edits)
+
+    def _set_document(self, text, language):
+        self.close_mapped_document()
+        super()._set_document(text, language)
+        syntax_aware = isinstance(self.document, SyntaxAwareDocument)
+        rope = self.document_backend == "rope"
+        if rope:
+            # Weighted by their length in bytes for tree-sitter; see RopeByteOffsets
+            self.document._lines = HashedRope(self.document.lines, self.lines_replaced,
+                                              weigh=utf8_length if syntax_aware else None)
+        else:
+            self.document._lines = HashedLines(self.document.lines, self.lines_replaced)
+        # Every edit tells tree-sitter where it was as byte offsets, which the stock document works out from scratch
+        if syntax_aware:
+            byte_offsets = RopeByteOffsets if rope else LineByteOffsets
+            self.byte_offsets = byte_offsets(self.document.lines, self.document.newline)
+            self.document._location_to_byte_offset = self.byte_offsets.location_to_byte_offset
+        else:
+            self.byte_offsets = None
+        self.wrapped_document = ChunkedWrappedDocument(self.document, self.wrap_width, self.indent_width,
+                                                       long_line_length=self.long_line_column)
+        self.navigator = DocumentNavigator(self.wrapped_document)
+        self._refresh_size()
+
+    def load_mapped_file(self, path):
+        # Used for files too big to hold in memory; the caller is expected to make the TextArea read-only
+        self.close_mapped_document()
+        self.history.clear()
+        self.set_search(None)
+        self.set_reactive(TextArea.language, None)
+        self.set_reactive(TextArea.soft_wrap, False)
+        self._highlight_query = None
+        self._highlights.clear()
+        self.byte_offsets = None
+        self.document = MappedDocument(path)
+        self.wrapped_document = MappedWrappedDocument(self.document, tab_width=self.indent_width)
+        self.navigator = DocumentNavigator(self.wrapped_document)
+        self.move_cursor((0, 0))
+        self._refresh_size()
+        self.refresh()
+
+    def close_mapped_document(self):
+        if isinstance(getattr(self, "document", None), MappedDocument):
+            self.document.close()
+
+    def append_text(self, text):
+        # Used when streaming a file in from disk: the appended text is not recorded in the undo history and does
+        # not post a Changed event, and only the new lines are measured and wrapped.
+        old_gutter_width = self.gutter_width
+        end = self.document.end
+        result = self.document.replace_range(end, end, text)
+        if old_gutter_width != self.gutter_width:
+            self.wrapped_document.wrap(self.wrap_width, self.indent_width)
+        else:
+            self.wrapped_document.wrap_range(end, end, result.end_location)
+
+        # Only the new lines are measured; see lines_replaced
+        self._refresh_size()
+        self._build_highlight_map()
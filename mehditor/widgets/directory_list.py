@@ -0,0 +1,209 @@
+import time
+from pathlib import Path
+
+from rich.segment import Segment
+from textual import events, work
+from textual.binding import Binding
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.worker import get_current_worker
+
+from mehditor.directory_listing import (directory_mtime, filter_entries, listing_cache, scan_batches,
+                                        sort_entries)
+
+# While a directory is being read, what's been read so far is shown at most this often (in seconds)
+REPORT_INTERVAL = 0.1
+
+
+class DirectoryList(ScrollView, can_focus=True):
+    # A flat listing of one directory that only renders the rows in view, so it copes with directories of any size.
+    # Listings come from listing_cache, or are read in a worker and shown as they're read. Typing filters the entries
+    # by name (backspace to undo).
+    COMPONENT_CLASSES = {
+        "directory-list--cursor",
+        "directory-list--directory",
+    }
+
+    DEFAULT_CSS = """
+    DirectoryList {
+        height: 1fr;
+    }
+    DirectoryList > .directory-list--cursor {
+        background: $accent;
+        color: $text;
+    }
+    DirectoryList > .directory-list--directory {
+        text-style: bold;
+    }
+    """
+
+    BINDINGS = [
+        Binding("up", "cursor_up", show=False),
+        Binding("down", "cursor_down", show=False),
+        Binding("pageup", "page_up", show=False),
+        Binding("pagedown", "page_down", show=False),
+        Binding("home", "first", show=False),
+        Binding("end", "last", show=False),
+        Binding("enter", "select", show=False),
+    ]
+
+    class FileSelected(Message):
+        def __init__(self, path):
+            super().__init__()
+            self.path = path
+
+    class DirectorySelected(Message):
+        def __init__(self, path):
+            super().__init__()
+            self.path = path
+
+    class Listed(Message):
+        # Posted as a directory is read (finished=False) and when it's done
+        def __init__(self, path, count, finished):
+            super().__init__()
+            self.path = path
+            self.count = count
+            self.finished = finished
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = None
+        self.entries = []
+        # The entries that pass the filter, which are the ones shown
+        self.shown = []
+        self.filter = ""
+        self.cursor = 0
+
+    def load(self, path):
+        self.path = Path(path)
+        self.filter = ""
+        self.cursor = 0
+        entries = listing_cache.get(self.path)
+        if entries is None:
+            self.set_entries([])
+            self.list_worker(self.path)
+        else:
+            self.workers.cancel_group(self, "listing")
+            self.set_entries(entries)
+            self.post_message(self.Listed(self.path, len(entries), True))
+
+    @work(thread=True, exclusive=True, group="listing")
+    def list_worker(self, path):
+        worker = get_current_worker()
+        mtime = directory_mtime(path)
+        entries = []
+        reported = time.monotonic()
+        try:
+            for batch in scan_batches(path, lambda: worker.is_cancelled):
+                entries.extend(batch)
+                if time.monotonic() - reported >= REPORT_INTERVAL:
+                    self.app.call_from_thread(self.listed, worker, path, list(entries), False)
+                    reported = time.monotonic()
+        except OSError as e:
+            self.app.call_from_thread(self.notify, title="Error Listing Directory", message=str(e), severity="error")
+        if worker.is_cancelled:
+            return
+        entries = sort_entries(entries)
+        listing_cache.put(path, mtime, entries)
+        self.app.call_from_thread(self.listed, worker, path, entries, True)
+
+    def listed(self, worker, path, entries, finished):
+        if worker.is_cancelled or path != self.path:
+            return
+        self.set_entries(entries)
+        self.post_message(self.Listed(path, len(entries), finished))
+
+    def set_entries(self, entries):
+        self.entries = entries
+        self.apply_filter()
+
+    def apply_filter(self):
+        selected = self.selected_entry()
+        self.shown = filter_entries(self.entries, self.filter)
+        self.border_subtitle = f"Filter: {self.filter}" if self.filter else None
+        self.virtual_size = Size(max((len(entry.name) + 1 for entry in self.shown[:10000]), default=0),
+                                 len(self.shown))
+        # Keep the cursor on the same entry if it's still shown
+        if selected is not None and self.cursor < len(self.shown) and self.shown[self.cursor] is not selected:
+            try:
+                self.cursor = self.shown.index(selected)
+            except ValueError:
+                self.cursor = 0
+        self.move_cursor(self.cursor)
+        self.refresh()
+
+    def selected_entry(self):
+        if 0 <= self.cursor < len(self.shown):
+            return self.shown[self.cursor]
+        return None
+
+    def move_cursor(self, row):
+        self.cursor = max(0, min(row, len(self.shown) - 1))
+        self.scroll_to_region(Region(0, self.cursor, 1, 1), animate=False, force=True)
+        self.refresh()
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        row = scroll_y + y
+        width = self.size.width
+        style = self.rich_style
+        if row >= len(self.shown):
+            return Strip.blank(width, style)
+        entry = self.shown[row]
+        if entry.is_dir:
+            style += self.get_component_rich_style("directory-list--directory")
+        if row == self.cursor:
+            style += self.get_component_rich_style("directory-list--cursor")
+        text = f"{entry.name}/" if entry.is_dir else entry.name
+        return Strip([Segment(text, style)]).crop_extend(scroll_x, scroll_x + width, style)
+
+    def on_key(self, event: events.Key):
+        if event.key == "backspace" and self.filter:
+            self.filter = self.filter[:-1]
+        elif event.is_printable and event.character:
+            self.filter += event.character
+        else:
+            return
+        event.stop()
+        event.prevent_default()
+        self.apply_filter()
+
+    def on_click(self, event: events.Click):
+        row = self.scroll_offset.y + event.y
+        if row >= len(self.shown):
+            return
+        # Clicking the highlighted entry again opens it
+        if row == self.cursor:
+            self.action_select()
+        else:
+            self.move_cursor(row)
+
+    def action_cursor_up(self):
+        self.move_cursor(self.cursor - 1)
+
+    def action_cursor_down(self):
+        self.move_cursor(self.cursor + 1)
+
+    def action_page_up(self):
+        self.move_cursor(self.cursor - self.scrollable_content_region.height)
+
+    def action_page_down(self):
+        self.move_cursor(self.cursor + self.scrollable_content_region.height)
+
+    def action_first(self):
+        self.move_cursor(0)
+
+    def action_last(self):
+        self.move_cursor(len(self.shown) - 1)
+
+    def action_select(self):
+        entry = self.selected_entry()
+        if entry is None:
+            return
+        path = self.path / entry.name
+        if entry.is_dir:
+            self.post_message(self.DirectorySelected(path))
+        else:
+            self.post_message(self.FileSelected(path))
@@ -0,0 +1,43 @@
+import random
+import unittest
+
+from textual.document._syntax_aware_document import SyntaxAwareDocument
+
+from mehditor.document.byte_offsets import LineByteOffsets, RopeByteOffsets, utf8_length
+from mehditor.document.line_hashes import HashedLines, HashedRope
+
+
+class TestLineByteOffsets(unittest.TestCase):
+
+    def test_random_edits(self):
+        rng = random.Random(1)
+        document = SyntaxAwareDocument("one\ntwö\nthree\n", "python")
+        expected = document._location_to_byte_offset
+        offsets = LineByteOffsets(document.lines, document.newline)
+        document._lines = HashedLines(document.lines, offsets.replaced)
+        offsets.lines = document.lines
+        for _ in range(500):
+            lines = document.lines
+            row = rng.randrange(len(lines))
+            start = (row, rng.randrange(len(lines[row]) + 1))
+            end_row = min(len(lines) - 1, row + rng.choice((0, 0, 1, 2)))
+            end = (end_row, rng.randrange(len(lines[end_row]) + 1))
+            document.replace_range(start, end, rng.choice(("", "x", "twö", "\n", "a\nb", "ü\n")))
+            location = (rng.randrange(len(document.lines) + 2), rng.randrange(6))
+            self.assertEqual(offsets.location_to_byte_offset(location), expected(location))
+
+    def test_rope(self):
+        rng = random.Random(2)
+        document = SyntaxAwareDocument("one\ntwö\r\nthree\n", "python")
+        expected = document._location_to_byte_offset
+        document._lines = HashedRope(document.lines, weigh=utf8_length)
+        offsets = RopeByteOffsets(document.lines, document.newline)
+        for _ in range(500):
+            lines = document.lines
+            row = rng.randrange(len(lines))
+            start = (row, rng.randrange(len(lines[row]) + 1))
+            end_row = min(len(lines) - 1, row + rng.choice((0, 0, 1, 2)))
+            end = (end_row, rng.randrange(len(lines[end_row]) + 1))
+            document.replace_range(start, end, rng.choice(("", "x", "twö", "\n", "a\nb", "ü\n")))
+            location = (rng.randrange(len(document.lines) + 2), rng.randrange(6))
+            self.assertEqual(offsets.location_to_byte_offset(location), expected(location))
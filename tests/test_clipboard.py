@@ -0,0 +1,39 @@
+import random
+import unittest
+
+from textual.document._document import Document
+
+from mehditor.clipboard import Clipboard
+
+
+class TestClipboard(unittest.TestCase):
+
+    def test_from_document(self):
+        document = Document("one\ntwo\r\nthree")
+        self.assertEqual(Clipboard.from_document(document, (0, 1), (2, 2)).text(), "ne\ntwo\nth")
+        self.assertEqual(Clipboard.from_document(document, (2, 2), (0, 1)).text(), "ne\ntwo\nth")
+        self.assertEqual(Clipboard.from_document(document, (1, 1), (1, 3)).text(), "wo")
+        self.assertFalse(Clipboard.from_document(document, (1, 1), (1, 1)))
+        # The document's own strings
+        self.assertIs(Clipboard.from_document(document, (0, 0), (2, 0)).lines[1], document.lines[1])
+
+    def test_from_text(self):
+        for text in ("", "a", "a\n", "\n", "a\r\nb\rc\n\n"):
+            clipboard = Clipboard.from_text(text)
+            self.assertEqual(clipboard.lines, Document(text).lines if text else [])
+            self.assertEqual(len(clipboard), len(clipboard.text()))
+
+    def test_chunks(self):
+        rng = random.Random(1)
+        for _ in range(500):
+            text = "".join(rng.choice(("a", "bc", "\n", "ü", "long line " * 3)) for _ in range(rng.randrange(12)))
+            clipboard = Clipboard.from_text(text)
+            size = rng.randrange(1, 9)
+            chunks = list(clipboard.chunks(size))
+            self.assertEqual("".join(chunks), clipboard.text())
+            self.assertTrue(all(len(chunk) == size for chunk in chunks[:-1]))
+            self.assertTrue(all(0 < len(chunk) <= size for chunk in chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import configparser
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from mehditor import config
+
+
+class TestConfigSave(unittest.TestCase):
+
+    def setUp(self):
+        # Cleanups run last first, so this is after the environment is put back
+        self.addCleanup(config.reload)
+        self.addCleanup(config.pending.clear)
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {'XDG_CONFIG_HOME': self.directory.name})
+        patcher.start()
+        os.environ.pop('MEHEDITOR_CONFIG', None)
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        config.pending.clear()
+        config.file_mtimes.clear()
+        config.reload()
+        self.file = config.get_default_config_file()
+
+    def write_other_instance(self, option, value):
+        # As another instance would: read, change one setting, write
+        parser = configparser.ConfigParser()
+        parser.read(self.file)
+        if not parser.has_section('editing'):
+            parser.add_section('editing')
+        parser['editing'][option] = value
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.file, 'w') as fp:
+            parser.write(fp)
+        # Make sure the mtime changes, however coarse the filesystem's timestamps
+        stat = os.stat(self.file)
+        os.utime(self.file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def saved(self):
+        parser = configparser.ConfigParser()
+        parser.read(self.file)
+        return parser
+
+    def test_only_changes_are_written(self):
+        config.change('editing', 'theme', 'monokai')
+        config.change('editing', 'soft_wrap', 'No')
+        config.save()
+        self.assertEqual(dict(self.saved()['editing']), {'theme': 'monokai'})
+        self.assertEqual(config.pending, {})
+        self.assertFalse(config.changed_on_disk())
+
+    def test_other_instances_changes_are_kept(self):
+        self.write_other_instance('indent_width', '2')
+        config.change('editing', 'theme', 'monokai')
+        config.save()
+        self.assertEqual(dict(self.saved()['editing']), {'indent_width': '2', 'theme': 'monokai'})
+        # Not picked up until reloaded
+        self.assertTrue(config.changed_on_disk())
+        self.assertEqual(config.settings['editing']['indent_width'], '4')
+        config.reload()
+        self.assertEqual(config.settings['editing']['indent_width'], '2')
+        self.assertFalse(config.changed_on_disk())
+
+    def test_reload_keeps_unsaved_changes(self):
+        config.change('editing', 'theme', 'monokai')
+        self.write_other_instance('theme', 'github_light')
+        self.write_other_instance('dark_mode', 'No')
+        config.reload()
+        self.assertEqual(config.settings['editing']['theme'], 'monokai')
+        self.assertEqual(config.settings['editing']['dark_mode'], 'No')
+        config.save()
+        self.assertEqual(self.saved()['editing']['theme'], 'monokai')
+
+    def test_reload_of_a_broken_file_changes_nothing(self):
+        self.write_other_instance('theme', 'github_light')
+        config.reload()
+        config.change('editing', 'soft_wrap', 'No')
+        with open(self.file, 'a') as fp:
+            fp.write('not a setting\n')
+        with self.assertRaises(configparser.Error):
+            config.reload()
+        self.assertEqual(config.settings['editing']['theme'], 'github_light')
+        self.assertFalse(config.settings.getboolean('editing', 'soft_wrap'))
+        # Still seen as changed, so it's tried again
+        self.assertTrue(config.changed_on_disk())
+
+    def test_reload_of_a_missing_file_changes_nothing(self):
+        self.write_other_instance('theme', 'github_light')
+        with mock.patch.dict(os.environ, {'MEHEDITOR_CONFIG': str(self.file)}):
+            config.reload()
+            os.remove(self.file)
+            with self.assertRaises(FileNotFoundError):
+                config.reload()
+            self.assertEqual(config.settings['editing']['theme'], 'github_light')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from mehditor.directory_listing import (ListingCache, complete_path, filter_entries, find_entry, scan_batches,
+                                        sort_entries)
+
+
+class TestDirectoryListing(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name)
+        for name in ("b.txt", "A.txt", "c.TXT"):
+            (self.root / name).write_text("")
+        (self.root / "sub").mkdir()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_scan_and_sort(self):
+        batches = list(scan_batches(self.root, batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+        entries = sort_entries(entry for batch in batches for entry in batch)
+        self.assertEqual([(entry.name, entry.is_dir) for entry in entries],
+                         [("sub", True), ("A.txt", False), ("b.txt", False), ("c.TXT", False)])
+        self.assertEqual([entry.name for entry in filter_entries(entries, "Txt")], ["A.txt", "b.txt", "c.TXT"])
+
+    def test_cache(self):
+        cache = ListingCache(max_entries=6)
+        entries = cache.list(self.root)
+        self.assertIs(cache.list(self.root), entries)
+        # A new file changes the directory's mtime
+        (self.root / "d.txt").write_text("")
+        os.utime(self.root, ns=(1, 1))
+        self.assertIsNone(cache.get(self.root))
+        self.assertEqual(len(cache.list(self.root)), 5)
+
+        # Least recently used listings make way for new ones
+        cache.list(self.root / "sub")
+        self.assertIsNotNone(cache.get(self.root))
+        other = self.root / "sub" / "other"
+        other.mkdir()
+        (other / "x").write_text("")
+        (other / "y").write_text("")
+        cache.list(other)
+        self.assertIsNone(cache.get(self.root / "sub"))
+        self.assertIsNone(cache.get(self.root))
+        self.assertIsNotNone(cache.get(other))
+
+    def test_complete_path(self):
+        cache = ListingCache()
+        (self.root / "sub" / "deeper").mkdir()
+        (self.root / ".hidden").write_text("")
+        root = str(self.root)
+        self.assertEqual(complete_path(f"{root}/s", cache), (f"{root}/sub/", ["sub"]))
+        self.assertEqual(complete_path(f"{root}/sub/", cache), (f"{root}/sub/deeper/", ["deeper"]))
+        self.assertEqual(complete_path(f"{root}/", cache), (f"{root}/", ["sub", "A.txt", "b.txt", "c.TXT"]))
+        self.assertEqual(complete_path(f"{root}/.h", cache), (f"{root}/.hidden", [".hidden"]))
+        # Case only matters if something matches with it
+        self.assertEqual(complete_path(f"{root}/a", cache), (f"{root}/A.txt", ["A.txt"]))
+        self.assertEqual(complete_path(f"{root}/x", cache), (f"{root}/x", []))
+        self.assertEqual(complete_path(f"{root}/missing/x", cache), (f"{root}/missing/x", []))
+
+    def test_find_entry(self):
+        cache = ListingCache()
+        self.assertTrue(find_entry(self.root / "sub", cache).is_dir)
+        self.assertFalse(find_entry(self.root / "b.txt", cache).is_dir)
+        self.assertIsNone(find_entry(self.root / "nope", cache))
+        self.assertIsNone(find_entry(self.root / "nope" / "x", cache))
+        self.assertTrue(find_entry("/", cache).is_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
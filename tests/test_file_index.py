@@ -0,0 +1,82 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from mehditor.file_index import FileIndex, FuzzyMatcher, match_positions
+
+
+class TestFileIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, name, data=""):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(data)
+
+    def test_refresh(self):
+        for name in ("a.txt", "sub/b.txt", "sub/deeper/c.log", ".git/config"):
+            self.write(name)
+        index = FileIndex(str(self.root))
+        self.assertTrue(index.refresh())
+        self.assertEqual(sorted(index.paths()), ["a.txt", "sub/b.txt", "sub/deeper/c.log"])
+        self.assertFalse(index.refresh())
+
+        self.write("sub/new.txt")
+        self.write("sub/deeper/.gitignore", "*.log\n")
+        self.assertTrue(index.refresh())
+        self.assertEqual(sorted(index.paths()), ["a.txt", "sub/b.txt", "sub/deeper/.gitignore", "sub/new.txt"])
+
+        # An ignore file changed in place applies to the directories below it, which haven't changed themselves
+        self.write("sub/.gitignore", "*.txt\n")
+        self.assertTrue(index.refresh())
+        self.assertEqual(sorted(index.paths()), ["a.txt", "sub/.gitignore", "sub/deeper/.gitignore"])
+        self.write("sub/.gitignore", "")
+        self.write("sub/deeper/.gitignore", "")
+        self.assertTrue(index.refresh())
+        self.assertIn("sub/deeper/c.log", index.paths())
+
+    def test_one_refresh_at_a_time(self):
+        self.write("a.txt")
+        index = FileIndex(str(self.root))
+        results = []
+        with index.lock:
+            # As if another thread were part way through refreshing it
+            thread = threading.Thread(target=lambda: results.append(index.refresh()))
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+        thread.join()
+        self.assertEqual(results, [True])
+
+    def test_save_and_load(self):
+        self.write("a.txt")
+        cache_file = self.root / "cache" / "index.json.gz"
+        index = FileIndex(str(self.root / "tree"))
+        self.write("tree/x/y.txt")
+        index.refresh()
+        index.save(cache_file)
+        loaded = FileIndex.load(str(self.root / "tree"), cache_file)
+        self.assertEqual(loaded.paths(), ["x/y.txt"])
+        self.assertFalse(loaded.refresh())
+        self.assertEqual(FileIndex.load("/elsewhere", cache_file).directories, {})
+
+    def test_fuzzy_matcher(self):
+        matcher = FuzzyMatcher(["src/main.py", "docs/maintenance.md", "mehditor/screens/mehditor_app.py",
+                                "tests/test_app.py", "README.md"])
+        self.assertEqual(matcher.match("app", 10), ["tests/test_app.py", "mehditor/screens/mehditor_app.py"])
+        self.assertEqual(matcher.match("Main", 10), ["src/main.py", "docs/maintenance.md"])
+        self.assertEqual(matcher.match("mehapp", 10), ["mehditor/screens/mehditor_app.py"])
+        self.assertEqual(matcher.match("xyz", 10), [])
+        self.assertEqual(len(matcher.match("", 3)), 3)
+        self.assertEqual(match_positions("src/main.py", "mpy"), [4, 9, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
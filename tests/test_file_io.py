@@ -0,0 +1,98 @@
+import os
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from mehditor.file_io import WriteCancelled, atomic_write, detect_compression, strip_compression_suffix, text_reader, \
+    text_writer
+
+
+class TestAtomicWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "test.txt"
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_replaces_contents(self):
+        self.path.write_text("old")
+        with atomic_write(self.path) as fp:
+            fp.write("new")
+        self.assertEqual(self.path.read_text(), "new")
+        self.assertEqual(os.listdir(self.tempdir.name), ["test.txt"])
+
+    def test_keeps_permissions(self):
+        self.path.write_text("old")
+        self.path.chmod(0o640)
+        with atomic_write(self.path) as fp:
+            fp.write("new")
+        self.assertEqual(stat.S_IMODE(self.path.stat().st_mode), 0o640)
+
+    def test_new_file_uses_umask(self):
+        with atomic_write(self.path, umask=0o027) as fp:
+            fp.write("new")
+        self.assertEqual(stat.S_IMODE(self.path.stat().st_mode), 0o640)
+
+    def test_cancelled_write_leaves_original(self):
+        self.path.write_text("old")
+        with self.assertRaises(WriteCancelled):
+            with atomic_write(self.path) as fp:
+                fp.write("partial")
+                raise WriteCancelled()
+        self.assertEqual(self.path.read_text(), "old")
+        self.assertEqual(os.listdir(self.tempdir.name), ["test.txt"])
+
+    def test_writes_through_symlink(self):
+        self.path.write_text("old")
+        link = Path(self.tempdir.name) / "link.txt"
+        link.symlink_to(self.path)
+        with atomic_write(link) as fp:
+            fp.write("new")
+        self.assertTrue(link.is_symlink())
+        self.assertEqual(self.path.read_text(), "new")
+
+    def test_unwritable_directory(self):
+        # Overwritten in place, but only once the whole of it has been written
+        self.path.write_text("old contents")
+        with mock.patch("tempfile.mkstemp", side_effect=PermissionError):
+            with self.assertRaises(WriteCancelled):
+                with atomic_write(self.path) as fp:
+                    fp.write("partial")
+                    raise WriteCancelled()
+            self.assertEqual(self.path.read_text(), "old contents")
+            with atomic_write(self.path) as fp:
+                fp.write("new")
+            self.assertEqual(self.path.read_text(), "new")
+            with atomic_write(self.path, mode='wb') as fp:
+                fp.write(b"binary")
+            self.assertEqual(self.path.read_bytes(), b"binary")
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "test.log.gz"
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_round_trip(self):
+        for compression in ("gzip", "bz2", "xz", None):
+            with atomic_write(self.path, mode='wb') as raw, text_writer(raw, compression, self.path.name) as fp:
+                fp.write("héllo\n" * 1000)
+            self.assertEqual(detect_compression(self.path), compression)
+            with self.path.open('rb') as raw, text_reader(raw, compression) as fp:
+                self.assertEqual(fp.read(), "héllo\n" * 1000)
+
+    def test_strip_compression_suffix(self):
+        self.assertEqual(strip_compression_suffix("data.json.XZ"), "data.json")
+        self.assertEqual(strip_compression_suffix("data.json"), "data.json")
+
+
+if __name__ == '__main__':
+    unittest.main()
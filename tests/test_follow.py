@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from textual.document._document import Document
+
+from mehditor.journal import Journal, base_of
+from mehditor.screens.external_change import ExternalChange
+from mehditor.screens.mehditor_app import MeheditorApp
+
+
+class TestFollow(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        directory = Path(self.tempdir.name)
+        patcher = mock.patch.dict(os.environ, {name: str(directory / name)
+                                               for name in ('XDG_STATE_HOME', 'XDG_CONFIG_HOME', 'XDG_CACHE_HOME')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = directory / "test.log"
+        self.path.write_text("one\ntwo\n")
+
+    async def wait_for(self, pilot, condition):
+        # The follow worker waits on the file watcher for up to a second at a time
+        for _ in range(50):
+            if condition():
+                return
+            await pilot.pause(0.1)
+        self.fail("timed out")
+
+    async def follow_append(self, pilot, app, text):
+        tb = app.query_one("#text-buffer")
+        app.action_toggle_follow()
+        self.assertTrue(app.following)
+        with open(self.path, 'a') as fp:
+            fp.write(text)
+        await self.wait_for(pilot, lambda: tb.text.endswith(text))
+        app.action_toggle_follow()
+        self.assertFalse(app.following)
+
+    async def test_unsaved_edits_stay_in_the_journal(self):
+        app = MeheditorApp(str(self.path))
+        async with app.run_test() as pilot:
+            tb = app.query_one("#text-buffer")
+            await self.wait_for(pilot, lambda: not app.file_loading)
+            await pilot.press("x")
+            await self.follow_append(pilot, app, "three\n")
+            self.assertEqual(tb.text, "xone\ntwo\nthree\n")
+            self.assertTrue(app.file_unsaved)
+            base, changes = Journal(app.file, None).read()
+            self.assertEqual(base, base_of(self.path.stat()))
+            self.assertEqual(changes, [((0, 0), (0, 0), "x")])
+            # Replaying them over the file as it is now gives the buffer back
+            document = Document(self.path.read_text())
+            for top, bottom, text in changes:
+                document.replace_range(top, bottom, text)
+            self.assertEqual(document.text, tb.text)
+
+    async def test_appended_text_isnt_an_unsaved_change(self):
+        app = MeheditorApp(str(self.path))
+        async with app.run_test() as pilot:
+            tb = app.query_one("#text-buffer")
+            await self.wait_for(pilot, lambda: not app.file_loading)
+            await self.follow_append(pilot, app, "three\n")
+            self.assertEqual(tb.text, "one\ntwo\nthree\n")
+            self.assertFalse(app.file_unsaved)
+            self.assertFalse(Journal(app.file, None).exists())
+
+    async def test_touched_after_following_isnt_a_change(self):
+        app = MeheditorApp(str(self.path))
+        async with app.run_test() as pilot:
+            await self.wait_for(pilot, lambda: not app.file_loading)
+            await self.follow_append(pilot, app, "three\n")
+            stat = self.path.stat()
+            os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            checked = []
+            app.check_disk_version(lambda: checked.append(True), saving=False)
+            await self.wait_for(pilot, lambda: checked)
+            self.assertNotIsInstance(app.screen, ExternalChange)
+
+    async def test_merge_after_following(self):
+        app = MeheditorApp(str(self.path))
+        async with app.run_test() as pilot:
+            tb = app.query_one("#text-buffer")
+            await self.wait_for(pilot, lambda: not app.file_loading)
+            await pilot.press("x")
+            await self.follow_append(pilot, app, "three\nfour\n")
+            # Only merges cleanly if what was appended is part of the base
+            self.path.write_text("one\ntwo\nTHREE\nfour\n")
+            app.check_disk_version(lambda: None, saving=False)
+            await self.wait_for(pilot, lambda: isinstance(app.screen, ExternalChange))
+            await pilot.press("m")
+            await self.wait_for(pilot, lambda: tb.text == "xone\ntwo\nTHREE\nfour\n")
+            self.assertTrue(app.file_unsaved)
+            self.assertEqual(app.merge_base.read(), "one\ntwo\nTHREE\nfour\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from mehditor.indentation import MAX_EDITS, detect_indentation, reindent, reindent_line, valid_indent_width
+
+
+class TestIndentation(unittest.TestCase):
+
+    def test_detect_indentation(self):
+        self.assertEqual(detect_indentation(["a:", "  b:", "    c", "  d", "e"]), ("spaces", 2))
+        self.assertEqual(detect_indentation(["a:", "    b:", "        c", "", "    d"]), ("spaces", 4))
+        self.assertEqual(detect_indentation(["a:", "\tb:", "\t\tc", "  d"]), ("tabs", None))
+        self.assertIsNone(detect_indentation(["a", "b", "    ", ""]))
+        # Lined up with a single space, as in /* comments */
+        self.assertIsNone(detect_indentation(["/*", " * a", " */"]))
+        # Sampled, rather than read all through
+        lines = ["x"] * 1000000
+        lines[500000:500002] = ["a:", "  b"]
+        self.assertEqual(detect_indentation(lines), ("spaces", 2))
+
+    def test_reindent_line(self):
+        self.assertEqual(reindent_line("    a", 4, "tabs", 4), "\ta")
+        self.assertEqual(reindent_line("      a", 4, "tabs", 4), "\t  a")
+        self.assertEqual(reindent_line("  \ta", 4, "spaces", 2), "  a")
+        self.assertEqual(reindent_line("\t\ta", 8, "spaces", 4), "        a")
+        self.assertEqual(reindent_line("    a", 2, "spaces", 4), "        a")
+        self.assertEqual(reindent_line("a", 2, "tabs", 4), "a")
+
+    def test_reindent(self):
+        lines = ["a:", "  b", "c"] + ["d"] * 20 + ["  e", "f", "  g"]
+        runs, changed = reindent(lines, 2, "spaces", 4)
+        self.assertEqual(changed, 3)
+        self.assertEqual(runs, [(1, 1, ["    b"]), (23, 25, ["    e", "f", "    g"])])
+        self.assertEqual(reindent(lines, 2, "spaces", 2), ([], 0))
+
+        lines = ["  a", "b", "c", "d", "e", "f", "g", "h", "i", "j"] * (MAX_EDITS + 1)
+        runs, changed = reindent(lines, 2, "tabs", 2)
+        self.assertEqual(changed, MAX_EDITS + 1)
+        self.assertEqual(len(runs), 1)
+        first, last, new_lines = runs[0]
+        self.assertEqual(lines[:first] + new_lines + lines[last + 1:], [line.replace("  ", "\t") for line in lines])
+
+    def test_valid_indent_width(self):
+        self.assertEqual(valid_indent_width(2), 2)
+        self.assertEqual(valid_indent_width(16), 16)
+        self.assertEqual(valid_indent_width(0), 4)
+        self.assertEqual(valid_indent_width(-4), 4)
+        self.assertIsNone(valid_indent_width(17, None))
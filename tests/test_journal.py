@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from mehditor.journal import Journal, JournalInUse, decode_records, encode_record, fcntl
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "test.txt"
+        self.path.write_text("hello\n")
+        os.environ['XDG_STATE_HOME'] = str(Path(self.tempdir.name) / "state")
+
+    def tearDown(self):
+        del os.environ['XDG_STATE_HOME']
+        self.tempdir.cleanup()
+
+    def journal(self):
+        journal = Journal(self.path, self.path.stat())
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_record_round_trip(self):
+        change = ((3, 200), (70000, 0), "héllo\nwörld \U0001F600")
+        record = encode_record(change)
+        self.assertEqual(list(decode_records(record, 0)), [(change, len(record))])
+
+    def test_append_and_read(self):
+        journal = self.journal()
+        self.assertFalse(journal.exists())
+        journal.append([((0, 0), (0, 0), "a")])
+        journal.append([((0, 1), (0, 1), "b"), ((0, 0), (0, 2), "")])
+        journal.sync()
+        base, changes = self.journal().read()
+        self.assertEqual(base, journal.base)
+        self.assertEqual(changes, [((0, 0), (0, 0), "a"), ((0, 1), (0, 1), "b"), ((0, 0), (0, 2), "")])
+
+    def test_torn_record(self):
+        journal = self.journal()
+        journal.append([((0, 0), (0, 0), "kept")])
+        journal.append([((0, 0), (0, 0), "torn")])
+        journal.close()
+        with open(journal.journal_file, 'r+b') as fp:
+            fp.truncate(os.path.getsize(journal.journal_file) - 2)
+
+        journal = self.journal()
+        self.assertEqual(journal.read()[1], [((0, 0), (0, 0), "kept")])
+        journal.resume()
+        journal.append([((0, 4), (0, 4), "!")])
+        self.assertEqual(journal.read()[1], [((0, 0), (0, 0), "kept"), ((0, 4), (0, 4), "!")])
+
+    def test_rebase(self):
+        journal = self.journal()
+        journal.append([((0, 0), (0, 0), "saved")])
+        mark = journal.mark()
+        journal.append([((0, 0), (0, 0), "unsaved")])
+        self.path.write_text("savedhello\n")
+        journal.rebase(self.path.stat(), mark)
+        base, changes = journal.read()
+        self.assertEqual(base, (True, self.path.stat().st_size, self.path.stat().st_mtime_ns))
+        self.assertEqual(changes, [((0, 0), (0, 0), "unsaved")])
+
+        journal.rebase(self.path.stat(), journal.mark())
+        self.assertFalse(journal.exists())
+
+    @unittest.skipIf(fcntl is None, "journals aren't locked here")
+    def test_in_use(self):
+        journal = self.journal()
+        self.assertFalse(journal.in_use())
+        journal.append([((0, 0), (0, 0), "mine")])
+        other = self.journal()
+        self.assertTrue(other.in_use())
+        with self.assertRaises(JournalInUse):
+            other.append([((0, 0), (0, 0), "theirs")])
+        self.assertEqual(other.read()[1], [((0, 0), (0, 0), "mine")])
+
+        # Still locked once it's been replaced by its rebased copy
+        mark = journal.mark()
+        journal.append([((0, 0), (0, 0), "more")])
+        journal.rebase(self.path.stat(), mark)
+        self.assertTrue(other.in_use())
+        journal.append([((0, 0), (0, 0), "again")])
+        self.assertEqual(other.read()[1], [((0, 0), (0, 0), "more"), ((0, 0), (0, 0), "again")])
+        journal.close()
+        self.assertFalse(other.in_use())
+
+    def test_private(self):
+        journal = self.journal()
+        journal.append([((0, 0), (0, 0), "secret")])
+        self.assertEqual(journal.journal_file.stat().st_mode & 0o077, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
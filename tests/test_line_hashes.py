@@ -0,0 +1,73 @@
+import random
+import unittest
+
+from textual.document._document import Document
+
+from mehditor.document.line_hashes import ChunkedTextState, HashedLines, HashedRope, text_state
+
+
+def hashed_document(text, hashed_lines=HashedLines):
+    document = Document(text)
+    document._lines = hashed_lines(document.lines)
+    return document
+
+
+class TestHashedLines(unittest.TestCase):
+
+    def test_random_edits(self):
+        for hashed_lines in (HashedLines, HashedRope):
+            with self.subTest(hashed_lines.__name__):
+                self.check_random_edits(hashed_lines)
+
+    def check_random_edits(self, hashed_lines):
+        rng = random.Random(1)
+        document = hashed_document("one\ntwo\nthree\n", hashed_lines)
+        for _ in range(500):
+            lines = document.lines
+            row = rng.randrange(len(lines))
+            start = (row, rng.randrange(len(lines[row]) + 1))
+            end_row = min(len(lines) - 1, row + rng.choice((0, 0, 1, 2)))
+            end = (end_row, rng.randrange(len(lines[end_row]) + 1))
+            document.replace_range(start, end, rng.choice(("", "x", "two", "\n", "a\nb", "one\n")))
+            fresh = HashedLines(list(document.lines))
+            self.assertEqual(list(document.lines.hashes), fresh.hashes)
+            self.assertEqual(document.lines.fingerprint, fresh.fingerprint)
+            self.assertTrue(document.lines.matches(fresh.state()))
+
+    def test_edit_and_undo(self):
+        document = hashed_document("hello\nworld\n")
+        saved = document.lines.state()
+        result = document.replace_range((0, 5), (0, 5), "!\n")
+        self.assertFalse(document.lines.matches(saved))
+        document.replace_range((0, 5), result.end_location, "")
+        self.assertTrue(document.lines.matches(saved))
+        self.assertTrue(document.lines.matches(text_state("hello\nworld\n")))
+
+    def test_reordered_lines(self):
+        # Same adjacent pairs, different order: the fingerprints match, but the line hashes don't
+        document = hashed_document("x\na\nx\nb\nx")
+        saved = document.lines.state()
+        document.replace_range((1, 0), (1, 1), "b")
+        document.replace_range((3, 0), (3, 1), "a")
+        self.assertEqual(document.lines.fingerprint, saved[0])
+        self.assertFalse(document.lines.matches(saved))
+
+
+class TestChunkedTextState(unittest.TestCase):
+
+    def test_matches_text_state(self):
+        rng = random.Random(1)
+        pieces = ("", "a", "bc", "\n", "\r", "\r\n", "\x0c", "\u2028")
+        for _ in range(500):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randrange(8)))
+            chunked = ChunkedTextState()
+            position = 0
+            while position < len(text):
+                end = position + rng.randrange(4)
+                chunked.add(text[position:end])
+                position = end
+            self.assertEqual(chunked.state(), text_state(text), repr(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import re
+import unittest
+
+from textual.document._document import Document
+
+from mehditor.line_operations import drop_matching, keep_matching, line_range, line_replacement, reverse, \
+    sort_natural, sort_numeric, unique
+
+
+class TestLineOperations(unittest.TestCase):
+
+    def test_sort_natural(self):
+        self.assertEqual(sort_natural(["file10", "File2", "file1", "file01", "b", "a10b", "a9c"]),
+                         ["a9c", "a10b", "b", "file01", "file1", "File2", "file10"])
+
+    def test_sort_numeric(self):
+        self.assertEqual(sort_numeric(["10 ten", "x", "-1.5", "2 two", "1e3", "2 second two", ""]),
+                         ["x", "", "-1.5", "2 two", "2 second two", "10 ten", "1e3"])
+
+    def test_filters(self):
+        lines = ["one", "two", "one", "three", "Two"]
+        self.assertEqual(unique(lines), ["one", "two", "three", "Two"])
+        self.assertEqual(reverse(lines), ["Two", "three", "one", "two", "one"])
+        pattern = re.compile("t", re.IGNORECASE)
+        self.assertEqual(keep_matching(pattern)(lines), ["two", "three", "Two"])
+        self.assertEqual(drop_matching(pattern)(lines), ["one", "one"])
+
+    def test_line_range(self):
+        self.assertEqual(line_range(4, "", (1, 1), (1, 1)), (0, 3))
+        self.assertEqual(line_range(4, "last", (1, 1), (1, 1)), (0, 4))
+        self.assertEqual(line_range(1, "", (0, 0), (0, 0)), (0, 1))
+        self.assertEqual(line_range(4, "", (3, 0), (1, 2)), (1, 3))
+        self.assertEqual(line_range(4, "", (1, 2), (3, 1)), (1, 4))
+        self.assertEqual(line_range(4, "", (1, 0), (1, 3)), (1, 2))
+
+    def test_line_replacement(self):
+        texts = ["a\nb\nc\nd", "a\nb\nc\nd\n", "d\nc\nb\na", "x"]
+        operations = [reverse, unique, lambda lines: [], lambda lines: lines[1:], lambda lines: lines[:-1],
+                      lambda lines: lines + ["e"], lambda lines: ["a"] + lines]
+        for text in texts:
+            lines = Document(text).lines
+            for start in range(len(lines)):
+                for stop in range(start + 1, len(lines) + 1):
+                    for operation in operations:
+                        with self.subTest(text=text, start=start, stop=stop):
+                            new_lines = operation(lines[start:stop])
+                            expected = lines[:start] + new_lines + lines[stop:]
+                            replacement = line_replacement(lines, start, stop, new_lines)
+                            if replacement is None:
+                                self.assertEqual(expected, lines)
+                                continue
+                            document = Document(text)
+                            start_location, end_location, new_text = replacement
+                            document.replace_range(start_location, end_location, new_text)
+                            self.assertEqual(document.lines, expected or [""])
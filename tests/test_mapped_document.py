@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from textual.document._document import Document
+
+from mehditor.document.line_index import LineIndex, byte_offset_to_location
+from mehditor.document.mapped_document import MappedDocument, MappedDocumentReadOnly
+
+
+class TestLineIndex(unittest.TestCase):
+
+    def test_line_span(self):
+        data = b"".join(b"line %d\n" % i for i in range(1000))
+        index = LineIndex(data, stride=16)
+        self.assertEqual(index.line_span(0), (0, 6))
+        start, end = index.line_span(500)
+        self.assertEqual(data[start:end], b"line 500")
+
+    def test_scan_in_chunks(self):
+        data = b"".join(b"line %d\n" % i for i in range(1000))
+        index = LineIndex(data, stride=16)
+        while not index.complete:
+            index.scan(chunk_size=100)
+        self.assertEqual(index.line_count, 1001)
+        self.assertEqual(index.longest_line, len(b"line 999"))
+        start, end = index.line_span(999)
+        self.assertEqual(data[start:end], b"line 999")
+        self.assertEqual(index.line_span(1000), (len(data), len(data)))
+
+    def test_line_at_offset(self):
+        data = b"".join(b"line %d\n" % i for i in range(1000))
+        index = LineIndex(data, stride=16)
+        offset = data.index(b"line 500")
+        self.assertEqual(index.line_at_offset(offset + 2), (500, 2))
+        self.assertEqual(index.line_at_offset(len(data)), (1000, 0))
+
+    def test_save_and_load(self):
+        data = b"".join(b"line %d\n" % i for i in range(1000))
+        with tempfile.TemporaryDirectory() as tempdir:
+            source = Path(tempdir) / "source.txt"
+            source.write_bytes(data)
+            cache_file = Path(tempdir) / "cache" / "source.idx"
+
+            index = LineIndex(data, stride=16)
+            index.scan_all()
+            index.save(cache_file, source.stat())
+
+            loaded = LineIndex.load(cache_file, data, source.stat())
+            self.assertTrue(loaded.complete)
+            self.assertEqual(loaded.line_count, 1001)
+            self.assertEqual(loaded.line_span(777), index.line_span(777))
+
+            os.utime(source, ns=(0, 0))
+            self.assertIsNone(LineIndex.load(cache_file, data, source.stat()))
+
+    def test_byte_offset_to_location(self):
+        document = Document("héllo\nworld\n")
+        self.assertEqual(byte_offset_to_location(document.lines, document.newline, 3), (0, 2))
+        self.assertEqual(byte_offset_to_location(document.lines, document.newline, 9), (1, 2))
+        self.assertEqual(byte_offset_to_location(document.lines, document.newline, 100), (2, 0))
+
+    def test_out_of_range(self):
+        index = LineIndex(b"one\ntwo")
+        with self.assertRaises(IndexError):
+            index.line_span(2)
+
+
+class TestMappedDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "test.txt"
+        os.environ['XDG_CACHE_HOME'] = str(Path(self.tempdir.name) / "cache")
+
+    def tearDown(self):
+        del os.environ['XDG_CACHE_HOME']
+        self.tempdir.cleanup()
+
+    def open(self, data):
+        self.path.write_bytes(data)
+        document = MappedDocument(self.path)
+        self.addCleanup(document.close)
+        return document
+
+    def test_lines(self):
+        document = self.open(b"first\r\nsecond\r\nthird")
+        self.assertEqual(document.newline, "\r\n")
+        self.assertEqual(document[1], "second")
+        self.assertEqual(document.end, (2, 5))
+        self.assertEqual(document.get_text_range((0, 2), (1, 3)), "rst\r\nsec")
+
+    def test_cached_index(self):
+        document = self.open(b"".join(b"line %d\n" % i for i in range(1000)))
+        document.index.scan_all()
+        document.save_index()
+        document = MappedDocument(self.path)
+        self.addCleanup(document.close)
+        self.assertTrue(document.index.complete)
+        self.assertEqual(document[999], "line 999")
+        self.assertEqual(document.location_from_byte_offset(document.index.line_span(10)[0] + 3), (10, 3))
+
+    def test_empty_file(self):
+        document = self.open(b"")
+        self.assertEqual(document.line_count, 1)
+        self.assertEqual(document[0], "")
+
+    def test_read_only(self):
+        document = self.open(b"text")
+        with self.assertRaises(MappedDocumentReadOnly):
+            document.replace_range((0, 0), (0, 0), "more")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from mehditor.merge import MergeBase, merge3
+
+BASE = "one\ntwo\nthree\nfour\nfive\n"
+
+
+class TestMerge3(unittest.TestCase):
+
+    def test_separate_changes(self):
+        mine = "one\nTWO\nthree\nfour\nfive\n"
+        theirs = "one\ntwo\nthree\nfour\nfive\nsix\n"
+        self.assertEqual(merge3(BASE, mine, theirs), ("one\nTWO\nthree\nfour\nfive\nsix\n", 0))
+
+    def test_same_change(self):
+        mine = theirs = "one\ntwo\n3\nfour\nfive\n"
+        self.assertEqual(merge3(BASE, mine, theirs), (mine, 0))
+
+    def test_conflict(self):
+        mine = "one\ntwo\nmine\nfour\nfive\n"
+        theirs = "one\ntwo\ntheirs\nfour\nfive"
+        merged, conflicts = merge3(BASE, mine, theirs)
+        self.assertEqual(conflicts, 1)
+        self.assertEqual(merged, "one\ntwo\n<<<<<<< unsaved changes\nmine\n=======\ntheirs\n>>>>>>> on disk\n"
+                                 "four\nfive")
+
+    def test_conflict_without_final_newline(self):
+        merged, conflicts = merge3("a", "b", "c")
+        self.assertEqual(conflicts, 1)
+        self.assertEqual(merged, "<<<<<<< unsaved changes\nb\n=======\nc\n>>>>>>> on disk\n")
+
+    def test_unchanged(self):
+        self.assertEqual(merge3(BASE, BASE, BASE), (BASE, 0))
+
+
+class TestMergeBase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        patcher = mock.patch.dict(os.environ, {'XDG_STATE_HOME': self.tempdir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = Path(self.tempdir.name) / 'mehditor' / 'merge-base'
+
+    def test_chunks_are_read_back(self):
+        base = MergeBase()
+        self.addCleanup(base.close)
+        for chunk in ("one\n", "", "tw", "o\n\udcff\n"):
+            base.append(chunk)
+        self.assertEqual(base.read(), "one\ntwo\n\udcff\n")
+        # Kept on disk, but not by any name
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_empty(self):
+        base = MergeBase()
+        base.append("")
+        self.assertEqual(base.read(), "")
+        self.assertFalse(self.directory.exists())
+
+    def test_write_error(self):
+        self.directory.parent.mkdir(parents=True)
+        self.directory.write_text("not a directory")
+        base = MergeBase()
+        base.append("one\n")
+        with self.assertRaises(OSError):
+            base.read()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from textual.document._document import Document
+
+from mehditor.project_search import IgnoreFile, grep_files, walk_files
+from mehditor.search import compile_query
+
+
+class TestProjectSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, name, data):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(data, str):
+            path.write_text(data)
+        else:
+            path.write_bytes(data)
+        return str(path)
+
+    def test_ignore_file(self):
+        ignore = IgnoreFile(["# comment", "*.log", "!keep.log", "build/", "/top.txt", "docs/**/*.tmp"])
+        self.assertTrue(ignore.match("a/b.log", "b.log", False))
+        self.assertFalse(ignore.match("keep.log", "keep.log", False))
+        self.assertTrue(ignore.match("x/build", "build", True))
+        self.assertIsNone(ignore.match("x/build", "build", False))
+        self.assertTrue(ignore.match("top.txt", "top.txt", False))
+        self.assertIsNone(ignore.match("a/top.txt", "top.txt", False))
+        self.assertTrue(ignore.match("docs/a/b/c.tmp", "c.tmp", False))
+
+    def test_walk_files(self):
+        self.write(".gitignore", "*.log\nbuild/\n")
+        self.write("sub/.gitignore", "!important.log\n")
+        for name in ("a.txt", "b.log", "build/c.txt", "sub/d.txt", "sub/important.log", ".git/config"):
+            self.write(name, "")
+        files = sorted(os.path.relpath(path, self.root) for path in walk_files(str(self.root)))
+        self.assertEqual(files, [".gitignore", "a.txt", "sub/.gitignore", "sub/d.txt", "sub/important.log"])
+
+    def test_grep_files(self):
+        text = self.write("text.txt", "one\ntwo needle\nthree\nneedle, needle\n")
+        binary = self.write("binary.dat", b"\0needle")
+        results = grep_files([text, binary], compile_query("needle"))
+        self.assertEqual(results, [(text, [(2, 4, "two needle"), (4, 0, "needle, needle")])])
+
+    def test_grep_line_breaks(self):
+        # Lines are numbered as the editor's document splits them
+        data = "one\r\ntwo needle\rthree\x0cneedle\u2028four\n\nfive needle\r\n"
+        path = self.write("breaks.txt", data.encode("utf-8"))
+        lines = Document(data).lines
+        results = grep_files([path], compile_query("/needle$/"))
+        self.assertEqual(results, [(path, [(2, 4, "two needle"), (4, 0, "needle"), (7, 5, "five needle")])])
+        for line_number, column, line in results[0][1]:
+            self.assertEqual(lines[line_number - 1], line)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import random
+import unittest
+from unittest import mock
+
+from mehditor.document import rope
+from mehditor.document.rope import Rope
+
+
+def check_balanced(test, node):
+    if not node.height:
+        test.assertEqual(node.count, len(node.items))
+        test.assertTrue(0 < node.count <= rope.MAX_LEAF_SIZE)
+        return
+    check_balanced(test, node.left)
+    check_balanced(test, node.right)
+    test.assertLessEqual(abs(node.left.height - node.right.height), 1)
+    test.assertEqual(node.count, node.left.count + node.right.count)
+    test.assertEqual(node.weight, node.left.weight + node.right.weight)
+
+
+class TestRope(unittest.TestCase):
+
+    @mock.patch.object(rope, 'LEAF_SIZE', 4)
+    @mock.patch.object(rope, 'MAX_LEAF_SIZE', 8)
+    def test_random_edits(self):
+        rng = random.Random(1)
+        for _ in range(50):
+            expected = [rng.randrange(5) for _ in range(rng.randrange(60))]
+            items = Rope(expected, weigh=lambda item: item)
+            for _ in range(200):
+                start = rng.randrange(len(expected) + 1)
+                stop = min(len(expected), start + rng.choice((0, 1, 2, 10, 50)))
+                new = [rng.randrange(5) for _ in range(rng.choice((0, 1, 2, 5, 40)))]
+                expected[start:stop] = new
+                items[start:stop] = new
+                if items.root:
+                    check_balanced(self, items.root)
+                self.assertEqual(list(items), expected)
+                self.assertEqual(len(items), len(expected))
+                self.assertEqual(items.weight, sum(expected))
+                if expected:
+                    index = rng.randrange(len(expected))
+                    self.assertEqual(items[index], expected[index])
+                    self.assertEqual(items[-1], expected[-1])
+                    self.assertEqual(items[index:index + 7], expected[index:index + 7])
+                    self.assertEqual(items.weight_before(index), sum(expected[:index]))
+                if sum(expected):
+                    weight = rng.randrange(sum(expected))
+                    index, before = items.find(weight)
+                    self.assertEqual(before, sum(expected[:index]))
+                    self.assertTrue(before <= weight < before + expected[index])
+
+    def test_list_operations(self):
+        items = Rope("abcdef")
+        items[1] = "x"
+        items[-1] = "y"
+        items[2:4] = "12345"
+        self.assertEqual("".join(items), "ax12345ey")
+        self.assertEqual(items[::2], ["a", "1", "3", "5", "y"])
+        with self.assertRaises(IndexError):
+            items[9]
+        with self.assertRaises(ValueError):
+            items[::2] = "abcde"
+
+
+if __name__ == '__main__':
+    unittest.main()
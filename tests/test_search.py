@@ -0,0 +1,53 @@
+import unittest
+
+from mehditor.search import SearchIndex, compile_query, map_rows, replace_all
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def test_compile_query(self):
+        self.assertTrue(compile_query("foo").search("a FOO b"))
+        self.assertFalse(compile_query("Foo").search("a FOO b"))
+        self.assertTrue(compile_query("a.b").search("a.b"))
+        self.assertFalse(compile_query("a.b").search("axb"))
+        self.assertTrue(compile_query("/a.b/").search("axb"))
+
+    def test_map_rows(self):
+        # Lines 2..4 replaced by one line, then a line inserted at the top
+        self.assertEqual(map_rows(0, 10, [(2, 4, 1), (0, 0, 1)]), [(0, 2, 1), (4, 10, 4)])
+
+    def test_fill_after_edits(self):
+        lines = ["foo", "bar", "foo bar foo", "baz"]
+        search = SearchIndex(compile_query("foo"), len(lines))
+        mark = search.begin_background()
+        snapshot = list(lines)
+        # An edit while the snapshot is being searched
+        lines[0:1] = ["x", "foo"]
+        search.replaced(0, 1, 2, lines)
+        search.fill(0, [search.find(line) for line in snapshot], mark)
+        search.end_background()
+        self.assertEqual(search.spans, [(), ((0, 3),), (), ((0, 3), (8, 11)), ()])
+        self.assertEqual(search.count, 3)
+
+    def test_next_match(self):
+        lines = ["foo", "bar", "foo foo"]
+        search = SearchIndex(compile_query("foo"), len(lines))
+        self.assertEqual(search.next_match(lines, (0, 1)), (2, 0, 3, False))
+        self.assertEqual(search.next_match(lines, (2, 3)), (2, 4, 7, False))
+        self.assertEqual(search.next_match(lines, (2, 7)), (0, 0, 3, True))
+        self.assertEqual(search.next_match(lines, (2, 4), backwards=True), (2, 0, 3, False))
+        self.assertEqual(search.next_match(lines, (0, 0), backwards=True), (2, 4, 7, True))
+        self.assertIsNone(SearchIndex(compile_query("nope"), len(lines)).next_match(lines, (0, 0)))
+
+    def test_replace_all(self):
+        lines = ["a1", "b", "a2 a3", "c"]
+        self.assertEqual(replace_all(compile_query("/a(\\d)/"), lines, "<\\1>", True), (0, 2, "<1>\nb\n<2> <3>", 3))
+        self.assertEqual(replace_all(compile_query("a"), lines, "\\1", False), (0, 2, "\\11\nb\n\\12 \\13", 3))
+        self.assertIsNone(replace_all(compile_query("z"), lines, "", False))
+        # Empty matches aren't found, so they aren't replaced either
+        self.assertIsNone(replace_all(compile_query("/x*/"), ["abc", "def"], "Y", True))
+        self.assertEqual(replace_all(compile_query("/b*/"), ["abc", "def"], "Y", False), (0, 0, "aYc", 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
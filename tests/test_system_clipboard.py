@@ -0,0 +1,47 @@
+import base64
+import os
+import unittest
+from unittest import mock
+
+from mehditor.clipboard import Clipboard
+from mehditor.system_clipboard import ClipboardError, copy_method, encode_base64, osc52_sequence
+
+
+class TestSystemClipboard(unittest.TestCase):
+
+    def test_encode_base64(self):
+        text = "naïve 😀 text\n" * 1000
+        expected = base64.b64encode(text.encode("utf-8")).decode("ascii")
+        for size in (1, 2, 7, 64, 100000):
+            with self.subTest(size=size):
+                self.assertEqual(encode_base64(Clipboard.from_text(text).chunks(size)), expected)
+        self.assertEqual(encode_base64([]), "")
+        self.assertEqual(encode_base64(["ab"], 4), "YWI=")
+        with self.assertRaises(ClipboardError):
+            encode_base64(["abcd"], 4)
+        self.assertIsNone(encode_base64(["ab"], cancelled=lambda: True))
+
+    def test_osc52_sequence(self):
+        self.assertEqual(osc52_sequence("YWI="), "\x1b]52;c;YWI=\a")
+        encoded = "A" * 200
+        sequence = osc52_sequence(encoded, screen=True)
+        pieces = sequence.split("\x1b\\")
+        self.assertEqual(pieces.pop(), "")
+        self.assertTrue(all(piece.startswith("\x1bP") and len(piece) <= 78 for piece in pieces))
+        self.assertEqual("".join(piece[2:] for piece in pieces), osc52_sequence(encoded))
+
+    def test_copy_method(self):
+        with mock.patch.dict(os.environ, {"DISPLAY": ":0", "SSH_CONNECTION": "", "SSH_TTY": "", "WAYLAND_DISPLAY": ""}), \
+                mock.patch("shutil.which", lambda name: name == "xsel"), mock.patch("sys.platform", "linux"):
+            self.assertEqual(copy_method("auto"), ("command", ["xsel", "--clipboard", "--input"]))
+            self.assertEqual(copy_method("osc52"), ("osc52", None))
+            self.assertIsNone(copy_method("off"))
+            with mock.patch.dict(os.environ, {"SSH_CONNECTION": "10.0.0.1 22 10.0.0.2 22"}):
+                self.assertEqual(copy_method("auto"), ("osc52", None))
+                self.assertEqual(copy_method("command")[0], "command")
+            with mock.patch.dict(os.environ, {"DISPLAY": ""}):
+                self.assertEqual(copy_method("auto"), ("osc52", None))
+                with self.assertRaises(ClipboardError):
+                    copy_method("command")
+            with self.assertRaises(ClipboardError):
+                copy_method("sometimes")
@@ -0,0 +1,140 @@
+import os
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from textual.document._document import Document
+from textual.document._edit import Edit
+from textual.widgets.text_area import Selection
+
+from mehditor.undo_history import CappedEditHistory, PersistedHistory, compact_edits, write_undo_history
+
+
+def do(text_area, text, start, end):
+    edit = Edit(text, start, end, False)
+    edit.do(text_area)
+    return edit
+
+
+def random_edit(text_area, rng):
+    lines = text_area.document.lines
+    row = rng.randrange(len(lines))
+    column = rng.randrange(len(lines[row]) + 1)
+    start = (row, column)
+    end = (row, min(len(lines[row]), column + rng.choice((0, 0, 1, 3))))
+    if rng.random() < 0.5:
+        start, end = end, start
+    return do(text_area, rng.choice(("", "x", "yz", "\n", "a\nb")), start, end)
+
+
+class TestCompactEdits(unittest.TestCase):
+
+    def text_area(self, text):
+        return SimpleNamespace(document=Document(text), selection=Selection())
+
+    def test_typing_merges(self):
+        text_area = self.text_area("hello\n")
+        edits = [do(text_area, c, (0, 5 + i), (0, 5 + i)) for i, c in enumerate(" world")]
+        edits.append(do(text_area, "", (0, 11), (0, 10)))
+        merged = compact_edits(edits)
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[0].text, " worl")
+        merged[0].undo(text_area)
+        self.assertEqual(text_area.document.text, "hello\n")
+
+    def test_typed_then_deleted(self):
+        text_area = self.text_area("hello")
+        edits = [do(text_area, "x", (0, 2), (0, 2)), do(text_area, "", (0, 3), (0, 2))]
+        self.assertEqual(compact_edits(edits), [])
+
+    def test_random_edits(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            original = "one two\nthree four\nfive"
+            text_area = self.text_area(original)
+            edits = [random_edit(text_area, rng) for _ in range(rng.randrange(1, 8))]
+            result = text_area.document.text
+
+            merged = compact_edits(edits)
+            for edit in reversed(merged):
+                edit.undo(text_area)
+            self.assertEqual(text_area.document.text, original)
+            for edit in merged:
+                edit.do(text_area)
+            self.assertEqual(text_area.document.text, result)
+
+
+class TestCappedEditHistory(unittest.TestCase):
+
+    def test_capped(self):
+        history = CappedEditHistory(max_bytes=20000)
+        text_area = SimpleNamespace(document=Document(""), selection=Selection())
+        for i in range(500):
+            history.checkpoint()
+            history.record(do(text_area, "x" * 50, (0, i * 50), (0, i * 50)))
+        self.assertLessEqual(history._undo_bytes, 20000)
+        sizes = [len(edit.text) + 256 for group in history.undo_stack for edit in group]
+        self.assertEqual(history._undo_bytes, sum(sizes))
+        # The older half is merged into fewer, bigger checkpoints
+        self.assertGreater(len(history.undo_stack[0][0].text), 50)
+
+        while batch := history._pop_undo():
+            for edit in reversed(batch):
+                edit.undo(text_area)
+        self.assertEqual(history._undo_bytes, 0)
+        self.assertTrue(set(text_area.document.text) <= {"x"})
+
+    def test_merge_checkpoints(self):
+        history = CappedEditHistory(max_bytes=1024 * 1024)
+        text_area = SimpleNamespace(document=Document("start\n"), selection=Selection())
+        history.record(do(text_area, "typed", (0, 0), (0, 0)))
+        history.checkpoint()
+        first = do(text_area, "chunk one\n", (1, 0), (1, 0))
+        history.record(first)
+        location = first._edit_result.end_location
+        history.record(do(text_area, "chunk two", location, location))
+        self.assertTrue(history.merge_checkpoints(first))
+        self.assertEqual(len(history.undo_stack), 2)
+        for edit in reversed(history._pop_undo()):
+            edit.undo(text_area)
+        self.assertEqual(text_area.document.text, "typedstart\n")
+
+        # Too big to keep: the first chunk was dropped
+        history = CappedEditHistory(max_bytes=2000)
+        first = do(text_area, "x" * 1000, (0, 0), (0, 0))
+        history.record(first)
+        for _ in range(3):
+            history.record(do(text_area, "y" * 1000, (0, 0), (0, 0)))
+        self.assertFalse(history.merge_checkpoints(first))
+        self.assertEqual(history.undo_stack, [])
+
+    def test_persisted(self):
+        text_area = SimpleNamespace(document=Document("hello\n"), selection=Selection())
+        history = CappedEditHistory(max_bytes=1024 * 1024)
+        for text, location in (("a", (0, 0)), ("b\n", (1, 0)), ("é", (0, 3))):
+            history.checkpoint()
+            history.record(do(text_area, text, location, location))
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            saved = Path(tempdir) / "saved.txt"
+            saved.write_text(text_area.document.text)
+            undo_file = Path(tempdir) / "saved.undo"
+            persisted, groups = history.snapshot()
+            write_undo_history(undo_file, saved.stat(), persisted, groups, history.max_bytes)
+
+            history = CappedEditHistory(max_bytes=1024 * 1024)
+            history.restore(undo_file, saved.stat())
+            self.assertEqual(len(history.persisted), 3)
+            while batch := history._pop_undo():
+                for edit in reversed(batch):
+                    edit.undo(text_area)
+            self.assertEqual(text_area.document.text, "hello\n")
+
+            os.utime(saved, ns=(0, 0))
+            self.assertIsNone(PersistedHistory.load(undo_file, saved.stat()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,25 @@ class TestLineNumber(unittest.TestCase):
     def test_validate_failure_non_number(self):
         self.assertFalse(self.lineNumber.validate("a:b").is_valid)
 
+    def test_validate_success_percentage(self):
+        self.assertTrue(self.lineNumber.validate("50%").is_valid)
+        self.assertTrue(self.lineNumber.validate("12.5%").is_valid)
+
+    def test_validate_failure_percentage_out_of_range(self):
+        self.assertFalse(self.lineNumber.validate("150%").is_valid)
+
+    def test_validate_failure_percentage_not_finite(self):
+        for value in ("nan%", "NaN%", "inf%", "-inf%", "Infinity%"):
+            with self.subTest(value=value):
+                self.assertFalse(self.lineNumber.validate(value).is_valid)
+
+    def test_validate_success_byte_offset(self):
+        self.assertTrue(self.lineNumber.validate("@4096").is_valid)
+
+    def test_validate_failure_byte_offset(self):
+        self.assertFalse(self.lineNumber.validate("@-1").is_valid)
+        self.assertFalse(self.lineNumber.validate("@x").is_valid)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,88 @@
+import random
+import unittest
+
+from textual.document._document import Document
+from textual.document._wrapped_document import WrappedDocument
+
+from mehditor.document.wrapped_document import ChunkedWrap, ChunkedWrappedDocument, wrap_text
+
+WORDS = ("", "x", "two words", "\n", "a\nb", "tab\there", "long " * 12, "ü")
+
+
+def random_edit(rng, document):
+    lines = document.lines
+    row = rng.randrange(len(lines))
+    start = (row, rng.randrange(len(lines[row]) + 1))
+    end_row = min(len(lines) - 1, row + rng.choice((0, 0, 1, 2)))
+    end = (end_row, rng.randrange(len(lines[end_row]) + 1))
+    start, end = sorted((start, end))
+    return start, end, document.replace_range(start, end, rng.choice(WORDS)).end_location
+
+
+class TestChunkedWrappedDocument(unittest.TestCase):
+
+    def test_matches_wrapped_document(self):
+        rng = random.Random(1)
+        document = Document("one\ntwo three four five six\n\tthree\n")
+        stock = WrappedDocument(document, 12, 4)
+        chunked = ChunkedWrappedDocument(document, 12, 4)
+        for _ in range(300):
+            start, end, new_end = random_edit(rng, document)
+            stock.wrap_range(start, end, new_end)
+            chunked.wrap_range(start, end, new_end)
+            self.assertEqual(list(chunked._wrap_offsets), stock._wrap_offsets)
+            self.assertEqual(list(chunked._offset_to_line_info), stock._offset_to_line_info)
+            self.assertEqual(list(map(list, chunked._line_index_to_offsets)), stock._line_index_to_offsets)
+            self.assertEqual(list(chunked._tab_width_cache), stock._tab_width_cache)
+            self.assertEqual(chunked.wrapped, stock.wrapped)
+            self.assertEqual(chunked.height, stock.height)
+            row = rng.randrange(document.line_count)
+            location = (row, rng.randrange(len(document[row]) + 1))
+            self.assertEqual(chunked.location_to_offset(location), stock.location_to_offset(location))
+            self.assertEqual(list(chunked.get_sections(row)), stock.get_sections(row))
+            section = rng.randrange(-1, len(stock.get_sections(row)))
+            x_offset = rng.randrange(14)
+            self.assertEqual(chunked.get_target_document_column(row, x_offset, section),
+                             stock.get_target_document_column(row, x_offset, section))
+
+    def test_long_lines(self):
+        rng = random.Random(2)
+        document = Document("short\n" + "word " * 400 + "\nend")
+        chunked = ChunkedWrappedDocument(document, 10, 4, long_line_length=100)
+        for _ in range(300):
+            start, end, new_end = random_edit(rng, document)
+            chunked.wrap_range(start, end, new_end)
+            fresh = ChunkedWrappedDocument(document, 10, 4, long_line_length=100)
+            self.assertEqual(chunked.height, sum(len(offsets) + 1 for offsets in chunked._wrap_offsets))
+            self.assertEqual(len(chunked._wrap_offsets), document.line_count)
+            for row, line in enumerate(document.lines):
+                sections = list(chunked.get_sections(row))
+                self.assertEqual(''.join(sections), line)
+                self.assertTrue(all(len(section) <= 10 for section in sections))
+                if len(line) <= 100:
+                    self.assertEqual(chunked._wrap_offsets[row], fresh._wrap_offsets[row])
+
+
+class TestChunkedWrap(unittest.TestCase):
+
+    def test_rewrap_only_changed_chunk(self):
+        line = "abc de " * 3000
+        chunked = ChunkedWrap(20, 4, chunk_size=1000).rewrap(line)
+        before = list(chunked.chunks)
+        line = line[:5500] + "inserted " + line[5500:]
+        chunked.rewrap(line)
+        changed = [chunk for chunk in chunked.chunks if not any(chunk is old for old in before)]
+        self.assertEqual(len(changed), 1)
+        position = 0
+        for length, offsets, tab_widths in chunked.chunks:
+            self.assertEqual((offsets, tab_widths), wrap_text(line[position:position + length], 20, 4))
+            position += length
+        self.assertEqual(position, len(line))
+
+    def test_typing_at_end(self):
+        chunked = ChunkedWrap(20, 4, chunk_size=100).rewrap("x" * 250)
+        line = "x" * 250
+        for _ in range(30):
+            line += "y"
+            chunked.rewrap(line)
+        self.assertEqual([length for length, offsets, tab_widths in chunked.chunks], [100, 180])